@@ -5,7 +5,9 @@ import uuid
 from typing import Optional, Dict
 from datetime import datetime
 from dataclasses import dataclass
-from supabase_config import supabase_client
+from supabase_config import supabase_client, run_query
+from utils.principal_cache import principal_cache
+from utils.dataloader import forget as loader_forget
 import bcrypt
 import jwt
 
@@ -25,6 +27,7 @@ class AuthManager:
     def __init__(self):
         self.client = supabase_client
         self.jwt_secret = os.getenv("JWT_SECRET", "your-secret-key-change-this")
+        self.principal_cache = principal_cache
 
     async def create_user(self, email: str, password: Optional[str] = None, 
                          name: Optional[str] = None, google_id: Optional[str] = None,
@@ -52,7 +55,7 @@ class AuthManager:
         }
         
         try:
-            result = self.client.table("users").insert(data).execute()
+            result = await run_query(self.client.table("users").insert(data))
             if result.data:
                 return self._dict_to_user(result.data[0])
             raise Exception("Failed to create user")
@@ -63,21 +66,25 @@ class AuthManager:
 
     async def get_user_by_email(self, email: str) -> Optional[User]:
         """Obtener usuario por email"""
-        result = self.client.table("users").select("*").eq("email", email).execute()
+        result = await run_query(self.client.table("users").select("*").eq("email", email))
         if result.data:
             return self._dict_to_user(result.data[0])
         return None
 
     async def get_user_by_id(self, user_id: str) -> Optional[User]:
-        """Obtener usuario por ID"""
-        result = self.client.table("users").select("*").eq("id", user_id).execute()
+        """Obtener usuario por ID (con cache de principales)"""
+        return await self.principal_cache.get_or_load_user(user_id, self._fetch_user_by_id)
+
+    async def _fetch_user_by_id(self, user_id: str) -> Optional[User]:
+        """Leer usuario por ID desde la BD"""
+        result = await run_query(self.client.table("users").select("*").eq("id", user_id))
         if result.data:
             return self._dict_to_user(result.data[0])
         return None
 
     async def get_user_by_google_id(self, google_id: str) -> Optional[User]:
         """Obtener usuario por Google ID"""
-        result = self.client.table("users").select("*").eq("google_id", google_id).execute()
+        result = await run_query(self.client.table("users").select("*").eq("google_id", google_id))
         if result.data:
             return self._dict_to_user(result.data[0])
         return None
@@ -153,7 +160,9 @@ class AuthManager:
         
         updates["updated_at"] = datetime.utcnow().isoformat()
         
-        result = self.client.table("users").update(updates).eq("id", user_id).execute()
+        result = await run_query(self.client.table("users").update(updates).eq("id", user_id))
+        self.principal_cache.invalidate_user(user_id)
+        loader_forget("users", user_id)
         return len(result.data) > 0
 
     async def update_user_google_info(self, user_id: str, google_id: str, 
@@ -170,7 +179,9 @@ class AuthManager:
         if image:
             updates["image"] = image
         
-        result = self.client.table("users").update(updates).eq("id", user_id).execute()
+        result = await run_query(self.client.table("users").update(updates).eq("id", user_id))
+        self.principal_cache.invalidate_user(user_id)
+        loader_forget("users", user_id)
         return len(result.data) > 0
 
     async def deactivate_user(self, user_id: str) -> bool:
@@ -180,12 +191,16 @@ class AuthManager:
             "updated_at": datetime.utcnow().isoformat()
         }
         
-        result = self.client.table("users").update(updates).eq("id", user_id).execute()
+        result = await run_query(self.client.table("users").update(updates).eq("id", user_id))
+        self.principal_cache.invalidate_user(user_id)
+        loader_forget("users", user_id)
         return len(result.data) > 0
 
     async def delete_user(self, user_id: str) -> bool:
         """Eliminar usuario (hard delete)"""
-        result = self.client.table("users").delete().eq("id", user_id).execute()
+        result = await run_query(self.client.table("users").delete().eq("id", user_id))
+        self.principal_cache.invalidate_user(user_id)
+        loader_forget("users", user_id)
         return len(result.data) > 0
 
     def generate_jwt_token(self, user: User) -> str:
@@ -198,9 +213,14 @@ class AuthManager:
         return jwt.encode(payload, self.jwt_secret, algorithm="HS256")
 
     def verify_jwt_token(self, token: str) -> Optional[Dict]:
-        """Verificar JWT token"""
+        """Verificar JWT token (los ya verificados se sirven de cache hasta su exp)"""
+        cached = self.principal_cache.get_claims(token)
+        if cached is not None:
+            return cached
+
         try:
             payload = jwt.decode(token, self.jwt_secret, algorithms=["HS256"])
+            self.principal_cache.put_claims(token, payload)
             return payload
         except jwt.ExpiredSignatureError:
             return None
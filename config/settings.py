@@ -39,6 +39,43 @@ WHATSAPP_API_URL: str = os.getenv("WHATSAPP_API_URL", "")
 WHATSAPP_ACCESS_TOKEN: str = os.getenv("WHATSAPP_ACCESS_TOKEN", "")
 WHATSAPP_PHONE_NUMBER_ID: str = os.getenv("WHATSAPP_PHONE_NUMBER_ID", "")
 
+# Storage backend: "supabase" (PostgREST remoto) o "sqlite" (embebido, un solo nodo / desarrollo)
+STORAGE_BACKEND: str = os.getenv("STORAGE_BACKEND", "supabase").lower()
+SQLITE_PATH: str = os.getenv("SQLITE_PATH", "paia.db")
+
 # Supabase Configuration (imported from supabase_config)
 SUPABASE_URL: str = os.getenv("SUPABASE_URL", "")
 SUPABASE_KEY: str = os.getenv("SUPABASE_KEY", "")
+
+# PAIA WebSocket Configuration
+WS_OUTBOUND_QUEUE_SIZE: int = int(os.getenv("WS_OUTBOUND_QUEUE_SIZE", "256"))
+WS_OVERFLOW_POLICY: str = os.getenv("WS_OVERFLOW_POLICY", "disconnect")  # disconnect | drop_oldest
+WS_HEARTBEAT_INTERVAL: float = float(os.getenv("WS_HEARTBEAT_INTERVAL", "30"))
+WS_IDLE_TIMEOUT: float = float(os.getenv("WS_IDLE_TIMEOUT", "90"))
+WS_BATCH_WINDOW_MS: float = float(os.getenv("WS_BATCH_WINDOW_MS", "3"))  # Micro-batching negociado por el cliente
+WS_INBOUND_CONCURRENCY: int = int(os.getenv("WS_INBOUND_CONCURRENCY", "4"))
+WS_INBOUND_BACKLOG: int = int(os.getenv("WS_INBOUND_BACKLOG", "1024"))  # Frames en cola por conexión
+WS_REPLAY_SIZE: int = int(os.getenv("WS_REPLAY_SIZE", "512"))
+WS_RESUME_WINDOW: float = float(os.getenv("WS_RESUME_WINDOW", "120"))
+
+# Registro masivo de agentes en PAIA: agentes por chunk (página leída + upserts)
+PAIA_REGISTRATION_CHUNK_SIZE: int = int(os.getenv("PAIA_REGISTRATION_CHUNK_SIZE", "1000"))
+
+# Pool de threads para las consultas a la BD (cliente síncrono)
+DB_EXECUTOR_WORKERS: int = int(os.getenv("DB_EXECUTOR_WORKERS", "16"))
+DB_EXECUTOR_MAX_PENDING: int = int(os.getenv("DB_EXECUTOR_MAX_PENDING", "256"))
+
+# Caches de lectura del DatabaseManager (segundos)
+AGENT_CACHE_TTL: float = float(os.getenv("AGENT_CACHE_TTL", "300"))
+AGENT_CACHE_NEGATIVE_TTL: float = float(os.getenv("AGENT_CACHE_NEGATIVE_TTL", "30"))  # IDs inexistentes
+PHONE_INDEX_TTL: float = float(os.getenv("PHONE_INDEX_TTL", "300"))  # Reconstrucción del índice de WhatsApp
+FRIENDS_FLOWS_TTL: float = float(os.getenv("FRIENDS_FLOWS_TTL", "15"))
+
+# Supabase HTTP transport (pool keep-alive compartido por las consultas)
+SUPABASE_HTTP_MAX_CONNECTIONS: int = int(os.getenv("SUPABASE_HTTP_MAX_CONNECTIONS", "32"))
+SUPABASE_HTTP_MAX_KEEPALIVE: int = int(os.getenv("SUPABASE_HTTP_MAX_KEEPALIVE", "16"))
+SUPABASE_HTTP_KEEPALIVE_EXPIRY: float = float(os.getenv("SUPABASE_HTTP_KEEPALIVE_EXPIRY", "60"))
+SUPABASE_HTTP2: bool = os.getenv("SUPABASE_HTTP2", "true").lower() == "true"  # Requiere el paquete h2 (httpx[http2] en requirements.txt)
+SUPABASE_HTTP_CONNECT_TIMEOUT: float = float(os.getenv("SUPABASE_HTTP_CONNECT_TIMEOUT", "5"))
+SUPABASE_HTTP_READ_TIMEOUT: float = float(os.getenv("SUPABASE_HTTP_READ_TIMEOUT", "30"))
+SUPABASE_HTTP_POOL_TIMEOUT: float = float(os.getenv("SUPABASE_HTTP_POOL_TIMEOUT", "10"))
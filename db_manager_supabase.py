@@ -1,70 +1,87 @@
 # db_manager_supabase.py
 import os
+import time
 import uuid
-from typing import Dict, List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple, Type
 from datetime import datetime
-from dataclasses import dataclass, asdict
-from supabase_config import supabase_client
-
-@dataclass
-class DBAgent:
-    id: str
-    user_id: str
-    name: str
-    description: str
-    personality: str
-    expertise: str
-    status: str
-    mcp_endpoint: str
-    is_public: bool
-    telegram_chat_id: Optional[str]
-    whatsapp_phone_number: Optional[str]
-    is_persistent: bool
-    auto_start: bool
-    created_at: datetime
-    updated_at: datetime
-
-@dataclass
-class DBConnection:
-    id: str
-    agent1_id: str
-    agent2_id: str
-    connection_type: str
-    status: str
-    created_at: datetime
-
-@dataclass
-class DBMessage:
-    id: str
-    conversation_id: str
-    from_agent_id: str
-    to_agent_id: str
-    content: str
-    message_type: str
-    is_read: bool
-    telegram_sent: bool
-    created_at: datetime
-
-@dataclass
-class DBNotification:
-    id: str
-    user_id: str
-    agent_id: Optional[str]
-    title: str
-    content: str
-    notification_type: str
-    priority: str
-    is_read: bool
-    is_dismissed: bool
-    sent_telegram: bool
-    sent_email: bool
-    created_at: datetime
-    read_at: Optional[datetime]
-    dismissed_at: Optional[datetime]
+from supabase_config import supabase_client, run_query
+from config.settings import AGENT_CACHE_TTL, AGENT_CACHE_NEGATIVE_TTL, PHONE_INDEX_TTL, FRIENDS_FLOWS_TTL
+from utils.dataloader import get_loader, forget as loader_forget
+from utils.record_cache import RecordCache
+from utils.phone_index import PhoneIndex
+from routers.phone_normalization import canonical_phone_key, normalize_whatsapp_phone
+from models.rows import Row, LazyTimestamp
+from utils.pagination import DEFAULT_PAGE_SIZE, apply_keyset, split_page
+
+# IDs por consulta IN (limita el largo de la URL de PostgREST)
+USERS_IN_BATCH_SIZE = 200
+
+# Flujos activos de amigos: columnas de resumen (sin flow_data) y TTL de la cache
+FRIENDS_FLOWS_COLUMNS = "id, name, description, user_id, is_public, is_active, version, created_at, updated_at, tags"
+
+# Cache read-through de agentes compartida por todo el proceso
+agent_cache = RecordCache("agents", ttl=AGENT_CACHE_TTL, negative_ttl=AGENT_CACHE_NEGATIVE_TTL)
+
+# Índice teléfono de WhatsApp -> agente (se reconstruye para ver cambios de otros procesos)
+PHONE_INDEX_PAGE_SIZE = 1000
+
+# Filas por request en los upserts masivos (capabilities, autonomía)
+UPSERT_BATCH_SIZE = 500
+
+# Espacio de nombres para los IDs de capabilities (uuid5 de agente + tipo)
+_CAPABILITY_ID_NAMESPACE = uuid.UUID("3d0b8c52-7e0f-4c4a-b1e6-2f9a8d7c6e51")
+phone_index = PhoneIndex(ttl=PHONE_INDEX_TTL)
+
+class DBAgent(Row):
+    """Agente completo (todas las columnas que usa la aplicación)"""
+    __slots__ = (
+        "id", "user_id", "name", "description", "personality", "expertise",
+        "status", "mcp_endpoint", "is_public", "telegram_chat_id",
+        "whatsapp_phone_number", "is_persistent", "auto_start",
+        "_created_at", "_updated_at"
+    )
+    created_at = LazyTimestamp()
+    updated_at = LazyTimestamp()
+
+class AgentSummary(Row):
+    """Proyección de agente para listados y búsquedas (sin personality, endpoints ni canales)"""
+    __slots__ = ("id", "user_id", "name", "description", "expertise", "status", "is_public")
+
+class AgentOwnership(Row):
+    """Proyección mínima de agente: dueño y visibilidad"""
+    __slots__ = ("id", "user_id", "is_public")
+
+class DBConnection(Row):
+    __slots__ = ("id", "agent1_id", "agent2_id", "connection_type", "status", "_created_at")
+    created_at = LazyTimestamp()
+
+class DBMessage(Row):
+    __slots__ = (
+        "id", "conversation_id", "from_agent_id", "to_agent_id", "content",
+        "message_type", "is_read", "telegram_sent", "_created_at"
+    )
+    created_at = LazyTimestamp()
+
+class MessageHeader(Row):
+    """Proyección de mensaje PAIA sin payload ni metadata"""
+    __slots__ = ("id", "conversation_id", "from_agent_id", "to_agent_id", "message_type", "status", "_created_at")
+    created_at = LazyTimestamp()
+
+class DBNotification(Row):
+    __slots__ = (
+        "id", "user_id", "agent_id", "title", "content", "notification_type",
+        "priority", "is_read", "is_dismissed", "sent_telegram", "sent_email",
+        "_created_at", "_read_at", "_dismissed_at"
+    )
+    created_at = LazyTimestamp()
+    read_at = LazyTimestamp()
+    dismissed_at = LazyTimestamp()
 
 class DatabaseManager:
     def __init__(self):
         self.client = supabase_client
+        # user_id -> (expira_en, flujos activos de sus amigos)
+        self._friends_flows_cache: Dict[str, Tuple[float, List[Dict]]] = {}
 
     # =============== AGENTS ===============
     async def create_agent(self, agent_data: Dict) -> DBAgent:
@@ -90,65 +107,236 @@ class DatabaseManager:
             "updated_at": now.isoformat()
         }
         
-        result = self.client.table("agents").insert(data).execute()
+        result = await run_query(self.client.table("agents").insert(data))
         if result.data:
-            return self._dict_to_agent(result.data[0])
+            loader_forget("agents_by_user", data["user_id"])
+            agent = self._dict_to_agent(result.data[0])
+            agent_cache.put(agent.id, agent)
+            phone_index.set(agent.id, agent.whatsapp_phone_number)
+            return agent
         raise Exception("Failed to create agent")
 
     async def get_agent(self, agent_id: str) -> Optional[DBAgent]:
-        """Obtener un agente por ID"""
-        result = self.client.table("agents").select("*").eq("id", agent_id).execute()
+        """
+        Obtener un agente por ID.
+        Pasa por la cache de agentes; los fallos se agrupan por request si hay request_scope.
+        """
+        loader = get_loader("agents", self._load_agents_by_ids)
+        if loader is None:
+            return await agent_cache.get_or_load(agent_id, self._fetch_agent)
+
+        found, agent = agent_cache.lookup(agent_id)
+        if found:
+            return agent
+        return await loader.load(agent_id)
+
+    async def _fetch_agent(self, agent_id: str) -> Optional[DBAgent]:
+        """Leer un agente desde la BD"""
+        result = await run_query(self.client.table("agents").select(DBAgent.COLUMNS).eq("id", agent_id))
         if result.data:
             return self._dict_to_agent(result.data[0])
         return None
 
-    async def get_agents_by_user(self, user_id: str) -> List[DBAgent]:
-        """Obtener todos los agentes de un usuario"""
-        result = self.client.table("agents").select("*").eq("user_id", user_id).execute()
+    async def _load_agents_by_ids(self, agent_ids: List[str]) -> Dict[str, DBAgent]:
+        """Batch del loader de agentes: una consulta IN (alimenta la cache, también en negativo)"""
+        agent_cache.misses += len(agent_ids)
+        result = await run_query(self.client.table("agents").select(DBAgent.COLUMNS).in_("id", agent_ids))
+        agents = {row["id"]: self._dict_to_agent(row) for row in result.data or []}
+        for agent_id in agent_ids:
+            agent_cache.put(agent_id, agents.get(agent_id))
+        return agents
+
+    async def get_agents_by_user(self, user_id: str, row_type: Type[Row] = DBAgent) -> List[Row]:
+        """
+        Obtener todos los agentes de un usuario.
+
+        Args:
+            user_id: ID del usuario
+            row_type: Proyección (DBAgent, AgentSummary o AgentOwnership); solo
+                DBAgent se agrupa por request y alimenta la cache de agentes
+        """
+        if row_type is not DBAgent:
+            result = await run_query(self.client.table("agents").select(row_type.COLUMNS).eq("user_id", user_id))
+            return [row_type.from_row(row) for row in result.data]
+
+        loader = get_loader("agents_by_user", self._load_agents_by_users)
+        if loader is not None:
+            return list(await loader.load(user_id))
+
+        result = await run_query(self.client.table("agents").select(DBAgent.COLUMNS).eq("user_id", user_id))
         return [self._dict_to_agent(row) for row in result.data]
 
-    async def get_public_agents(self, exclude_user_id: str = None) -> List[DBAgent]:
+    async def get_agent_ids_by_user(self, user_id: str) -> List[str]:
+        """IDs de los agentes de un usuario (proyección mínima)"""
+        return [agent.id for agent in await self.get_agents_by_user(user_id, AgentOwnership)]
+
+    async def get_agent_summaries_by_user(self, user_id: str) -> List[AgentSummary]:
+        """Agentes de un usuario con la proyección de resumen"""
+        return await self.get_agents_by_user(user_id, AgentSummary)
+
+    async def get_agent_summaries_after(self, after_id: Optional[str], limit: int) -> List[AgentSummary]:
+        """
+        Página de todos los agentes ordenados por id (recorridos masivos).
+
+        Args:
+            after_id: Último id de la página anterior (None = desde el inicio)
+            limit: Tamaño de página
+        """
+        query = self.client.table("agents").select(AgentSummary.COLUMNS)
+        if after_id:
+            query = query.gt("id", after_id)
+        result = await run_query(query.order("id").limit(limit))
+        return [AgentSummary.from_row(row) for row in result.data or []]
+
+    async def _load_agents_by_users(self, user_ids: List[str]) -> Dict[str, List[DBAgent]]:
+        """Batch del loader de agentes por usuario: una consulta IN"""
+        result = await run_query(self.client.table("agents").select(DBAgent.COLUMNS).in_("user_id", user_ids))
+
+        agents_by_user: Dict[str, List[DBAgent]] = {user_id: [] for user_id in user_ids}
+        agents_loader = get_loader("agents", self._load_agents_by_ids)
+        for row in result.data or []:
+            agent = self._dict_to_agent(row)
+            agents_by_user.setdefault(agent.user_id, []).append(agent)
+            agent_cache.put(agent.id, agent)
+            # Los agentes ya leídos sirven también para get_agent
+            if agents_loader is not None:
+                agents_loader.prime(agent.id, agent)
+        return agents_by_user
+
+    async def get_public_agents(self, exclude_user_id: str = None, row_type: Type[Row] = DBAgent) -> List[Row]:
         """Obtener todos los agentes públicos, opcionalmente excluyendo un usuario"""
-        query = self.client.table("agents").select("*").eq("is_public", True)
+        query = self.client.table("agents").select(row_type.COLUMNS).eq("is_public", True)
         if exclude_user_id:
             query = query.neq("user_id", exclude_user_id)
-        result = query.execute()
-        return [self._dict_to_agent(row) for row in result.data]
+        result = await run_query(query)
+        return [row_type.from_row(row) for row in result.data]
+
+    async def get_public_agents_page(
+        self,
+        exclude_user_id: str = None,
+        cursor: Optional[str] = None,
+        limit: int = DEFAULT_PAGE_SIZE
+    ) -> Tuple[List[DBAgent], Optional[str]]:
+        """
+        Página de agentes públicos (keyset por created_at, id; más recientes primero).
 
-    async def get_public_agents_by_user(self, user_id: str) -> List[DBAgent]:
+        Returns:
+            (agentes, cursor de la página siguiente o None)
+        """
+        query = self.client.table("agents").select(DBAgent.COLUMNS).eq("is_public", True)
+        if exclude_user_id:
+            query = query.neq("user_id", exclude_user_id)
+        result = await run_query(apply_keyset(query, "created_at", cursor, limit))
+        rows, next_cursor = split_page(result.data or [], "created_at", limit)
+        return [self._dict_to_agent(row) for row in rows], next_cursor
+
+    async def get_agents_by_user_page(
+        self,
+        user_id: str,
+        cursor: Optional[str] = None,
+        limit: int = DEFAULT_PAGE_SIZE
+    ) -> Tuple[List[DBAgent], Optional[str]]:
+        """Página de agentes de un usuario (keyset por created_at, id)"""
+        query = self.client.table("agents").select(DBAgent.COLUMNS).eq("user_id", user_id)
+        result = await run_query(apply_keyset(query, "created_at", cursor, limit))
+        rows, next_cursor = split_page(result.data or [], "created_at", limit)
+        return [self._dict_to_agent(row) for row in rows], next_cursor
+
+    async def get_public_agents_by_user(self, user_id: str, row_type: Type[Row] = DBAgent) -> List[Row]:
         """Obtener todos los agentes públicos de un usuario específico"""
-        result = self.client.table("agents").select("*").eq("user_id", user_id).eq("is_public", True).execute()
-        return [self._dict_to_agent(row) for row in result.data]
+        result = await run_query(self.client.table("agents").select(row_type.COLUMNS).eq("user_id", user_id).eq("is_public", True))
+        return [row_type.from_row(row) for row in result.data]
 
     async def get_agent_by_whatsapp_phone(self, phone_number: str) -> Optional[DBAgent]:
         """
-        Obtener agente por número de WhatsApp, intentando variantes normalizadas.
-        Maneja automáticamente las diferencias de formato de México y USA/Canadá.
+        Obtener agente por número de WhatsApp en cualquier formato.
+        Las variantes de México y USA/Canadá comparten clave canónica.
         """
-        from routers.phone_normalization import normalize_whatsapp_phone  # Cambiar nombre
-    
-        phone_variants = normalize_whatsapp_phone(phone_number)  # Cambiar nombre
-    
-        for phone in phone_variants:
-            result = self.client.table("agents").select("*").eq("whatsapp_phone_number", phone).execute()
-            if result.data:
-                if phone != phone_number:
-                    print(f"[DB] Agente encontrado con formato alternativo: {phone_number} -> {phone}")
-                return self._dict_to_agent(result.data[0])
-    
-        return None
+        return await self.get_agent_by_phone_key(canonical_phone_key(phone_number))
+
+    async def get_agent_by_phone_key(self, phone_key: str) -> Optional[DBAgent]:
+        """
+        Obtener agente por clave canónica de teléfono.
+        Resuelve con el índice en memoria; si no lo tiene (o está obsoleto),
+        hace una consulta por las variantes del número y completa el índice.
+        """
+        if not phone_key:
+            return None
+
+        await phone_index.ensure_loaded(self._load_phone_numbers)
+        agent_id = phone_index.get(phone_key)
+        if agent_id:
+            agent = await self.get_agent(agent_id)
+            if agent and canonical_phone_key(agent.whatsapp_phone_number) == phone_key:
+                return agent
+            # Entrada obsoleta (el agente cambió o se eliminó en otro proceso)
+            phone_index.remove(agent_id)
+
+        return await self._fetch_agent_by_phone_key(phone_key)
+
+    async def _fetch_agent_by_phone_key(self, phone_key: str) -> Optional[DBAgent]:
+        """
+        Fallo del índice (ej: agente creado en otro proceso desde la última
+        reconstrucción): una sola consulta IN con los formatos en que puede
+        estar guardado el número.
+        """
+        variants = []
+        for phone in normalize_whatsapp_phone(phone_key):
+            variants.extend((phone, "+" + phone))
+
+        result = await run_query(self.client.table("agents").select(DBAgent.COLUMNS).in_(
+            "whatsapp_phone_number", variants
+        ).order("id").limit(1))
+        if not result.data:
+            return None
+
+        agent = self._dict_to_agent(result.data[0])
+        agent_cache.put(agent.id, agent)
+        phone_index.set(agent.id, agent.whatsapp_phone_number)
+        print(f"[DB] Agente {agent.id} encontrado en BD para {phone_key} (índice completado)")
+        return agent
+
+    async def _load_phone_numbers(self) -> List[Tuple[str, str]]:
+        """(agent_id, teléfono) de todos los agentes con WhatsApp, paginando por id"""
+        rows: List[Tuple[str, str]] = []
+        last_id = None
+        while True:
+            query = self.client.table("agents").select("id, whatsapp_phone_number").neq(
+                "whatsapp_phone_number", ""
+            )
+            if last_id:
+                query = query.gt("id", last_id)
+            result = await run_query(query.order("id").limit(PHONE_INDEX_PAGE_SIZE))
+            page = result.data or []
+            rows.extend((row["id"], row["whatsapp_phone_number"]) for row in page if row["whatsapp_phone_number"])
+            if len(page) < PHONE_INDEX_PAGE_SIZE:
+                return rows
+            last_id = page[-1]["id"]
 
     async def update_agent(self, agent_id: str, updates: Dict) -> bool:
         """Actualizar un agente"""
         updates["updated_at"] = datetime.utcnow().isoformat()
-        result = self.client.table("agents").update(updates).eq("id", agent_id).execute()
+        result = await run_query(self.client.table("agents").update(updates).eq("id", agent_id))
+        self._forget_agent(agent_id, result.data)
+        for row in result.data or []:
+            phone_index.set(row["id"], row.get("whatsapp_phone_number"))
         return len(result.data) > 0
 
     async def delete_agent(self, agent_id: str) -> bool:
         """Eliminar un agente"""
-        result = self.client.table("agents").delete().eq("id", agent_id).execute()
+        result = await run_query(self.client.table("agents").delete().eq("id", agent_id))
+        self._forget_agent(agent_id, result.data)
+        phone_index.remove(agent_id)
         return len(result.data) > 0
 
+    def _forget_agent(self, agent_id: str, rows: Optional[List[Dict]] = None):
+        """Olvidar un agente en la cache y en los loaders del request tras escribirlo"""
+        agent_cache.invalidate(agent_id)
+        loader_forget("agents", agent_id)
+        for row in rows or []:
+            if row.get("user_id"):
+                loader_forget("agents_by_user", row["user_id"])
+
     # =============== CONNECTIONS ===============
     async def create_connection(self, agent1_id: str, agent2_id: str, connection_type: str = "standard") -> DBConnection:
         """Crear una conexión entre agentes"""
@@ -164,59 +352,100 @@ class DatabaseManager:
             "created_at": now.isoformat()
         }
         
-        result = self.client.table("agent_connections").insert(data).execute()
+        result = await run_query(self.client.table("agent_connections").insert(data))
         if result.data:
             return self._dict_to_connection(result.data[0])
         raise Exception("Failed to create connection")
 
     async def get_agent_connections(self, agent_id: str) -> List[DBConnection]:
         """Obtener todas las conexiones de un agente"""
-        result = self.client.table("agent_connections").select("*").or_(
+        result = await run_query(self.client.table("agent_connections").select(DBConnection.COLUMNS).or_(
             f"agent1_id.eq.{agent_id},agent2_id.eq.{agent_id}"
-        ).execute()
+        ))
         return [self._dict_to_connection(row) for row in result.data]
 
     async def get_user_connections(self, user_id: str, status: str = 'accepted') -> List[Dict]:
-        """Obtener las conexiones sociales de un usuario"""
+        """Obtener las conexiones sociales de un usuario (2 consultas: conexiones + usuarios)"""
         try:
-            result = self.client.table("user_connections").select("*").or_(
+            result = await run_query(self.client.table("user_connections").select(
+                "id, user1_id, user2_id, status, created_at"
+            ).or_(
                 f"user1_id.eq.{user_id},user2_id.eq.{user_id}"
-            ).eq("status", status).execute()
+            ).eq("status", status))
+
+            rows = result.data or []
 
-            connections = []
-            for row in result.data:
-                # Obtener información del requester (user1) y recipient (user2)
-                requester_result = self.client.table("users").select("id, name, email, image").eq("id", row["user1_id"]).single().execute()
-                recipient_result = self.client.table("users").select("id, name, email, image").eq("id", row["user2_id"]).single().execute()
+            # Una sola consulta IN para los datos de todos los participantes
+            users = await self.get_users_by_ids(
+                [row["user1_id"] for row in rows] + [row["user2_id"] for row in rows]
+            )
+
+            def user_summary(participant_id: str) -> Dict:
+                user = users.get(participant_id) or {}
+                return {
+                    "id": participant_id,
+                    "name": user.get("name") or "Usuario",
+                    "email": user.get("email") or "",
+                    "image": user.get("image")
+                }
 
-                connection_data = {
+            return [
+                {
                     "connection_id": row["id"],
-                    "requester": {
-                        "id": row["user1_id"],
-                        "name": requester_result.data.get("name") if requester_result.data else "Usuario",
-                        "email": requester_result.data.get("email") if requester_result.data else "",
-                        "image": requester_result.data.get("image") if requester_result.data else None
-                    },
-                    "recipient": {
-                        "id": row["user2_id"],
-                        "name": recipient_result.data.get("name") if recipient_result.data else "Usuario",
-                        "email": recipient_result.data.get("email") if recipient_result.data else "",
-                        "image": recipient_result.data.get("image") if recipient_result.data else None
-                    },
+                    "requester": user_summary(row["user1_id"]),
+                    "recipient": user_summary(row["user2_id"]),
                     "status": row["status"],
                     "created_at": row["created_at"]
                 }
-                connections.append(connection_data)
-
-            return connections
+                for row in rows
+            ]
         except Exception as e:
             print(f"Error obteniendo conexiones de usuario: {e}")
             return []
 
+    async def get_friend_ids(self, user_id: str) -> List[str]:
+        """Obtener solo los IDs de los amigos (conexiones aceptadas) de un usuario"""
+        try:
+            result = await run_query(self.client.table("user_connections").select(
+                "user1_id, user2_id"
+            ).or_(
+                f"user1_id.eq.{user_id},user2_id.eq.{user_id}"
+            ).eq("status", "accepted"))
+
+            return [
+                row["user2_id"] if row["user1_id"] == user_id else row["user1_id"]
+                for row in result.data or []
+            ]
+        except Exception as e:
+            print(f"Error obteniendo amigos de usuario: {e}")
+            return []
+
+    async def get_users_by_ids(self, user_ids: List[str], columns: str = "id, name, email, image") -> Dict[str, Dict]:
+        """
+        Obtener varios usuarios con consultas IN por lotes.
+
+        Returns:
+            Diccionario user_id -> fila (los IDs inexistentes no aparecen)
+        """
+        unique_ids = list(dict.fromkeys(uid for uid in user_ids if uid))
+        users: Dict[str, Dict] = {}
+
+        for start in range(0, len(unique_ids), USERS_IN_BATCH_SIZE):
+            batch = unique_ids[start:start + USERS_IN_BATCH_SIZE]
+            result = await run_query(self.client.table("users").select(columns).in_("id", batch))
+            for row in result.data or []:
+                users[row["id"]] = row
+
+        return users
+
+    async def _load_users_by_ids(self, user_ids: List[str]) -> Dict[str, Dict]:
+        """Batch del loader de usuarios"""
+        return await self.get_users_by_ids(user_ids, columns="*")
+
     async def get_connection_by_id(self, connection_id: str) -> Optional[Dict]:
         """Obtener una conexión social específica por ID"""
         try:
-            result = self.client.table("user_connections").select("*").eq("id", connection_id).single().execute()
+            result = await run_query(self.client.table("user_connections").select("*").eq("id", connection_id).single())
             if result.data:
                 return {
                     "connection_id": result.data["id"],
@@ -250,7 +479,7 @@ class DatabaseManager:
                 "updated_at": now.isoformat()
             }
 
-            result = self.client.table("flow_connections").insert(data).execute()
+            result = await run_query(self.client.table("flow_connections").insert(data))
             if result.data:
                 return flow_connection_id
             raise Exception("Failed to create flow connection")
@@ -262,7 +491,7 @@ class DatabaseManager:
     async def delete_flow_connection(self, connection_id: str) -> bool:
         """Eliminar una conexión de flujo"""
         try:
-            result = self.client.table("flow_connections").delete().eq("id", connection_id).execute()
+            result = await run_query(self.client.table("flow_connections").delete().eq("id", connection_id))
             return len(result.data) > 0
         except Exception as e:
             print(f"Error eliminando conexión de flujo: {e}")
@@ -286,16 +515,16 @@ class DatabaseManager:
             "created_at": now.isoformat()
         }
         
-        result = self.client.table("agent_messages").insert(data).execute()
+        result = await run_query(self.client.table("agent_messages").insert(data))
         if result.data:
             return self._dict_to_message(result.data[0])
         raise Exception("Failed to save message")
 
     async def get_conversation_messages(self, conversation_id: str, limit: int = 50) -> List[DBMessage]:
         """Obtener mensajes de una conversación"""
-        result = self.client.table("agent_messages").select("*").eq(
+        result = await run_query(self.client.table("agent_messages").select(DBMessage.COLUMNS).eq(
             "conversation_id", conversation_id
-        ).order("created_at", desc=True).limit(limit).execute()
+        ).order("created_at", desc=True).limit(limit))
         return [self._dict_to_message(row) for row in result.data]
 
     # =============== NOTIFICATIONS ===============
@@ -319,30 +548,48 @@ class DatabaseManager:
             "created_at": now.isoformat()
         }
         
-        result = self.client.table("notifications").insert(data).execute()
+        result = await run_query(self.client.table("notifications").insert(data))
         if result.data:
             return self._dict_to_notification(result.data[0])
         raise Exception("Failed to create notification")
 
-    async def get_user_notifications(self, user_id: str, unread_only: bool = False, limit: int = 50) -> List[DBNotification]:
-        """Obtener notificaciones de un usuario"""
-        query = self.client.table("notifications").select("*").eq("user_id", user_id)
+    async def get_user_notifications_page(
+        self,
+        user_id: str,
+        unread_only: bool = False,
+        cursor: Optional[str] = None,
+        limit: int = 50
+    ) -> Tuple[List[DBNotification], Optional[str]]:
+        """Página de notificaciones de un usuario (keyset por created_at, id; más recientes primero)"""
+        query = self.client.table("notifications").select(DBNotification.COLUMNS).eq("user_id", user_id)
 
         if unread_only:
             query = query.eq("is_read", False)
 
-        result = query.order("created_at", desc=True).limit(limit).execute()
-        return [self._dict_to_notification(row) for row in result.data]
+        result = await run_query(apply_keyset(query, "created_at", cursor, limit))
+        rows, next_cursor = split_page(result.data or [], "created_at", limit)
+        return [self._dict_to_notification(row) for row in rows], next_cursor
 
     # =============== FLOWS ===============
     async def get_user_flows(self, user_id: str) -> List[Dict]:
         """Obtener flujos guardados de un usuario"""
-        result = self.client.table("saved_flows").select("*").eq("user_id", user_id).execute()
+        result = await run_query(self.client.table("saved_flows").select("*").eq("user_id", user_id))
         return result.data
 
+    async def get_user_flows_page(
+        self,
+        user_id: str,
+        cursor: Optional[str] = None,
+        limit: int = DEFAULT_PAGE_SIZE
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """Página de flujos de un usuario (keyset por updated_at, id; modificados recientemente primero)"""
+        query = self.client.table("saved_flows").select("*").eq("user_id", user_id)
+        result = await run_query(apply_keyset(query, "updated_at", cursor, limit))
+        return split_page(result.data or [], "updated_at", limit)
+
     async def get_public_flows_by_user(self, user_id: str) -> List[Dict]:
         """Obtener flujos públicos de un usuario específico"""
-        result = self.client.table("saved_flows").select("*").eq("user_id", user_id).eq("is_public", True).execute()
+        result = await run_query(self.client.table("saved_flows").select("*").eq("user_id", user_id).eq("is_public", True))
         return result.data
 
     async def save_flow(self, flow_data: Dict) -> Dict:
@@ -365,15 +612,17 @@ class DatabaseManager:
             "updated_at": now.isoformat()
         }
         
-        result = self.client.table("saved_flows").insert(data).execute()
+        result = await run_query(self.client.table("saved_flows").insert(data))
         if result.data:
+            self._invalidate_friends_flows()
             return result.data[0]
         raise Exception("Failed to save flow")
 
     async def update_flow(self, flow_id: str, updates: Dict) -> bool:
         """Actualizar un flujo"""
         updates["updated_at"] = datetime.utcnow().isoformat()
-        result = self.client.table("saved_flows").update(updates).eq("id", flow_id).execute()
+        result = await run_query(self.client.table("saved_flows").update(updates).eq("id", flow_id))
+        self._invalidate_friends_flows()
         return len(result.data) > 0
 
     async def delete_flow(self, flow_id: str, user_id: str = None) -> bool:
@@ -384,7 +633,8 @@ class DatabaseManager:
         if user_id:
             query = query.eq("user_id", user_id)
 
-        result = query.execute()
+        result = await run_query(query)
+        self._invalidate_friends_flows()
         return len(result.data) > 0
 
     async def update_flow_status(self, flow_id: str, is_active: bool) -> bool:
@@ -393,44 +643,56 @@ class DatabaseManager:
             "is_active": is_active,
             "updated_at": datetime.utcnow().isoformat()
         }
-        result = self.client.table("saved_flows").update(updates).eq("id", flow_id).execute()
+        result = await run_query(self.client.table("saved_flows").update(updates).eq("id", flow_id))
+        self._invalidate_friends_flows()
         return len(result.data) > 0
 
-    async def get_friends_active_flows(self, user_id: str) -> List[Dict]:
-        """Obtener flujos activos y públicos de amigos conectados"""
-        try:
-            # 1. Get accepted connections for this user
-            connections = await self.get_user_connections(user_id, status='accepted')
+    def _invalidate_friends_flows(self, *user_ids: str):
+        """
+        Invalidar la cache de flujos activos de amigos.
+        Sin argumentos se vacía completa (un cambio de flujo afecta a todos sus amigos).
+        """
+        if not user_ids:
+            self._friends_flows_cache.clear()
+            return
+        for uid in user_ids:
+            self._friends_flows_cache.pop(uid, None)
 
-            if not connections:
-                return []
+    async def get_friends_active_flows(self, user_id: str) -> List[Dict]:
+        """
+        Obtener flujos activos y públicos de amigos conectados.
 
-            # 2. Extract friend user IDs
-            friend_ids = []
-            for conn in connections:
-                if conn.get('user1_id') == user_id:
-                    friend_ids.append(conn.get('user2_id'))
-                elif conn.get('user2_id') == user_id:
-                    friend_ids.append(conn.get('user1_id'))
+        Una consulta de amigos, una de flujos (sin flow_data) y una de dueños
+        por lote; el resultado se guarda unos segundos por usuario.
+        """
+        cached = self._friends_flows_cache.get(user_id)
+        if cached and cached[0] > time.monotonic():
+            return [dict(flow) for flow in cached[1]]
 
+        try:
+            # 1. IDs de amigos (conexiones aceptadas)
+            friend_ids = await self.get_friend_ids(user_id)
             if not friend_ids:
                 return []
 
-            # 3. Query flows from friends that are active and public
-            flows_result = self.client.table("saved_flows").select(
-                "id, name, description, user_id, is_public, is_active, version, created_at, updated_at, flow_data, tags, metadata"
-            ).in_("user_id", friend_ids).eq("is_active", True).eq("is_public", True).order("updated_at", desc=True).execute()
+            # 2. Flujos activos y públicos de los amigos (solo columnas de resumen)
+            flows: List[Dict] = []
+            for start in range(0, len(friend_ids), USERS_IN_BATCH_SIZE):
+                batch = friend_ids[start:start + USERS_IN_BATCH_SIZE]
+                flows_result = await run_query(self.client.table("saved_flows").select(
+                    FRIENDS_FLOWS_COLUMNS
+                ).in_("user_id", batch).eq("is_active", True).eq("is_public", True).order("updated_at", desc=True))
+                flows.extend(flows_result.data or [])
 
-            flows = flows_result.data
+            if len(friend_ids) > USERS_IN_BATCH_SIZE:
+                flows.sort(key=lambda f: f.get("updated_at") or "", reverse=True)
 
-            # 4. Enrich with owner information
-            enriched_flows = []
-            for flow in flows:
-                # Get owner information
-                owner_result = self.client.table("users").select("name, email, image").eq("id", flow['user_id']).execute()
+            # 3. Dueños en una sola consulta por lote
+            owners = await self.get_users_by_ids([flow["user_id"] for flow in flows])
 
-                if owner_result.data:
-                    owner = owner_result.data[0]
+            for flow in flows:
+                owner = owners.get(flow["user_id"])
+                if owner:
                     flow['owner_name'] = owner.get('name', 'Unknown')
                     flow['owner_email'] = owner.get('email', '')
                     flow['owner_image'] = owner.get('image', '')
@@ -442,9 +704,8 @@ class DatabaseManager:
                 # Add activated_at (use updated_at as proxy for when it was activated)
                 flow['activated_at'] = flow.get('updated_at')
 
-                enriched_flows.append(flow)
-
-            return enriched_flows
+            self._friends_flows_cache[user_id] = (time.monotonic() + FRIENDS_FLOWS_TTL, flows)
+            return [dict(flow) for flow in flows]
 
         except Exception as e:
             print(f"Error getting friends active flows: {e}")
@@ -474,7 +735,7 @@ class DatabaseManager:
             # Limitar resultados
             search_query = search_query.limit(limit)
 
-            result = search_query.execute()
+            result = await run_query(search_query)
             return result.data
 
         except Exception as e:
@@ -482,9 +743,17 @@ class DatabaseManager:
             return []
 
     async def get_user_by_id(self, user_id: str) -> Optional[Dict]:
-        """Obtener un usuario por ID"""
+        """Obtener un usuario por ID (agrupado por request si hay request_scope)"""
+        loader = get_loader("users", self._load_users_by_ids)
+        if loader is not None:
+            try:
+                return await loader.load(user_id)
+            except Exception as e:
+                print(f"Error obteniendo usuario {user_id}: {e}")
+                return None
+
         try:
-            result = self.client.table("users").select("*").eq("id", user_id).single().execute()
+            result = await run_query(self.client.table("users").select("*").eq("id", user_id).single())
             return result.data
         except Exception as e:
             print(f"Error obteniendo usuario {user_id}: {e}")
@@ -509,7 +778,7 @@ class DatabaseManager:
                 "updated_at": now.isoformat()
             }
 
-            result = self.client.table("user_connections").insert(data).execute()
+            result = await run_query(self.client.table("user_connections").insert(data))
             if result.data:
                 return connection_id
             raise Exception("Failed to create user connection request")
@@ -522,7 +791,7 @@ class DatabaseManager:
         """Aceptar una solicitud de conexión"""
         try:
             # Verificar que el usuario sea el recipient de la conexión
-            result = self.client.table("user_connections").select("*").eq("id", connection_id).single().execute()
+            result = await run_query(self.client.table("user_connections").select("*").eq("id", connection_id).single())
 
             if not result.data:
                 return False
@@ -532,10 +801,11 @@ class DatabaseManager:
                 return False
 
             # Actualizar estado a accepted
-            update_result = self.client.table("user_connections").update({
+            update_result = await run_query(self.client.table("user_connections").update({
                 "status": "accepted",
                 "updated_at": datetime.utcnow().isoformat()
-            }).eq("id", connection_id).execute()
+            }).eq("id", connection_id))
+            self._invalidate_friends_flows(connection["user1_id"], connection["user2_id"])
 
             return len(update_result.data) > 0
 
@@ -547,7 +817,7 @@ class DatabaseManager:
         """Rechazar una solicitud de conexión"""
         try:
             # Verificar que el usuario sea el recipient de la conexión
-            result = self.client.table("user_connections").select("*").eq("id", connection_id).single().execute()
+            result = await run_query(self.client.table("user_connections").select("*").eq("id", connection_id).single())
 
             if not result.data:
                 return False
@@ -557,10 +827,11 @@ class DatabaseManager:
                 return False
 
             # Actualizar estado a rejected
-            update_result = self.client.table("user_connections").update({
+            update_result = await run_query(self.client.table("user_connections").update({
                 "status": "rejected",
                 "updated_at": datetime.utcnow().isoformat()
-            }).eq("id", connection_id).execute()
+            }).eq("id", connection_id))
+            self._invalidate_friends_flows(connection["user1_id"], connection["user2_id"])
 
             return len(update_result.data) > 0
 
@@ -571,67 +842,19 @@ class DatabaseManager:
     # =============== HELPER METHODS ===============
     def _dict_to_agent(self, data: Dict) -> DBAgent:
         """Convertir diccionario a DBAgent"""
-        return DBAgent(
-            id=data["id"],
-            user_id=data["user_id"],
-            name=data["name"],
-            description=data["description"],
-            personality=data["personality"],
-            expertise=data["expertise"],
-            status=data["status"],
-            mcp_endpoint=data["mcp_endpoint"],
-            is_public=data["is_public"],
-            telegram_chat_id=data.get("telegram_chat_id"),
-            whatsapp_phone_number=data.get("whatsapp_phone_number"),
-            is_persistent=data["is_persistent"],
-            auto_start=data["auto_start"],
-            created_at=datetime.fromisoformat(data["created_at"].replace('Z', '+00:00')),
-            updated_at=datetime.fromisoformat(data["updated_at"].replace('Z', '+00:00'))
-        )
+        return DBAgent.from_row(data)
 
     def _dict_to_connection(self, data: Dict) -> DBConnection:
         """Convertir diccionario a DBConnection"""
-        return DBConnection(
-            id=data["id"],
-            agent1_id=data["agent1_id"],
-            agent2_id=data["agent2_id"],
-            connection_type=data["connection_type"],
-            status=data["status"],
-            created_at=datetime.fromisoformat(data["created_at"].replace('Z', '+00:00'))
-        )
+        return DBConnection.from_row(data)
 
     def _dict_to_message(self, data: Dict) -> DBMessage:
         """Convertir diccionario a DBMessage"""
-        return DBMessage(
-            id=data["id"],
-            conversation_id=data["conversation_id"],
-            from_agent_id=data["from_agent_id"],
-            to_agent_id=data["to_agent_id"],
-            content=data["content"],
-            message_type=data["message_type"],
-            is_read=data["is_read"],
-            telegram_sent=data["telegram_sent"],
-            created_at=datetime.fromisoformat(data["created_at"].replace('Z', '+00:00'))
-        )
+        return DBMessage.from_row(data)
 
     def _dict_to_notification(self, data: Dict) -> DBNotification:
         """Convertir diccionario a DBNotification"""
-        return DBNotification(
-            id=data["id"],
-            user_id=data["user_id"],
-            agent_id=data["agent_id"],
-            title=data["title"],
-            content=data["content"],
-            notification_type=data["notification_type"],
-            priority=data["priority"],
-            is_read=data["is_read"],
-            is_dismissed=data["is_dismissed"],
-            sent_telegram=data["sent_telegram"],
-            sent_email=data["sent_email"],
-            created_at=datetime.fromisoformat(data["created_at"].replace('Z', '+00:00')),
-            read_at=datetime.fromisoformat(data["read_at"].replace('Z', '+00:00')) if data["read_at"] else None,
-            dismissed_at=datetime.fromisoformat(data["dismissed_at"].replace('Z', '+00:00')) if data["dismissed_at"] else None
-        )
+        return DBNotification.from_row(data)
 
     # =============== PROTOCOLO PAIA - AGENT CAPABILITIES ===============
 
@@ -654,16 +877,66 @@ class DatabaseManager:
             "created_at": now.isoformat()
         }
 
-        result = self.client.table("agent_capabilities").insert(data).execute()
+        result = await run_query(self.client.table("agent_capabilities").insert(data))
         if result.data:
             return capability_id
         raise Exception("Failed to save capability")
 
+    async def save_agent_capabilities_many(self, capabilities: List[Dict]) -> int:
+        """
+        Guardar capabilities de muchos agentes con upserts por (agent_id, capability_type),
+        en requests de hasta UPSERT_BATCH_SIZE filas.
+
+        Las filas que ya existen conservan su id (se leen antes del upsert); solo
+        las nuevas reciben un id determinista.
+
+        Returns:
+            Número de filas escritas
+        """
+        existing_ids = await self._capability_ids_by_key({cap["agent_id"] for cap in capabilities})
+        rows = [
+            {
+                "id": existing_ids.get((cap["agent_id"], cap["capability_type"])) or str(
+                    uuid.uuid5(_CAPABILITY_ID_NAMESPACE, f"{cap['agent_id']}\x00{cap['capability_type']}")
+                ),
+                "agent_id": cap["agent_id"],
+                "capability_name": cap["capability_name"],
+                "capability_type": cap["capability_type"],
+                "description": cap.get("description", ""),
+                "input_schema": cap.get("input_schema"),
+                "output_schema": cap.get("output_schema"),
+                "requires_approval": cap.get("requires_approval", False),
+                "autonomy_level": cap.get("autonomy_level", "supervised"),
+                "enabled": cap.get("enabled", True)
+            }
+            for cap in capabilities
+        ]
+
+        written = 0
+        for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+            result = await run_query(self.client.table("agent_capabilities").upsert(
+                rows[start:start + UPSERT_BATCH_SIZE], on_conflict="agent_id,capability_type"
+            ))
+            written += len(result.data) if result.data else 0
+        return written
+
+    async def _capability_ids_by_key(self, agent_ids) -> Dict[Tuple[str, str], str]:
+        """IDs de las capabilities existentes por (agent_id, capability_type)"""
+        agent_ids = list(agent_ids)
+        ids: Dict[Tuple[str, str], str] = {}
+        for start in range(0, len(agent_ids), USERS_IN_BATCH_SIZE):
+            result = await run_query(self.client.table("agent_capabilities").select(
+                "id, agent_id, capability_type"
+            ).in_("agent_id", agent_ids[start:start + USERS_IN_BATCH_SIZE]))
+            for row in result.data or []:
+                ids[(row["agent_id"], row["capability_type"])] = row["id"]
+        return ids
+
     async def get_agent_capabilities(self, agent_id: str) -> List[Dict]:
         """Obtener todas las capabilities de un agente"""
-        result = self.client.table("agent_capabilities").select("*").eq(
+        result = await run_query(self.client.table("agent_capabilities").select("*").eq(
             "agent_id", agent_id
-        ).eq("enabled", True).execute()
+        ).eq("enabled", True))
         return result.data if result.data else []
 
     # =============== PROTOCOLO PAIA - CONVERSATIONS ===============
@@ -672,10 +945,10 @@ class DatabaseManager:
         """Obtener o crear conversación entre dos agentes usando función de PostgreSQL"""
         try:
             # Usar la función SQL que creamos en la migración
-            result = self.client.rpc('get_or_create_conversation', {
+            result = await run_query(self.client.rpc('get_or_create_conversation', {
                 'p_agent1_id': agent1_id,
                 'p_agent2_id': agent2_id
-            }).execute()
+            }))
 
             if result.data:
                 return result.data
@@ -690,9 +963,9 @@ class DatabaseManager:
         if agent1_id > agent2_id:
             agent1_id, agent2_id = agent2_id, agent1_id
 
-        result = self.client.table("agent_conversations").select("*").eq(
+        result = await run_query(self.client.table("agent_conversations").select("*").eq(
             "agent1_id", agent1_id
-        ).eq("agent2_id", agent2_id).execute()
+        ).eq("agent2_id", agent2_id))
 
         return result.data[0] if result.data else None
 
@@ -715,7 +988,7 @@ class DatabaseManager:
             "created_at": now.isoformat()
         }
 
-        result = self.client.table("agent_messages_paia").insert(data).execute()
+        result = await run_query(self.client.table("agent_messages_paia").insert(data))
         if result.data:
             return result.data[0]
         raise Exception("Failed to save message")
@@ -729,99 +1002,191 @@ class DatabaseManager:
         elif status == "read":
             updates["read_at"] = datetime.utcnow().isoformat()
 
-        result = self.client.table("agent_messages_paia").update(updates).eq(
+        result = await run_query(self.client.table("agent_messages_paia").update(updates).eq(
             "id", message_id
-        ).execute()
+        ))
         return len(result.data) > 0
 
     async def get_conversation_messages(self, conversation_id: str, limit: int = 50) -> List[Dict]:
         """Obtener mensajes de una conversación"""
-        result = self.client.table("agent_messages_paia").select("*").eq(
+        result = await run_query(self.client.table("agent_messages_paia").select("*").eq(
+            "conversation_id", conversation_id
+        ).order("created_at", desc=True).limit(limit))
+        return result.data if result.data else []
+
+    async def get_conversation_message_headers(self, conversation_id: str, limit: int = 50) -> List[MessageHeader]:
+        """Obtener los encabezados (sin payload) de los mensajes de una conversación"""
+        result = await run_query(self.client.table("agent_messages_paia").select(MessageHeader.COLUMNS).eq(
             "conversation_id", conversation_id
-        ).order("created_at", desc=True).limit(limit).execute()
+        ).order("created_at", desc=True).limit(limit))
+        return [MessageHeader.from_row(row) for row in result.data or []]
+
+    async def get_paia_messages_page(
+        self,
+        to_agent_id: str,
+        columns: str = "id, message_type, from_agent_id, created_at",
+        limit: int = 5000,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Obtener una página de mensajes PAIA recibidos por un agente (paginación keyset).
+
+        Args:
+            to_agent_id: ID del agente receptor
+            columns: Columnas a proyectar (debe incluir id y created_at)
+            limit: Tamaño de la página
+            cursor: Cursor devuelto por la página anterior
+
+        Returns:
+            (filas ordenadas por (created_at, id), cursor de la siguiente página o None)
+        """
+        query = self.client.table("agent_messages_paia").select(columns).eq(
+            "to_agent_id", to_agent_id
+        )
+        query = apply_keyset(query, "created_at", cursor, limit, desc=False)
+
+        result = await run_query(query)
+        return split_page(result.data or [], "created_at", limit)
+
+    async def get_paia_messages_since(
+        self,
+        to_agent_ids: List[str],
+        since: str,
+        limit: int = 500
+    ) -> List[Dict]:
+        """
+        Obtener mensajes PAIA recibidos por varios agentes después de una fecha
+        (recuperación de una sesión WebSocket que ya no se puede reanudar en memoria).
+
+        Returns:
+            Filas ordenadas por created_at
+        """
+        if not to_agent_ids:
+            return []
+
+        result = await run_query(self.client.table("agent_messages_paia").select("*").in_(
+            "to_agent_id", to_agent_ids
+        ).gt("created_at", since).order("created_at").order("id").limit(limit))
         return result.data if result.data else []
 
     # =============== PROTOCOLO PAIA - AUTONOMY SETTINGS ===============
 
     async def get_autonomy_settings(self, agent_id: str) -> Optional[Dict]:
         """Obtener configuración de autonomía de un agente"""
-        result = self.client.table("autonomy_settings").select("*").eq(
+        result = await run_query(self.client.table("autonomy_settings").select("*").eq(
             "agent_id", agent_id
-        ).execute()
+        ))
         return result.data[0] if result.data else None
 
-    async def save_autonomy_settings(self, agent_id: str, settings: Dict) -> bool:
-        """Guardar o actualizar configuración de autonomía"""
-        now = datetime.utcnow()
-
-        # Verificar si ya existe
-        existing = await self.get_autonomy_settings(agent_id)
-
-        data = {
-            "agent_id": agent_id,
-            "default_level": settings.get("default_level", "supervised"),
-            "rules": settings.get("rules", []),
-            "updated_at": now.isoformat()
-        }
+    async def get_autonomy_settings_version(self, agent_id: str) -> Optional[str]:
+        """Obtener solo updated_at de la configuración de autonomía (validación de cache)"""
+        result = await run_query(self.client.table("autonomy_settings").select("updated_at").eq(
+            "agent_id", agent_id
+        ))
+        return result.data[0]["updated_at"] if result.data else None
+
+    async def save_autonomy_settings(self, agent_id: str, settings: Dict, updated_at: str = None) -> bool:
+        """Guardar o actualizar configuración de autonomía (upsert por agent_id)"""
+        saved = await self.save_autonomy_settings_many({agent_id: settings}, updated_at=updated_at)
+        return saved > 0
+
+    async def save_autonomy_settings_many(
+        self,
+        settings_by_agent: Dict[str, Dict],
+        updated_at: str = None,
+        only_missing: bool = False
+    ) -> int:
+        """
+        Guardar la configuración de autonomía de varios agentes con upserts por agent_id,
+        en requests de hasta UPSERT_BATCH_SIZE filas.
 
-        if existing:
-            # Actualizar
-            result = self.client.table("autonomy_settings").update(data).eq(
-                "agent_id", agent_id
-            ).execute()
-        else:
-            # Insertar
-            data["created_at"] = now.isoformat()
-            result = self.client.table("autonomy_settings").insert(data).execute()
+        Args:
+            settings_by_agent: agent_id -> {"default_level": ..., "rules": [...]}
+            updated_at: Versión a registrar (por defecto, ahora)
+            only_missing: Solo insertar agentes sin configuración (no pisa la existente)
 
-        return len(result.data) > 0
+        Returns:
+            Número de filas escritas
+        """
+        if not settings_by_agent:
+            return 0
+
+        version = updated_at or datetime.utcnow().isoformat()
+        rows = [
+            {
+                "agent_id": agent_id,
+                "default_level": settings.get("default_level", "supervised"),
+                "rules": settings.get("rules", []),
+                "updated_at": version
+            }
+            for agent_id, settings in settings_by_agent.items()
+        ]
+
+        # created_at queda con el default de la tabla al insertar y no se pisa al actualizar
+        written = 0
+        for start in range(0, len(rows), UPSERT_BATCH_SIZE):
+            result = await run_query(self.client.table("autonomy_settings").upsert(
+                rows[start:start + UPSERT_BATCH_SIZE],
+                on_conflict="agent_id",
+                ignore_duplicates=only_missing
+            ))
+            written += len(result.data) if result.data else 0
+        return written
 
     # =============== OAUTH CREDENTIALS ===============
 
     async def save_user_credentials(self, user_id: str, provider: str, credentials_data: Dict) -> bool:
         """
-        Guardar credenciales OAuth de un usuario.
+        Guardar credenciales OAuth de un usuario (upsert por user_id, provider).
         
         Args:
             user_id: ID del usuario
             provider: 'google', 'microsoft', etc.
             credentials_data: Diccionario con tokens (access_token, refresh_token, etc.)
         """
+        return await self.save_user_credentials_many(user_id, {provider: credentials_data}) > 0
+
+    async def save_user_credentials_many(self, user_id: str, credentials_by_provider: Dict[str, Dict]) -> int:
+        """
+        Guardar credenciales de varios proveedores de un usuario en un solo request.
+
+        Args:
+            user_id: ID del usuario
+            credentials_by_provider: provider -> credenciales
+
+        Returns:
+            Número de filas escritas (0 si falla)
+        """
+        if not credentials_by_provider:
+            return 0
+
         try:
-            now = datetime.utcnow()
-            
-            # Verificar si ya existen credenciales para este proveedor
-            existing = await self.get_user_credentials(user_id, provider)
-            
-            data = {
-                "user_id": user_id,
-                "provider": provider,
-                "credentials": credentials_data,
-                "updated_at": now.isoformat()
-            }
-            
-            if existing:
-                # Actualizar
-                result = self.client.table("user_credentials").update(data).eq(
-                    "user_id", user_id
-                ).eq("provider", provider).execute()
-            else:
-                # Insertar nuevo
-                data["created_at"] = now.isoformat()
-                result = self.client.table("user_credentials").insert(data).execute()
-                
-            return len(result.data) > 0
-            
+            now = datetime.utcnow().isoformat()
+            rows = [
+                {
+                    "user_id": user_id,
+                    "provider": provider,
+                    "credentials": credentials_data,
+                    "updated_at": now
+                }
+                for provider, credentials_data in credentials_by_provider.items()
+            ]
+
+            result = await run_query(self.client.table("user_credentials").upsert(
+                rows, on_conflict="user_id,provider"
+            ))
+            return len(result.data) if result.data else 0
+
         except Exception as e:
             print(f"[DB] Error saving user credentials: {e}")
-            return False
+            return 0
 
     async def get_user_credentials(self, user_id: str, provider: str) -> Optional[Dict]:
         """Obtener credenciales OAuth de un usuario"""
         try:
-            result = self.client.table("user_credentials").select("*").eq(
+            result = await run_query(self.client.table("user_credentials").select("*").eq(
                 "user_id", user_id
-            ).eq("provider", provider).execute()
+            ).eq("provider", provider))
             
             return result.data[0] if result.data else None
         except Exception as e:
@@ -831,9 +1196,9 @@ class DatabaseManager:
     async def delete_user_credentials(self, user_id: str, provider: str) -> bool:
         """Eliminar credenciales OAuth"""
         try:
-            result = self.client.table("user_credentials").delete().eq(
+            result = await run_query(self.client.table("user_credentials").delete().eq(
                 "user_id", user_id
-            ).eq("provider", provider).execute()
+            ).eq("provider", provider))
             return len(result.data) > 0
         except Exception as e:
             print(f"[DB] Error deleting user credentials: {e}")
@@ -3,7 +3,15 @@ import os
 import uuid
 from typing import Dict, Optional
 from datetime import datetime
-from supabase_config import supabase_client
+from supabase_config import supabase_client, run_query
+
+# Espacio de nombres para los IDs de memoria (uuid5 de perfil + clave)
+_MEMORY_ID_NAMESPACE = uuid.UUID("6f1c2a4e-5b7d-4e8f-9a0b-1c2d3e4f5a6b")
+
+
+def _memory_id(memory_profile_id: str, key: str) -> str:
+    return str(uuid.uuid5(_MEMORY_ID_NAMESPACE, f"{memory_profile_id}\x00{key}"))
+
 
 class LongTermStoreSupabase:
     def __init__(self):
@@ -12,9 +20,9 @@ class LongTermStoreSupabase:
     async def get_all(self, memory_profile_id: str) -> Dict[str, str]:
         """Obtener todas las memorias de un perfil"""
         try:
-            result = self.client.table("long_term_memories").select(
+            result = await run_query(self.client.table("long_term_memories").select(
                 "key, value"
-            ).eq("memory_profile_id", memory_profile_id).execute()
+            ).eq("memory_profile_id", memory_profile_id))
             
             return {row["key"]: row["value"] for row in result.data}
         except Exception as e:
@@ -23,43 +31,50 @@ class LongTermStoreSupabase:
 
     async def set(self, memory_profile_id: str, key: str, value: str):
         """Establecer o actualizar una memoria"""
-        now = datetime.utcnow()
-        memory_id = str(uuid.uuid4())
-        
-        data = {
-            "id": memory_id,
-            "memory_profile_id": memory_profile_id,
-            "key": key,
-            "value": value,
-            "updated_at": now.isoformat()
-        }
-        
         try:
-            # Try to update existing record first
-            existing = self.client.table("long_term_memories").select("id").eq(
-                "memory_profile_id", memory_profile_id
-            ).eq("key", key).execute()
-            
-            if existing.data:
-                # Update existing record
-                result = self.client.table("long_term_memories").update({
-                    "value": value,
-                    "updated_at": now.isoformat()
-                }).eq("memory_profile_id", memory_profile_id).eq("key", key).execute()
-            else:
-                # Insert new record
-                result = self.client.table("long_term_memories").insert(data).execute()
-                
+            await self.set_many(memory_profile_id, {key: value})
         except Exception as e:
             print(f"Error setting memory {key} for profile {memory_profile_id}: {e}")
             raise e
 
+    async def set_many(self, memory_profile_id: str, values: Dict[str, str]):
+        """
+        Establecer o actualizar varias memorias de un perfil con un upsert
+        sobre la clave única (memory_profile_id, key).
+
+        Las memorias que ya existen conservan su id (se leen antes del upsert);
+        solo las nuevas reciben un id determinista.
+        """
+        if not values:
+            return
+
+        existing = await run_query(self.client.table("long_term_memories").select(
+            "id, key"
+        ).eq("memory_profile_id", memory_profile_id).in_("key", list(values)))
+        existing_ids = {row["key"]: row["id"] for row in existing.data or []}
+
+        now = datetime.utcnow().isoformat()
+        rows = [
+            {
+                "id": existing_ids.get(key) or _memory_id(memory_profile_id, key),
+                "memory_profile_id": memory_profile_id,
+                "key": key,
+                "value": value,
+                "updated_at": now
+            }
+            for key, value in values.items()
+        ]
+
+        await run_query(self.client.table("long_term_memories").upsert(
+            rows, on_conflict="memory_profile_id,key"
+        ))
+
     async def get(self, memory_profile_id: str, key: str) -> Optional[str]:
         """Obtener una memoria específica"""
         try:
-            result = self.client.table("long_term_memories").select(
+            result = await run_query(self.client.table("long_term_memories").select(
                 "value"
-            ).eq("memory_profile_id", memory_profile_id).eq("key", key).execute()
+            ).eq("memory_profile_id", memory_profile_id).eq("key", key))
             
             if result.data:
                 return result.data[0]["value"]
@@ -72,9 +87,9 @@ class LongTermStoreSupabase:
     async def delete(self, memory_profile_id: str, key: str) -> bool:
         """Eliminar una memoria específica"""
         try:
-            result = self.client.table("long_term_memories").delete().eq(
+            result = await run_query(self.client.table("long_term_memories").delete().eq(
                 "memory_profile_id", memory_profile_id
-            ).eq("key", key).execute()
+            ).eq("key", key))
             
             return len(result.data) > 0
             
@@ -85,9 +100,9 @@ class LongTermStoreSupabase:
     async def delete_all(self, memory_profile_id: str) -> bool:
         """Eliminar todas las memorias de un perfil"""
         try:
-            result = self.client.table("long_term_memories").delete().eq(
+            result = await run_query(self.client.table("long_term_memories").delete().eq(
                 "memory_profile_id", memory_profile_id
-            ).execute()
+            ))
             
             return True
             
@@ -98,9 +113,9 @@ class LongTermStoreSupabase:
     async def get_profiles(self) -> list:
         """Obtener todos los perfiles de memoria únicos"""
         try:
-            result = self.client.table("long_term_memories").select(
+            result = await run_query(self.client.table("long_term_memories").select(
                 "memory_profile_id"
-            ).execute()
+            ))
             
             # Get unique profile IDs
             profiles = list(set(row["memory_profile_id"] for row in result.data))
@@ -113,9 +128,9 @@ class LongTermStoreSupabase:
     async def get_profile_stats(self, memory_profile_id: str) -> Dict:
         """Obtener estadísticas de un perfil de memoria"""
         try:
-            result = self.client.table("long_term_memories").select(
+            result = await run_query(self.client.table("long_term_memories").select(
                 "key, updated_at"
-            ).eq("memory_profile_id", memory_profile_id).execute()
+            ).eq("memory_profile_id", memory_profile_id))
             
             if not result.data:
                 return {
@@ -149,11 +164,11 @@ class LongTermStoreSupabase:
         try:
             # Supabase doesn't have full text search in the basic plan,
             # so we'll use ilike for pattern matching
-            result = self.client.table("long_term_memories").select(
+            result = await run_query(self.client.table("long_term_memories").select(
                 "key, value"
             ).eq("memory_profile_id", memory_profile_id).or_(
                 f"key.ilike.%{search_term}%,value.ilike.%{search_term}%"
-            ).execute()
+            ))
             
             return {row["key"]: row["value"] for row in result.data}
             
@@ -0,0 +1,123 @@
+"""
+Tipos de fila compactos para los registros de la BD.
+
+Las filas usan ``__slots__`` (sin ``__dict__`` por instancia) y guardan los
+timestamps como el string ISO crudo hasta que se leen por primera vez: armar
+una lista de filas no cuesta ningún ``datetime.fromisoformat`` de campos que
+quien llama nunca usa.
+"""
+from datetime import datetime
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+
+def parse_timestamp(value: Any) -> Optional[datetime]:
+    """Parsear un timestamp de Supabase/PostgREST (admite el sufijo 'Z')"""
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+class LazyTimestamp:
+    """
+    Descriptor de un campo timestamp guardado crudo en el slot ``_<nombre>``.
+    El string se parsea en el primer acceso y el datetime lo reemplaza.
+    """
+
+    def __set_name__(self, owner, name: str):
+        self.name = name
+        self.slot = "_" + name
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        value = getattr(obj, self.slot)
+        if isinstance(value, str):
+            value = parse_timestamp(value)
+            object.__setattr__(obj, self.slot, value)
+        return value
+
+    def __set__(self, obj, value):
+        raise AttributeError(f"{type(obj).__name__} es de solo lectura")
+
+
+class Row:
+    """
+    Clase base de los tipos de fila con slots.
+
+    Las subclases declaran ``__slots__`` (``_<nombre>`` para los campos
+    LazyTimestamp); de ahí se derivan ``FIELDS`` y ``COLUMNS`` (la proyección
+    del select). Las filas también admiten acceso de solo lectura tipo mapping
+    (``row["name"]``, ``row.get(...)``, ``dict(row)``) para el código escrito
+    contra filas dict.
+
+    Una fila es inmutable una vez construida, así que la misma instancia se
+    puede compartir entre llamadores (ej: la entrega una cache); ``to_dict()``
+    da una copia modificable.
+    """
+
+    __slots__ = ()
+
+    FIELDS: Tuple[str, ...] = ()
+    COLUMNS: str = ""
+    # Pares (campo, slot): los campos LazyTimestamp se guardan en "_<campo>"
+    _FIELD_SLOTS: Tuple[Tuple[str, str], ...] = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        fields = []
+        field_slots = []
+        for klass in reversed(cls.__mro__):
+            for slot in klass.__dict__.get("__slots__", ()):
+                name = slot[1:] if isinstance(getattr(cls, slot[1:], None), LazyTimestamp) else slot
+                fields.append(name)
+                field_slots.append((name, slot))
+        cls.FIELDS = tuple(fields)
+        cls._FIELD_SLOTS = tuple(field_slots)
+        cls.COLUMNS = ", ".join(fields)
+
+    def __init__(self, **values):
+        for name, slot in self._FIELD_SLOTS:
+            object.__setattr__(self, slot, values.get(name))
+
+    @classmethod
+    def from_row(cls, data: Dict[str, Any]):
+        """Construir desde una fila de PostgREST (las columnas ausentes quedan en None)"""
+        row = cls.__new__(cls)
+        for name, slot in cls._FIELD_SLOTS:
+            object.__setattr__(row, slot, data.get(name))
+        return row
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError(f"{self.__class__.__name__} es de solo lectura")
+
+    def __delattr__(self, name: str):
+        raise AttributeError(f"{self.__class__.__name__} es de solo lectura")
+
+    # Acceso tipo mapping
+    def keys(self) -> Tuple[str, ...]:
+        return self.FIELDS
+
+    def __getitem__(self, name: str) -> Any:
+        if name not in self.FIELDS:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def get(self, name: str, default: Any = None) -> Any:
+        return getattr(self, name) if name in self.FIELDS else default
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.FIELDS)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    def __eq__(self, other) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self.FIELDS)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        values = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.FIELDS)
+        return f"{self.__class__.__name__}({values})"
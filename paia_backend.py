@@ -1,5 +1,6 @@
 import asyncio
 import json
+import time
 import uuid
 from datetime import datetime
 from typing import Dict, List, Optional
@@ -25,8 +26,9 @@ import requests  # Para Telegram
 import httpx  # Para verificar servidor MCP
 from memory_manager import MemoryManager, Message
 from auth_manager_supabase import AuthManager
-from db_manager_supabase import DatabaseManager
+from db_manager_supabase import DatabaseManager, AgentSummary
 from supabase_config import supabase_client
+from utils.dataloader import request_scope
 
 # === SERVICIOS ===
 from services.whatsapp_service import WhatsAppService
@@ -66,6 +68,7 @@ from paia_protocol import (
     PAIAWebSocketHandler,
     PAIARequestMessage,
     PAIAChatMessage,
+    AgentProfile,
     CapabilityBuilder,
     AutonomyLevel,
     AutonomySettings
@@ -83,6 +86,16 @@ from config.settings import (
     CORS_ALLOW_HEADERS,
     LLM_MODEL,
     LLM_TEMPERATURE,
+    WS_OUTBOUND_QUEUE_SIZE,
+    WS_OVERFLOW_POLICY,
+    WS_HEARTBEAT_INTERVAL,
+    WS_IDLE_TIMEOUT,
+    WS_BATCH_WINDOW_MS,
+    WS_INBOUND_CONCURRENCY,
+    WS_INBOUND_BACKLOG,
+    WS_REPLAY_SIZE,
+    WS_RESUME_WINDOW,
+    PAIA_REGISTRATION_CHUNK_SIZE,
 )
 from models.agent import PAIAAgent, AgentConnection, AgentMessage
 
@@ -113,7 +126,8 @@ gmail_service = GmailService(db_manager)
 # =============== PROTOCOLO PAIA - VARIABLES GLOBALES ===============
 paia_router: Optional[PAIAMessageRouter] = None
 paia_discovery: Optional[PAIADiscoveryService] = None
-paia_autonomy: Optional[AutonomyManager] = None
+# El gestor de autonomía se crea al importar para que los routers compartan su cache
+paia_autonomy: Optional[AutonomyManager] = AutonomyManager(db_manager=db_manager)
 paia_ws_handler: Optional[PAIAWebSocketHandler] = None
 
 # =============== CONFIGURACIÓN DE WHATSAPP ===============
@@ -146,6 +160,13 @@ app.add_middleware(
     allow_headers=CORS_ALLOW_HEADERS,
 )
 
+
+@app.middleware("http")
+async def request_scope_middleware(request: Request, call_next):
+    """Agrupar y memoizar las lecturas de agentes/usuarios de cada request (DataLoader)"""
+    with request_scope():
+        return await call_next(request)
+
 # Storage en memoria
 agents_store: Dict[str, PAIAAgent] = {}
 connections_store: Dict[str, AgentConnection] = {}
@@ -245,8 +266,9 @@ async def init_paia_protocol():
         paia_discovery = PAIADiscoveryService(db_manager)
         print("[PAIA] Discovery service inicializado")
 
-        # 2. Crear gestor de autonomía
-        paia_autonomy = AutonomyManager()
+        # 2. Gestor de autonomía (cache write-through, carga settings bajo demanda)
+        if paia_autonomy is None:
+            paia_autonomy = AutonomyManager(db_manager=db_manager)
         print("[PAIA] Autonomy manager inicializado")
 
         # 3. Crear router de mensajes
@@ -262,7 +284,16 @@ async def init_paia_protocol():
         paia_ws_handler = PAIAWebSocketHandler(
             router=paia_router,
             auth_manager=auth_manager,
-            db_manager=db_manager
+            db_manager=db_manager,
+            max_queue_size=WS_OUTBOUND_QUEUE_SIZE,
+            overflow_policy=WS_OVERFLOW_POLICY,
+            heartbeat_interval=WS_HEARTBEAT_INTERVAL,
+            idle_timeout=WS_IDLE_TIMEOUT,
+            batch_window_ms=WS_BATCH_WINDOW_MS,
+            inbound_concurrency=WS_INBOUND_CONCURRENCY,
+            inbound_backlog=WS_INBOUND_BACKLOG,
+            replay_size=WS_REPLAY_SIZE,
+            resume_window=WS_RESUME_WINDOW
         )
         print("[PAIA] WebSocket handler inicializado")
 
@@ -279,26 +310,107 @@ async def init_paia_protocol():
         import traceback
         traceback.print_exc()
 
+def build_agent_capabilities(expertise: str) -> list:
+    """Capabilities de un agente según su expertise"""
+    # Capabilities base para todos los agentes
+    capabilities = [CapabilityBuilder.chat_message()]
+
+    # Capabilities específicas por expertise
+    if expertise == 'calendar' or expertise == 'scheduling':
+        capabilities.extend([
+            CapabilityBuilder.calendar_check_availability(),
+            CapabilityBuilder.calendar_schedule_event()
+        ])
+
+    return capabilities
+
+def _capability_rows(agent_id: str, capabilities: list) -> List[dict]:
+    """Filas de agent_capabilities para un agente"""
+    return [
+        {
+            "agent_id": agent_id,
+            "capability_name": cap.name,
+            "capability_type": cap.message_type,
+            "description": cap.description,
+            "input_schema": cap.input_schema,
+            "output_schema": cap.output_schema,
+            "requires_approval": cap.requires_approval,
+            "autonomy_level": cap.autonomy_level
+        }
+        for cap in capabilities
+    ]
+
 async def register_existing_agents_in_paia():
-    """Registrar todos los agentes existentes en el protocolo PAIA"""
+    """
+    Registrar todos los agentes existentes en el protocolo PAIA, por chunks.
+
+    Cada página de agentes (proyección de resumen, ordenada por id) se arma en
+    memoria -perfiles, capabilities y autonomía por defecto- y se escribe con
+    upserts por lote mientras ya se lee la página siguiente.
+    """
     try:
         print("[PAIA] Registrando agentes existentes en el protocolo...")
+        started = time.perf_counter()
 
-        # Obtener todos los agentes de la BD
-        result = supabase_client.table("agents").select("*").execute()
+        # Capabilities y autonomía por defecto dependen solo del expertise
+        capabilities_by_expertise: Dict[str, list] = {}
+        settings_by_expertise: Dict[str, dict] = {}
 
         registered_count = 0
-        for agent_data in result.data:
+        next_page = asyncio.ensure_future(
+            db_manager.get_agent_summaries_after(None, PAIA_REGISTRATION_CHUNK_SIZE)
+        )
+        while next_page is not None:
+            agents = await next_page
+            next_page = None
+            if not agents:
+                break
+            if len(agents) == PAIA_REGISTRATION_CHUNK_SIZE:
+                next_page = asyncio.ensure_future(
+                    db_manager.get_agent_summaries_after(agents[-1].id, PAIA_REGISTRATION_CHUNK_SIZE)
+                )
+
+            profiles = []
+            capability_rows = []
+            settings_by_agent = {}
+            for agent in agents:
+                expertise = agent.expertise or 'general'
+                capabilities = capabilities_by_expertise.get(expertise)
+                if capabilities is None:
+                    capabilities = capabilities_by_expertise[expertise] = build_agent_capabilities(expertise)
+                    settings_by_expertise[expertise] = paia_autonomy.create_default_settings(expertise).to_dict()
+
+                profiles.append(AgentProfile(
+                    agent_id=agent.id,
+                    user_id=agent.user_id,
+                    agent_name=agent.name,
+                    expertise=[expertise],
+                    capabilities=capabilities,
+                    is_public=agent.is_public if agent.is_public is not None else True
+                ))
+                capability_rows.extend(_capability_rows(agent.id, capabilities))
+                settings_by_agent[agent.id] = settings_by_expertise[expertise]
+
             try:
-                await register_agent_in_paia(
-                    agent_id=agent_data["id"],
-                    agent_data=agent_data
+                # Autonomía: solo agentes sin configuración (no pisa la personalizada)
+                await asyncio.gather(
+                    db_manager.save_agent_capabilities_many(capability_rows),
+                    db_manager.save_autonomy_settings_many(settings_by_agent, only_missing=True)
                 )
-                registered_count += 1
             except Exception as e:
-                print(f"[PAIA] Error registrando agente {agent_data['id']}: {e}")
-
-        print(f"[PAIA] {registered_count} agentes registrados en el protocolo")
+                print(f"[PAIA] Error registrando chunk de {len(agents)} agentes desde {agents[0].id}: {e}")
+                continue
+
+            paia_discovery.register_agents(profiles)
+            if paia_ws_handler:
+                for agent in agents:
+                    paia_ws_handler.add_agent(agent.user_id, agent.id)
+            registered_count += len(agents)
+
+        print(
+            f"[PAIA] {registered_count} agentes registrados en el protocolo "
+            f"({time.perf_counter() - started:.1f}s)"
+        )
 
     except Exception as e:
         print(f"[PAIA] Error en register_existing_agents_in_paia: {e}")
@@ -307,18 +419,8 @@ async def register_agent_in_paia(agent_id: str, agent_data: dict):
     """Registrar un agente en el protocolo PAIA con sus capabilities"""
 
     # Definir capabilities según expertise
-    capabilities = []
     expertise = agent_data.get('expertise', 'general')
-
-    # Capabilities base para todos los agentes
-    capabilities.append(CapabilityBuilder.chat_message())
-
-    # Capabilities específicas por expertise
-    if expertise == 'calendar' or expertise == 'scheduling':
-        capabilities.extend([
-            CapabilityBuilder.calendar_check_availability(),
-            CapabilityBuilder.calendar_schedule_event()
-        ])
+    capabilities = build_agent_capabilities(expertise)
 
     # Registrar en discovery service
     await paia_discovery.register_agent(
@@ -330,29 +432,30 @@ async def register_agent_in_paia(agent_id: str, agent_data: dict):
         is_public=agent_data.get('is_public', True)
     )
 
-    # Guardar capabilities en BD
-    for cap in capabilities:
-        try:
-            await db_manager.save_agent_capability({
-                "agent_id": agent_id,
-                "capability_name": cap.name,
-                "capability_type": cap.message_type,
-                "description": cap.description,
-                "input_schema": cap.input_schema,
-                "output_schema": cap.output_schema,
-                "requires_approval": cap.requires_approval,
-                "autonomy_level": cap.autonomy_level
-            })
-        except Exception as e:
-            # Ignorar si ya existe
-            pass
+    # Guardar capabilities en BD (un upsert por (agent_id, capability_type))
+    try:
+        await db_manager.save_agent_capabilities_many(_capability_rows(agent_id, capabilities))
+    except Exception as e:
+        print(f"[PAIA] Error guardando capabilities de {agent_id}: {e}")
 
     # Configurar autonomía por defecto
     settings = paia_autonomy.create_default_settings(expertise)
-    paia_autonomy.set_agent_settings(agent_id, settings)
 
-    # Guardar settings en BD
-    await db_manager.save_autonomy_settings(agent_id, settings.to_dict())
+    # Guardar settings en cache y BD (write-through)
+    await paia_autonomy.save_agent_settings(agent_id, settings)
+
+    # Indexar el agente para broadcasts si su dueño está conectado
+    if paia_ws_handler:
+        paia_ws_handler.add_agent(agent_data['user_id'], agent_id)
+
+async def unregister_agent_from_paia(agent_id: str):
+    """Quitar un agente eliminado de los registros en memoria del protocolo PAIA"""
+    if paia_discovery:
+        paia_discovery.remove_from_cache(agent_id)
+    if paia_autonomy:
+        paia_autonomy.evict_settings(agent_id)
+    if paia_ws_handler:
+        paia_ws_handler.remove_agent(agent_id)
 
 async def persistent_agents_supervisor():
     """Supervisor que mantiene activos los agentes persistentes"""
@@ -486,8 +589,8 @@ async def auto_connect_friend_agents(user1_id: str, user2_id: str) -> dict:
     try:
         print(f"[AUTO-CONNECT] Iniciando auto-conexion de agentes entre {user1_id} y {user2_id}")
 
-        user1_public = await db_manager.get_public_agents_by_user(user1_id)
-        user2_public = await db_manager.get_public_agents_by_user(user2_id)
+        user1_public = await db_manager.get_public_agents_by_user(user1_id, row_type=AgentSummary)
+        user2_public = await db_manager.get_public_agents_by_user(user2_id, row_type=AgentSummary)
 
         connections_created = 0
         connections_failed = 0
@@ -538,10 +641,11 @@ health_router = create_health_router(
     message_history=message_history,
     telegram_bot_token=TELEGRAM_BOT_TOKEN,
     whatsapp_service=whatsapp_service,
-    paia_router=paia_router,
-    paia_discovery=paia_discovery,
-    paia_autonomy=paia_autonomy,
-    paia_ws_handler=paia_ws_handler
+    # Se crean en init_paia_protocol (startup): se consultan en cada request
+    get_paia_router=lambda: paia_router,
+    get_paia_discovery=lambda: paia_discovery,
+    get_paia_autonomy=lambda: paia_autonomy,
+    get_paia_ws_handler=lambda: paia_ws_handler
 )
 app.include_router(health_router)
 
@@ -564,7 +668,8 @@ agents_router = create_agents_router(
     ensure_agent_loaded_func=ensure_agent_loaded,
     whatsapp_service=whatsapp_service,
     telegram_default_chat_id=TELEGRAM_DEFAULT_CHAT_ID,
-    register_agent_in_paia_func=register_agent_in_paia  # Para registrar capabilities y autonomia
+    register_agent_in_paia_func=register_agent_in_paia,  # Para registrar capabilities y autonomia
+    unregister_agent_from_paia_func=unregister_agent_from_paia  # Para limpiar el protocolo al eliminar
 )
 app.include_router(agents_router)
 
@@ -34,6 +34,7 @@ from .websocket_handler import (
     PAIAWebSocketHandler,
     create_paia_websocket_endpoint
 )
+from .connections import PAIAConnection, ConnectionRegistry
 
 __version__ = "1.0.0"
 __all__ = [
@@ -69,5 +70,7 @@ __all__ = [
 
     # WebSocket
     "PAIAWebSocketHandler",
-    "create_paia_websocket_endpoint"
+    "create_paia_websocket_endpoint",
+    "PAIAConnection",
+    "ConnectionRegistry"
 ]
@@ -5,9 +5,15 @@ Sistema de gestión de niveles de autonomía para agentes
 
 from enum import Enum
 from typing import Dict, Any, Optional, List, Callable
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from collections import OrderedDict
+from datetime import datetime, timezone
+import asyncio
+import time
 import re
 
+from .autonomy_compiler import CompiledRuleSet, build_eval_context, compile_rule
+
 
 class AutonomyLevel(str, Enum):
     """Niveles de autonomía para agentes PAIA"""
@@ -24,6 +30,9 @@ class AutonomyRule:
     autonomy_level: AutonomyLevel
     priority: int = 0                 # Mayor prioridad = se evalúa primero
 
+    # Condición compilada (se genera en la primera evaluación)
+    _compiled: Any = field(default=None, init=False, repr=False, compare=False)
+
     def evaluate(self, message: Dict[str, Any], context: Dict[str, Any] = None) -> bool:
         """
         Evaluar si esta regla aplica al mensaje.
@@ -35,26 +44,14 @@ class AutonomyRule:
         Returns:
             True si la condición se cumple
         """
-        try:
-            # Crear contexto de evaluación
-            eval_context = {
-                "message_type": message.get("type", ""),
-                "from_agent": message.get("from_agent_id", ""),
-                "payload": message.get("payload", {}),
-                **(context or {})
-            }
-
-            # Evaluar la condición
-            # Ejemplos de condiciones:
-            # - "message_type == 'paia.request.calendar.check_availability'"
-            # - "message_type.startswith('paia.request.calendar')"
-            # - "from_agent in trusted_agents"
-
-            return eval(self.condition, {"__builtins__": {}}, eval_context)
+        # Ejemplos de condiciones:
+        # - "message_type == 'paia.request.calendar.check_availability'"
+        # - "message_type.startswith('paia.request.calendar')"
+        # - "from_agent in trusted_agents"
+        if self._compiled is None or self._compiled.condition != self.condition:
+            self._compiled = compile_rule(self)
 
-        except Exception as e:
-            print(f"[AUTONOMY] Error evaluando regla '{self.condition}': {e}")
-            return False
+        return self._compiled.matches(build_eval_context(message, context))
 
 
 @dataclass
@@ -63,12 +60,25 @@ class AutonomySettings:
     default_level: AutonomyLevel = AutonomyLevel.SUPERVISED
     rules: List[AutonomyRule] = None
 
+    # Reglas compiladas (cache, se invalida al modificar las reglas)
+    _compiled: Optional[CompiledRuleSet] = field(default=None, init=False, repr=False, compare=False)
+
     def __post_init__(self):
         if self.rules is None:
             self.rules = []
         # Ordenar reglas por prioridad (mayor primero)
         self.rules.sort(key=lambda r: r.priority, reverse=True)
 
+    def compiled(self) -> CompiledRuleSet:
+        """Obtener el conjunto de reglas compiladas (se compila una sola vez)"""
+        if self._compiled is None:
+            self._compiled = CompiledRuleSet(self.rules)
+        return self._compiled
+
+    def invalidate_compiled(self):
+        """Descartar las reglas compiladas tras modificar self.rules directamente"""
+        self._compiled = None
+
     def get_autonomy_level(
         self,
         message: Dict[str, Any],
@@ -84,10 +94,10 @@ class AutonomySettings:
         Returns:
             Nivel de autonomía a aplicar
         """
-        # Evaluar reglas en orden de prioridad
-        for rule in self.rules:
-            if rule.evaluate(message, context):
-                return rule.autonomy_level
+        # Evaluar reglas compiladas en orden de prioridad (contexto construido una vez)
+        level = self.compiled().match(build_eval_context(message, context))
+        if level is not None:
+            return level
 
         # Si ninguna regla aplica, usar nivel por defecto
         return self.default_level
@@ -107,6 +117,7 @@ class AutonomySettings:
         self.rules.append(rule)
         # Re-ordenar por prioridad
         self.rules.sort(key=lambda r: r.priority, reverse=True)
+        self.invalidate_compiled()
 
     def to_dict(self) -> Dict[str, Any]:
         """Convertir a diccionario para serialización"""
@@ -137,18 +148,107 @@ class AutonomySettings:
         return cls(default_level=default_level, rules=rules)
 
 
+# Tamaño máximo del memo de decisiones (agent_id, message_type, from_agent)
+DECISION_MEMO_SIZE = 4096
+
+# Segundos tras los cuales una entrada cacheada se revalida contra updated_at en BD
+SETTINGS_REVALIDATE_AFTER = 60.0
+
+
+def _normalize_version(updated_at: Any) -> Optional[str]:
+    """Normalizar updated_at de BD a un ISO UTC sin zona para comparar versiones"""
+    if not updated_at:
+        return None
+    try:
+        value = updated_at if isinstance(updated_at, datetime) else datetime.fromisoformat(
+            str(updated_at).replace('Z', '+00:00')
+        )
+        if value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value.isoformat()
+    except ValueError:
+        return str(updated_at)
+
+
 class AutonomyManager:
     """
     Gestor central de autonomía para agentes PAIA.
     Maneja las configuraciones de autonomía de todos los agentes.
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        db_manager=None,
+        decision_memo_size: int = DECISION_MEMO_SIZE,
+        revalidate_after: float = SETTINGS_REVALIDATE_AFTER
+    ):
+        """
+        Args:
+            db_manager: Gestor de base de datos (opcional, habilita el cache write-through)
+            decision_memo_size: Tamaño máximo del memo de decisiones
+            revalidate_after: Segundos antes de revalidar una entrada contra la BD
+        """
+        self.db_manager = db_manager
         self._agent_settings: Dict[str, AutonomySettings] = {}
 
+        # Cache versionado: agent_id -> updated_at normalizado (None = sin fila en BD)
+        self._versions: Dict[str, Optional[str]] = {}
+        # agent_id -> instante (monotonic) de la última carga o validación
+        self._validated_at: Dict[str, float] = {}
+        # Cargas en curso (single-flight): agent_id -> Future
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._revalidate_after = revalidate_after
+
+        # Memo LRU de decisiones para reglas que no leen el payload:
+        # (agent_id, message_type, from_agent) -> (CompiledRuleSet, nivel o None)
+        self._decision_memo: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._decision_memo_size = decision_memo_size
+        self._memo_hits = 0
+        self._memo_misses = 0
+
     def set_agent_settings(self, agent_id: str, settings: AutonomySettings):
         """Configurar autonomía para un agente"""
         self._agent_settings[agent_id] = settings
+        self.invalidate_decisions(agent_id)
+
+    def add_rule(
+        self,
+        agent_id: str,
+        condition: str,
+        autonomy_level: AutonomyLevel,
+        priority: int = 0
+    ):
+        """Agregar una regla a la configuración de un agente (la crea si no existe)"""
+        settings = self.get_agent_settings(agent_id)
+        if settings is None:
+            settings = AutonomySettings()
+            self._agent_settings[agent_id] = settings
+
+        settings.add_rule(condition, autonomy_level, priority)
+        self.invalidate_decisions(agent_id)
+
+    def invalidate_decisions(self, agent_id: str = None):
+        """
+        Descartar decisiones memorizadas.
+
+        Args:
+            agent_id: Agente cuyas decisiones descartar (None = todas)
+        """
+        if agent_id is None:
+            self._decision_memo.clear()
+            return
+
+        for key in [k for k in self._decision_memo if k[0] == agent_id]:
+            del self._decision_memo[key]
+
+    def get_decision_memo_stats(self) -> Dict[str, int]:
+        """Estadísticas del memo de decisiones"""
+        return {
+            "size": len(self._decision_memo),
+            "max_size": self._decision_memo_size,
+            "hits": self._memo_hits,
+            "misses": self._memo_misses
+        }
 
     def get_agent_settings(self, agent_id: str) -> Optional[AutonomySettings]:
         """Obtener configuración de autonomía de un agente"""
@@ -177,7 +277,36 @@ class AutonomyManager:
             # Configuración por defecto si no hay settings
             return AutonomyLevel.SUPERVISED
 
-        return settings.get_autonomy_level(message, context)
+        compiled = settings.compiled()
+        message_type = message.get("type", "")
+        from_agent = message.get("from_agent_id", "")
+
+        # Solo se memoriza si ninguna regla lee el payload ni contexto adicional
+        if (
+            context
+            or not compiled.memoizable
+            or not isinstance(message_type, str)
+            or not isinstance(from_agent, str)
+        ):
+            return settings.get_autonomy_level(message, context)
+
+        key = (agent_id, message_type, from_agent)
+        entry = self._decision_memo.get(key)
+
+        # La entrada es válida mientras el conjunto compilado no haya cambiado (add_rule)
+        if entry is not None and entry[0] is compiled:
+            self._decision_memo.move_to_end(key)
+            self._memo_hits += 1
+            matched = entry[1]
+        else:
+            self._memo_misses += 1
+            matched = compiled.match(build_eval_context(message))
+            self._decision_memo[key] = (compiled, matched)
+            self._decision_memo.move_to_end(key)
+            if len(self._decision_memo) > self._decision_memo_size:
+                self._decision_memo.popitem(last=False)
+
+        return matched if matched is not None else settings.default_level
 
     def requires_approval(
         self,
@@ -343,6 +472,117 @@ class AutonomyManager:
             return settings.to_dict()
         return None
 
+    # ==================== CACHE WRITE-THROUGH ====================
+
+    def get_settings_version(self, agent_id: str) -> Optional[str]:
+        """Versión (updated_at) de la configuración cacheada de un agente"""
+        return self._versions.get(agent_id)
+
+    async def ensure_settings_loaded(self, agent_id: str) -> Optional[AutonomySettings]:
+        """
+        Obtener la configuración de un agente cargándola desde BD si hace falta.
+
+        La primera consulta carga la fila completa; las siguientes se sirven desde
+        memoria y, pasado revalidate_after, solo se compara updated_at. Las cargas
+        concurrentes del mismo agente comparten una única consulta (single-flight).
+
+        Args:
+            agent_id: ID del agente
+
+        Returns:
+            AutonomySettings, o None si el agente no tiene configuración
+        """
+        if not self.db_manager:
+            return self.get_agent_settings(agent_id)
+
+        validated_at = self._validated_at.get(agent_id)
+        if validated_at is not None and time.monotonic() - validated_at < self._revalidate_after:
+            return self.get_agent_settings(agent_id)
+
+        inflight = self._inflight.get(agent_id)
+        if inflight is None:
+            inflight = asyncio.ensure_future(
+                self._load_settings(agent_id, revalidate=validated_at is not None)
+            )
+            self._inflight[agent_id] = inflight
+            inflight.add_done_callback(lambda _: self._inflight.pop(agent_id, None))
+
+        await asyncio.shield(inflight)
+        return self.get_agent_settings(agent_id)
+
+    async def _load_settings(self, agent_id: str, revalidate: bool):
+        """Cargar (o revalidar por versión) la configuración de un agente desde BD"""
+        started_at = time.monotonic()
+        try:
+            if revalidate:
+                version = _normalize_version(
+                    await self.db_manager.get_autonomy_settings_version(agent_id)
+                )
+                if version == self._versions.get(agent_id):
+                    self._validated_at[agent_id] = time.monotonic()
+                    return
+                print(f"[AUTONOMY] Settings de {agent_id} desactualizados, recargando")
+
+            row = await self.db_manager.get_autonomy_settings(agent_id)
+
+            # Un save_agent_settings concurrente ya dejó una versión más nueva
+            if self._validated_at.get(agent_id, 0.0) > started_at:
+                return
+
+            if row:
+                self.load_settings_from_db(agent_id, row)
+                self._versions[agent_id] = _normalize_version(row.get("updated_at"))
+            else:
+                # Entrada negativa: el agente usa el nivel por defecto sin volver a consultar
+                self._agent_settings.pop(agent_id, None)
+                self.invalidate_decisions(agent_id)
+                self._versions[agent_id] = None
+
+        except Exception as e:
+            print(f"[AUTONOMY] Error cargando settings de {agent_id} desde BD: {e}")
+
+        # También tras un error, para no consultar la BD en cada mensaje
+        self._validated_at[agent_id] = time.monotonic()
+
+    async def save_agent_settings(self, agent_id: str, settings: AutonomySettings) -> bool:
+        """
+        Configurar autonomía de un agente y persistirla (write-through).
+
+        Args:
+            agent_id: ID del agente
+            settings: Nueva configuración
+
+        Returns:
+            True si se guardó en BD
+        """
+        self.set_agent_settings(agent_id, settings)
+
+        if not self.db_manager:
+            return False
+
+        version = datetime.utcnow().isoformat()
+        saved = await self.db_manager.save_autonomy_settings(
+            agent_id,
+            settings.to_dict(),
+            updated_at=version
+        )
+
+        if saved:
+            self._versions[agent_id] = _normalize_version(version)
+            self._validated_at[agent_id] = time.monotonic()
+        else:
+            # Forzar recarga en el próximo uso
+            self._validated_at.pop(agent_id, None)
+
+        return saved
+
+    def evict_settings(self, agent_id: str):
+        """Quitar un agente del cache (ej: al eliminar el agente)"""
+        self._agent_settings.pop(agent_id, None)
+        self._versions.pop(agent_id, None)
+        self._validated_at.pop(agent_id, None)
+        self.invalidate_decisions(agent_id)
+
 
 # ==================== PRESETS DE AUTONOMÍA ====================
 
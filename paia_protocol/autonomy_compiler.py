@@ -0,0 +1,362 @@
+"""
+PAIA Protocol - Autonomy Rule Compiler
+Compilación de condiciones de reglas de autonomía a código validado
+"""
+
+import ast
+from types import CodeType
+from typing import Dict, Any, Optional, List, Tuple
+
+
+# Nodos AST permitidos dentro de una condición
+_ALLOWED_NODES = (
+    ast.Expression,
+    ast.BoolOp, ast.And, ast.Or,
+    ast.UnaryOp, ast.Not, ast.USub,
+    ast.Compare,
+    ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE,
+    ast.In, ast.NotIn, ast.Is, ast.IsNot,
+    ast.Name, ast.Load,
+    ast.Constant,
+    ast.List, ast.Tuple, ast.Set,
+    ast.Subscript, ast.Slice,
+    ast.Attribute, ast.Call,
+)
+
+# Métodos que una condición puede invocar (solo lectura sobre str/dict)
+_ALLOWED_METHODS = frozenset({
+    "startswith", "endswith", "split", "rsplit",
+    "lower", "upper", "strip", "lstrip", "rstrip",
+    "get",
+})
+
+# Globals de evaluación: sin builtins
+_EVAL_GLOBALS: Dict[str, Any] = {"__builtins__": {}}
+
+# Marca de fin de prefijo en el trie de message_type
+_TRIE_END = ""
+
+# Máximo de message_type distintos cuyo candidato indexado se memoriza
+_INDEX_CACHE_SIZE = 1024
+
+# Variables de las que puede depender una decisión memorizable
+MEMOIZABLE_VARIABLES = frozenset({"message_type", "from_agent"})
+
+
+class RuleCompileError(ValueError):
+    """Condición de regla inválida o no permitida"""
+
+
+def _validate_node(node: ast.AST, condition: str):
+    """Verificar que el árbol solo usa construcciones permitidas"""
+    # Los atributos solo se permiten como método invocado (ej: "x.get(...)", no "x.get")
+    called = {id(c.func) for c in ast.walk(node) if isinstance(c, ast.Call)}
+
+    for child in ast.walk(node):
+        if not isinstance(child, _ALLOWED_NODES):
+            raise RuleCompileError(
+                f"Construcción no permitida '{type(child).__name__}' en '{condition}'"
+            )
+
+        if isinstance(child, ast.Name) and child.id.startswith("_"):
+            raise RuleCompileError(f"Nombre no permitido '{child.id}' en '{condition}'")
+
+        if isinstance(child, ast.Attribute):
+            if child.attr not in _ALLOWED_METHODS or id(child) not in called:
+                raise RuleCompileError(f"Atributo no permitido '{child.attr}' en '{condition}'")
+
+        if isinstance(child, ast.Call):
+            if not isinstance(child.func, ast.Attribute) or child.keywords:
+                raise RuleCompileError(f"Llamada no permitida en '{condition}'")
+
+
+def parse_condition(condition: str) -> ast.Expression:
+    """
+    Parsear y validar una condición contra la whitelist.
+
+    Args:
+        condition: Condición en formato string
+
+    Returns:
+        Árbol AST validado
+
+    Raises:
+        RuleCompileError: Si la condición no es válida o usa construcciones prohibidas
+    """
+    try:
+        tree = ast.parse(condition.strip(), mode="eval")
+    except SyntaxError as e:
+        raise RuleCompileError(f"Sintaxis inválida en '{condition}': {e}") from e
+
+    _validate_node(tree, condition)
+    return tree
+
+
+def compile_condition(condition: str) -> CodeType:
+    """
+    Compilar una condición a un code object reutilizable.
+
+    Args:
+        condition: Condición en formato string
+
+    Returns:
+        Code object listo para evaluar con build_eval_context()
+    """
+    tree = parse_condition(condition)
+    return compile(tree, "<autonomy-rule>", "eval")
+
+
+def build_eval_context(
+    message: Dict[str, Any],
+    context: Dict[str, Any] = None
+) -> Dict[str, Any]:
+    """
+    Construir el contexto de evaluación de un mensaje.
+    Se construye una sola vez por mensaje y se comparte entre todas las reglas.
+    """
+    return {
+        "message_type": message.get("type", ""),
+        "from_agent": message.get("from_agent_id", ""),
+        "payload": message.get("payload", {}),
+        **(context or {})
+    }
+
+
+def free_variables(node: ast.AST) -> frozenset:
+    """Nombres que una condición lee del contexto de evaluación"""
+    return frozenset(n.id for n in ast.walk(node) if isinstance(n, ast.Name))
+
+
+def _str_constants(node: ast.AST) -> Optional[List[str]]:
+    """Extraer una constante str o una colección literal de constantes str"""
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return [node.value]
+    if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+        values = [e.value for e in node.elts if isinstance(e, ast.Constant) and isinstance(e.value, str)]
+        if len(values) == len(node.elts):
+            return values
+    return None
+
+
+def _is_message_type(node: ast.AST) -> bool:
+    return isinstance(node, ast.Name) and node.id == "message_type"
+
+
+def index_keys(node: ast.AST) -> Optional[List[Tuple[str, str]]]:
+    """
+    Reconocer condiciones indexables sobre message_type.
+
+    Patrones soportados (y sus combinaciones con "or"):
+    - message_type == 'x'  /  'x' == message_type
+    - message_type in ['x', 'y']
+    - message_type.startswith('x')  /  message_type.startswith(('x', 'y'))
+
+    Returns:
+        Lista de claves ("exact" | "prefix", valor), o None si la condición es general
+    """
+    if isinstance(node, ast.Expression):
+        return index_keys(node.body)
+
+    if isinstance(node, ast.BoolOp) and isinstance(node.op, ast.Or):
+        keys = []
+        for value in node.values:
+            sub_keys = index_keys(value)
+            if sub_keys is None:
+                return None
+            keys.extend(sub_keys)
+        return keys
+
+    if isinstance(node, ast.Compare) and len(node.ops) == 1:
+        left, op, right = node.left, node.ops[0], node.comparators[0]
+
+        if isinstance(op, ast.Eq):
+            if _is_message_type(left):
+                values = _str_constants(right) if isinstance(right, ast.Constant) else None
+            elif _is_message_type(right):
+                values = _str_constants(left) if isinstance(left, ast.Constant) else None
+            else:
+                values = None
+            return [("exact", v) for v in values] if values else None
+
+        if isinstance(op, ast.In) and _is_message_type(left) and not isinstance(right, ast.Constant):
+            values = _str_constants(right)
+            return [("exact", v) for v in values] if values is not None else None
+
+    if (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Attribute)
+        and node.func.attr == "startswith"
+        and _is_message_type(node.func.value)
+        and len(node.args) == 1
+    ):
+        values = _str_constants(node.args[0])
+        if values is not None and not isinstance(node.args[0], (ast.List, ast.Set)):
+            return [("prefix", v) for v in values]
+
+    return None
+
+
+class CompiledRule:
+    """Regla de autonomía con su condición ya compilada"""
+
+    __slots__ = ("condition", "code", "autonomy_level", "priority", "index_keys", "variables")
+
+    def __init__(
+        self,
+        condition: str,
+        code: Optional[CodeType],
+        autonomy_level,
+        priority: int,
+        index_keys: Optional[List[Tuple[str, str]]] = None,
+        variables: frozenset = frozenset()
+    ):
+        self.condition = condition
+        self.code = code                  # None si la condición no compiló
+        self.autonomy_level = autonomy_level
+        self.priority = priority
+        self.index_keys = index_keys      # None si la regla requiere evaluación general
+        self.variables = variables        # Variables libres de la condición
+
+    def matches(self, eval_context: Dict[str, Any]) -> bool:
+        """Evaluar la condición sobre un contexto ya construido"""
+        if self.code is None:
+            return False
+
+        try:
+            return bool(eval(self.code, _EVAL_GLOBALS, eval_context))
+        except Exception as e:
+            print(f"[AUTONOMY] Error evaluando regla '{self.condition}': {e}")
+            return False
+
+
+def compile_rule(rule) -> CompiledRule:
+    """
+    Compilar una AutonomyRule.
+    Las condiciones inválidas se registran una vez y nunca aplican.
+    """
+    try:
+        tree = parse_condition(rule.condition)
+        code = compile(tree, "<autonomy-rule>", "eval")
+        keys = index_keys(tree)
+        variables = free_variables(tree)
+    except RuleCompileError as e:
+        print(f"[AUTONOMY] Regla descartada: {e}")
+        code = None
+        keys = None
+        variables = frozenset()
+
+    return CompiledRule(
+        condition=rule.condition,
+        code=code,
+        autonomy_level=rule.autonomy_level,
+        priority=rule.priority,
+        index_keys=keys,
+        variables=variables
+    )
+
+
+class CompiledRuleSet:
+    """
+    Conjunto de reglas compiladas de un agente, en orden de prioridad.
+    Se construye una vez por AutonomySettings y se reutiliza en cada mensaje.
+
+    Las reglas sobre message_type (igualdad, pertenencia y startswith) se indexan
+    en un dict exacto y un trie de prefijos; solo las reglas generales se evalúan
+    en orden, y únicamente las de mayor prioridad que el candidato indexado.
+    """
+
+    def __init__(self, rules: List[Any]):
+        """
+        Args:
+            rules: Lista de AutonomyRule ya ordenada por prioridad
+        """
+        self.rules: Tuple[CompiledRule, ...] = tuple(compile_rule(r) for r in rules)
+
+        # message_type exacto -> posición de la primera regla que lo cubre
+        self._exact: Dict[str, int] = {}
+        # Trie de prefijos por carácter; _TRIE_END guarda la posición de la regla
+        self._prefix_trie: Dict[str, Any] = {}
+        # Reglas no indexables: (posición, regla) en orden de prioridad
+        self._general: List[Tuple[int, CompiledRule]] = []
+        # message_type -> posición candidata ya resuelta por el índice
+        self._index_cache: Dict[str, Optional[int]] = {}
+
+        # Variables libres de todo el conjunto (análisis estático de dependencias)
+        self.variables: frozenset = frozenset().union(*(r.variables for r in self.rules))
+        # La decisión depende solo de (message_type, from_agent): se puede memorizar
+        self.memoizable: bool = self.variables <= MEMOIZABLE_VARIABLES
+
+        for position, rule in enumerate(self.rules):
+            if rule.code is None:
+                continue
+            if rule.index_keys is None:
+                self._general.append((position, rule))
+                continue
+            for kind, value in rule.index_keys:
+                if kind == "exact":
+                    self._exact.setdefault(value, position)
+                else:
+                    node = self._prefix_trie
+                    for char in value:
+                        node = node.setdefault(char, {})
+                    node.setdefault(_TRIE_END, position)
+
+    @property
+    def indexed_count(self) -> int:
+        """Cantidad de reglas resueltas por el índice"""
+        return sum(1 for r in self.rules if r.code is not None and r.index_keys is not None)
+
+    def _indexed_candidate(self, message_type: str) -> Optional[int]:
+        """Posición de la regla indexada de mayor prioridad que cubre message_type"""
+        if message_type in self._index_cache:
+            return self._index_cache[message_type]
+
+        best = self._exact.get(message_type)
+
+        node = self._prefix_trie
+        position = node.get(_TRIE_END)
+        if position is not None and (best is None or position < best):
+            best = position
+        for char in message_type:
+            node = node.get(char)
+            if node is None:
+                break
+            position = node.get(_TRIE_END)
+            if position is not None and (best is None or position < best):
+                best = position
+
+        if len(self._index_cache) >= _INDEX_CACHE_SIZE:
+            self._index_cache.clear()
+        self._index_cache[message_type] = best
+        return best
+
+    def match(self, eval_context: Dict[str, Any]):
+        """
+        Obtener el nivel de la primera regla que aplica.
+
+        Returns:
+            AutonomyLevel de la regla, o None si ninguna aplica
+        """
+        message_type = eval_context.get("message_type")
+        if not isinstance(message_type, str):
+            return self._match_linear(eval_context)
+
+        best = self._indexed_candidate(message_type)
+
+        # Solo las reglas generales con mayor prioridad que el candidato pueden ganarle
+        for position, rule in self._general:
+            if best is not None and position > best:
+                break
+            if rule.matches(eval_context):
+                return rule.autonomy_level
+
+        if best is not None:
+            return self.rules[best].autonomy_level
+        return None
+
+    def _match_linear(self, eval_context: Dict[str, Any]):
+        """Evaluar todas las reglas en orden (sin índice)"""
+        for rule in self.rules:
+            if rule.matches(eval_context):
+                return rule.autonomy_level
+        return None
@@ -0,0 +1,349 @@
+"""
+PAIA Protocol - Connection Registry
+Registro de conexiones WebSocket activas (varias por usuario)
+"""
+
+from collections import deque
+from typing import Dict, Any, List, Optional
+import asyncio
+import json
+import time
+import uuid
+
+
+# Tamaño por defecto de la cola de salida de cada conexión (frames)
+DEFAULT_OUTBOUND_QUEUE_SIZE = 256
+
+# Políticas de desborde de la cola de salida. En ambas se descartan primero
+# los frames prescindibles (heartbeats); después:
+OVERFLOW_DISCONNECT = "disconnect"    # se desconecta al consumidor lento
+OVERFLOW_DROP_OLDEST = "drop_oldest"  # se descarta el frame más antiguo
+OVERFLOW_POLICIES = (OVERFLOW_DISCONNECT, OVERFLOW_DROP_OLDEST)
+
+# Micro-batching (opcional, negociado por el cliente): ventana y límites
+DEFAULT_BATCH_WINDOW_MS = 3.0
+MIN_BATCH_WINDOW_MS = 1.0
+MAX_BATCH_WINDOW_MS = 10.0
+MAX_BATCH_FRAMES = 64
+
+
+def serialize_frame(message: Dict[str, Any]) -> str:
+    """Serializar un frame una sola vez (mismo formato que WebSocket.send_json)"""
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+
+class OutboundMetrics:
+    """Contadores acumulados de las colas de salida (sobreviven a las conexiones)"""
+
+    def __init__(self):
+        self.frames_sent = 0
+        self.heartbeats_dropped = 0
+        self.frames_dropped = 0
+        self.slow_consumer_disconnects = 0
+        self.send_errors = 0
+        self.batches_sent = 0
+        self.batched_frames = 0
+
+    def to_dict(self) -> Dict[str, int]:
+        return {
+            "frames_sent": self.frames_sent,
+            "heartbeats_dropped": self.heartbeats_dropped,
+            "frames_dropped": self.frames_dropped,
+            "slow_consumer_disconnects": self.slow_consumer_disconnects,
+            "send_errors": self.send_errors,
+            "batches_sent": self.batches_sent,
+            "batched_frames": self.batched_frames
+        }
+
+
+class PAIAConnection:
+    """
+    Una conexión WebSocket concreta de un usuario (un dispositivo o pestaña).
+    Cada conexión tiene identidad propia para poder limpiarla sin afectar a las demás.
+
+    Los envíos no escriben en el socket: se encolan en una cola acotada que
+    vacía una única tarea escritora, de modo que un cliente lento no bloquea
+    al router ni a quien le envía.
+    """
+
+    def __init__(
+        self,
+        websocket,
+        user_id: str,
+        max_queue_size: int = DEFAULT_OUTBOUND_QUEUE_SIZE,
+        overflow_policy: str = OVERFLOW_DISCONNECT,
+        metrics: Optional[OutboundMetrics] = None
+    ):
+        """
+        Args:
+            websocket: Conexión WebSocket de FastAPI
+            user_id: ID del usuario dueño de la conexión
+            max_queue_size: Máximo de frames pendientes de envío
+            overflow_policy: Qué hacer cuando la cola se llena (ver OVERFLOW_POLICIES)
+            metrics: Contadores compartidos del registro
+        """
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Política de desborde inválida: {overflow_policy}")
+
+        self.websocket = websocket
+        self.user_id = user_id
+        self.connection_id = str(uuid.uuid4())
+        self.connected_at = time.time()
+        self.last_seen = self.connected_at  # Última actividad entrante
+
+        self.max_queue_size = max_queue_size
+        self.overflow_policy = overflow_policy
+        self.metrics = metrics or OutboundMetrics()
+
+        # Cola de salida: (payload, prescindible)
+        self._queue: deque = deque()
+        self._ready = asyncio.Event()
+        self._writer_task: Optional[asyncio.Task] = None
+        self.closed = False
+        self.max_depth = 0
+
+        # Última secuencia de la sesión del usuario al registrar la conexión
+        # (lo posterior ya se encola en esta conexión; el replay cubre hasta aquí)
+        self.resume_upto = 0
+
+        # Micro-batching: 0 = desactivado (un frame por envío)
+        self.batch_window = 0.0
+
+    def touch(self):
+        """Registrar actividad entrante (cualquier frame, incluidos ping/pong)"""
+        self.last_seen = time.time()
+
+    # ==================== COLA DE SALIDA ====================
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def enqueue(self, payload: str, droppable: bool = False) -> bool:
+        """
+        Encolar un frame ya serializado (no bloquea).
+
+        Args:
+            payload: Frame serializado
+            droppable: Si el frame se puede descartar bajo presión (ej: heartbeat)
+
+        Returns:
+            True si el frame quedó encolado
+        """
+        if self.closed:
+            return False
+
+        if len(self._queue) >= self.max_queue_size and not self._make_room(droppable):
+            return False
+
+        self._queue.append((payload, droppable))
+        if len(self._queue) > self.max_depth:
+            self.max_depth = len(self._queue)
+        self._ready.set()
+        return True
+
+    def _make_room(self, droppable: bool) -> bool:
+        """Liberar un hueco en la cola llena según la política de desborde"""
+        # 1. Los frames prescindibles nuevos se descartan sin más
+        if droppable:
+            self.metrics.heartbeats_dropped += 1
+            return False
+
+        # 2. Descartar un frame prescindible ya encolado
+        for i, (_, queued_droppable) in enumerate(self._queue):
+            if queued_droppable:
+                del self._queue[i]
+                self.metrics.heartbeats_dropped += 1
+                return True
+
+        # 3. Aplicar la política
+        if self.overflow_policy == OVERFLOW_DROP_OLDEST:
+            self._queue.popleft()
+            self.metrics.frames_dropped += 1
+            return True
+
+        print(
+            f"[PAIA WS] ⚠ Consumidor lento {self.user_id} ({self.connection_id}): "
+            f"{len(self._queue)} frames pendientes, desconectando"
+        )
+        self.metrics.slow_consumer_disconnects += 1
+        self.metrics.frames_dropped += 1
+        self.abort(code=1013, reason="Slow consumer")
+        return False
+
+    def enable_batching(self, window_ms: float = DEFAULT_BATCH_WINDOW_MS) -> float:
+        """
+        Activar el micro-batching: los frames encolados dentro de la ventana
+        se envían juntos como un único frame JSON array.
+
+        Returns:
+            Ventana efectiva en milisegundos
+        """
+        window_ms = min(max(float(window_ms), MIN_BATCH_WINDOW_MS), MAX_BATCH_WINDOW_MS)
+        self.batch_window = window_ms / 1000.0
+        return window_ms
+
+    def disable_batching(self):
+        """Volver a un frame por envío"""
+        self.batch_window = 0.0
+
+    def start_writer(self):
+        """Iniciar la tarea escritora de la conexión"""
+        if self._writer_task is None:
+            self._writer_task = asyncio.create_task(self._writer())
+
+    async def _writer(self):
+        """Vaciar la cola de salida en orden (un frame, o un lote si hay batching)"""
+        try:
+            while not self.closed:
+                if not self._queue:
+                    self._ready.clear()
+                    await self._ready.wait()
+                    continue
+
+                if not self.batch_window:
+                    payload, _ = self._queue.popleft()
+                    await self.websocket.send_text(payload)
+                    self.metrics.frames_sent += 1
+                    continue
+
+                # Esperar la ventana para juntar los frames de la misma ráfaga
+                if len(self._queue) < MAX_BATCH_FRAMES:
+                    await asyncio.sleep(self.batch_window)
+                    if self.closed or not self._queue:
+                        continue
+
+                frames = []
+                while self._queue and len(frames) < MAX_BATCH_FRAMES:
+                    frames.append(self._queue.popleft()[0])
+
+                if len(frames) == 1:
+                    await self.websocket.send_text(frames[0])
+                else:
+                    # Los frames ya están serializados: el lote es su concatenación
+                    await self.websocket.send_text("[" + ",".join(frames) + "]")
+                    self.metrics.batches_sent += 1
+                    self.metrics.batched_frames += len(frames)
+                self.metrics.frames_sent += len(frames)
+
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"[PAIA WS] ✗ Error escribiendo a {self.user_id} ({self.connection_id}): {e}")
+            self.metrics.send_errors += 1
+            self.abort(code=1011, reason="Send failed")
+
+    async def send_text(self, payload: str, droppable: bool = False) -> bool:
+        """Encolar un frame ya serializado"""
+        return self.enqueue(payload, droppable)
+
+    async def send_json(self, message: Dict[str, Any], droppable: bool = False) -> bool:
+        """Serializar y encolar un frame"""
+        return self.enqueue(serialize_frame(message), droppable)
+
+    # ==================== CIERRE ====================
+
+    def abort(self, code: int = 1011, reason: str = ""):
+        """Marcar la conexión como cerrada y cerrar el socket en segundo plano"""
+        if self.closed:
+            return
+        self.closed = True
+        self._queue.clear()
+        self._ready.set()
+        asyncio.ensure_future(self.close(code=code, reason=reason))
+
+    async def stop(self):
+        """Detener la tarea escritora y descartar lo pendiente"""
+        self.closed = True
+        self._queue.clear()
+        self._ready.set()
+        task, self._writer_task = self._writer_task, None
+        if task and task is not asyncio.current_task():
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        """Cerrar el socket ignorando errores (puede estar ya cerrado)"""
+        try:
+            await self.websocket.close(code=code, reason=reason)
+        except Exception:
+            pass
+
+    def __repr__(self) -> str:
+        return f"PAIAConnection(user_id={self.user_id!r}, connection_id={self.connection_id!r})"
+
+
+class ConnectionRegistry:
+    """
+    Registro de conexiones activas: user_id -> {connection_id: PAIAConnection}.
+    Un usuario está online mientras tenga al menos una conexión.
+    """
+
+    def __init__(self):
+        self.by_user: Dict[str, Dict[str, PAIAConnection]] = {}
+        self.metrics = OutboundMetrics()
+
+    def add(self, connection: PAIAConnection) -> bool:
+        """
+        Registrar una conexión.
+
+        Returns:
+            True si es la primera conexión del usuario
+        """
+        user_connections = self.by_user.setdefault(connection.user_id, {})
+        user_connections[connection.connection_id] = connection
+        return len(user_connections) == 1
+
+    def remove(self, connection: PAIAConnection) -> bool:
+        """
+        Quitar una conexión (solo esa, no las demás del usuario).
+
+        Returns:
+            True si el usuario se quedó sin conexiones
+        """
+        user_connections = self.by_user.get(connection.user_id)
+        if user_connections is None:
+            return False
+
+        user_connections.pop(connection.connection_id, None)
+        if not user_connections:
+            del self.by_user[connection.user_id]
+            return True
+        return False
+
+    def get(self, user_id: str) -> List[PAIAConnection]:
+        """Conexiones activas de un usuario"""
+        return list(self.by_user.get(user_id, {}).values())
+
+    def find(self, user_id: str, connection_id: str) -> Optional[PAIAConnection]:
+        """Buscar una conexión concreta"""
+        return self.by_user.get(user_id, {}).get(connection_id)
+
+    def is_online(self, user_id: str) -> bool:
+        return user_id in self.by_user
+
+    def user_count(self) -> int:
+        return len(self.by_user)
+
+    def connection_count(self) -> int:
+        return sum(len(c) for c in self.by_user.values())
+
+    def all_connections(self) -> List[PAIAConnection]:
+        return [conn for conns in self.by_user.values() for conn in conns.values()]
+
+    def queue_metrics(self) -> Dict[str, Any]:
+        """Profundidad actual de las colas de salida y contadores acumulados"""
+        depths = [conn.queue_depth for conn in self.all_connections()]
+        return {
+            "connections": len(depths),
+            "queued_frames": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "slow_connections": sum(
+                1 for conn in self.all_connections()
+                if conn.queue_depth >= conn.max_queue_size // 2
+            ),
+            **self.metrics.to_dict()
+        }
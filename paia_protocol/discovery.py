@@ -196,6 +196,20 @@ class PAIADiscoveryService:
             print(f"[DISCOVERY] Error registrando agente {agent_id}: {e}")
             return False
 
+    def register_agents(self, profiles: List[AgentProfile]) -> int:
+        """
+        Registrar muchos agentes de una vez (registro masivo al arrancar).
+
+        Args:
+            profiles: Perfiles ya construidos
+
+        Returns:
+            Número de agentes registrados
+        """
+        for profile in profiles:
+            self._agent_registry[profile.agent_id] = profile
+        return len(profiles)
+
     async def unregister_agent(self, agent_id: str) -> bool:
         """Quitar un agente del registro"""
         if agent_id in self._agent_registry:
@@ -247,24 +261,14 @@ class PAIADiscoveryService:
             target_user = users[0]  # Tomar el primer resultado
 
             # 2. Verificar que sean amigos
-            connections = await self.db_manager.get_user_connections(
-                requester_user_id,
-                'accepted'
-            )
-
-            friend_ids = []
-            for conn in connections:
-                if conn['requester']['id'] == requester_user_id:
-                    friend_ids.append(conn['recipient']['id'])
-                else:
-                    friend_ids.append(conn['requester']['id'])
+            friend_ids = set(await self.db_manager.get_friend_ids(requester_user_id))
 
             if target_user['id'] not in friend_ids:
                 print(f"[DISCOVERY] Usuario '{target_name}' no es amigo de {requester_user_id}")
                 return None
 
             # 3. Obtener agentes públicos del usuario objetivo desde BD
-            db_agents = await self.db_manager.get_agents_by_user(target_user['id'])
+            db_agents = await self.db_manager.get_agent_summaries_by_user(target_user['id'])
 
             if not db_agents:
                 print(f"[DISCOVERY] Usuario '{target_name}' no tiene agentes")
@@ -325,23 +329,14 @@ class PAIADiscoveryService:
             # Obtener lista de amigos
             friend_ids = set()
             if friends_only:
-                connections = await self.db_manager.get_user_connections(
-                    requester_user_id,
-                    'accepted'
-                )
-
-                for conn in connections:
-                    if conn['requester']['id'] == requester_user_id:
-                        friend_ids.add(conn['recipient']['id'])
-                    else:
-                        friend_ids.add(conn['requester']['id'])
+                friend_ids = set(await self.db_manager.get_friend_ids(requester_user_id))
 
             # Buscar agentes con la expertise en BD (solo entre amigos por seguridad)
             matching_agents = []
 
             # Buscar en agentes de amigos
             for friend_id in friend_ids:
-                friend_agents = await self.db_manager.get_agents_by_user(friend_id)
+                friend_agents = await self.db_manager.get_agent_summaries_by_user(friend_id)
                 for db_agent in friend_agents:
                     agent_expertise = db_agent.expertise if hasattr(db_agent, 'expertise') else db_agent.get('expertise', 'general')
                     is_public = db_agent.is_public if hasattr(db_agent, 'is_public') else db_agent.get('is_public', True)
@@ -380,22 +375,13 @@ class PAIADiscoveryService:
             # Obtener lista de amigos
             friend_ids = set()
             if friends_only:
-                connections = await self.db_manager.get_user_connections(
-                    requester_user_id,
-                    'accepted'
-                )
-
-                for conn in connections:
-                    if conn['requester']['id'] == requester_user_id:
-                        friend_ids.add(conn['recipient']['id'])
-                    else:
-                        friend_ids.add(conn['requester']['id'])
+                friend_ids = set(await self.db_manager.get_friend_ids(requester_user_id))
 
             # Buscar agentes con la capability en BD (solo de amigos)
             matching_agents = []
 
             for friend_id in friend_ids:
-                friend_agents = await self.db_manager.get_agents_by_user(friend_id)
+                friend_agents = await self.db_manager.get_agent_summaries_by_user(friend_id)
                 for db_agent in friend_agents:
                     is_public = db_agent.is_public if hasattr(db_agent, 'is_public') else db_agent.get('is_public', True)
 
@@ -446,17 +432,7 @@ class PAIADiscoveryService:
                 return False, "Agente no es público"
 
         # Verificar si son amigos
-        connections = await self.db_manager.get_user_connections(
-            from_user_id,
-            'accepted'
-        )
-
-        friend_ids = []
-        for conn in connections:
-            if conn['requester']['id'] == from_user_id:
-                friend_ids.append(conn['recipient']['id'])
-            else:
-                friend_ids.append(conn['requester']['id'])
+        friend_ids = set(await self.db_manager.get_friend_ids(from_user_id))
 
         # El usuario puede comunicarse si:
         # 1. Es el dueño del agente
@@ -474,6 +450,13 @@ class PAIADiscoveryService:
         """Obtener cantidad de agentes en cache"""
         return len(self._agent_registry)
 
+    def update_last_seen(self, agent_ids: List[str], last_seen: str):
+        """Actualizar la última actividad de los agentes en cache (presencia del dueño)"""
+        for agent_id in agent_ids:
+            profile = self._agent_registry.get(agent_id)
+            if profile:
+                profile.last_seen = last_seen
+
     def clear_cache(self):
         """Limpiar cache de agentes (para liberar memoria)"""
         self._agent_registry.clear()
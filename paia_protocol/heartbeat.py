@@ -0,0 +1,154 @@
+"""
+PAIA Protocol - Heartbeat Scheduler
+Heartbeat centralizado sobre una rueda de temporizadores (timer wheel)
+
+Requisitos para clientes:
+- El servidor envía {"type": "heartbeat"} cada `interval` segundos.
+- El cliente debe responder {"type": "pong"} (o enviar cualquier frame,
+  ej: {"type": "ping"}). Un cliente que solo escucha también debe hacerlo.
+- Si pasan `idle_timeout` segundos sin recibir nada del cliente, la conexión
+  se cierra con 1001 "Idle timeout". Un envío que completa no prueba que el
+  cliente siga ahí (el kernel lo acepta aunque el peer haya desaparecido).
+"""
+
+from typing import Dict, List, Optional, Callable, Awaitable
+import asyncio
+import time
+
+from .connections import PAIAConnection, serialize_frame
+
+
+# Frame de heartbeat (se serializa una sola vez)
+HEARTBEAT_FRAME = serialize_frame({"type": "heartbeat"})
+
+EvictCallback = Callable[[PAIAConnection], Awaitable[None]]
+
+
+class HeartbeatWheel:
+    """
+    Rueda de temporizadores para el heartbeat de todas las conexiones.
+
+    El intervalo se divide en `slots` casillas; cada conexión vive en una casilla
+    y una única tarea avanza una casilla por tick. Al pasar por una casilla se
+    envía el heartbeat a sus conexiones y se expulsan las que no han mostrado
+    actividad entrante en `idle_timeout` segundos. Las conexiones nuevas se
+    reparten en round-robin entre casillas, así los pings quedan escalonados.
+
+    Una conexión inactiva no tiene temporizador propio: solo ocupa una entrada
+    de diccionario.
+    """
+
+    def __init__(
+        self,
+        interval: float = 30.0,
+        idle_timeout: float = 90.0,
+        slots: int = 64,
+        on_evict: Optional[EvictCallback] = None
+    ):
+        """
+        Args:
+            interval: Segundos entre heartbeats de una misma conexión
+            idle_timeout: Segundos sin actividad entrante antes de expulsar la conexión
+            slots: Casillas de la rueda (resolución = interval / slots)
+            on_evict: Callback async para limpiar una conexión expulsada
+        """
+        self.interval = interval
+        self.idle_timeout = idle_timeout
+        self.tick = interval / slots
+        self.on_evict = on_evict
+
+        self._slots: List[Dict[str, PAIAConnection]] = [{} for _ in range(slots)]
+        self._slot_of: Dict[str, int] = {}
+        self._cursor = 0
+        self._next_slot = 0
+        self._task: Optional[asyncio.Task] = None
+
+        # Métricas
+        self.heartbeats_sent = 0
+        self.evictions = 0
+
+    def add(self, connection: PAIAConnection):
+        """Programar el heartbeat de una conexión"""
+        # Round-robin a partir de la casilla siguiente al cursor
+        slot = (self._cursor + 1 + self._next_slot) % len(self._slots)
+        self._next_slot = (self._next_slot + 1) % len(self._slots)
+
+        self._slots[slot][connection.connection_id] = connection
+        self._slot_of[connection.connection_id] = slot
+        self.start()
+
+    def remove(self, connection: PAIAConnection):
+        """Dejar de vigilar una conexión"""
+        slot = self._slot_of.pop(connection.connection_id, None)
+        if slot is not None:
+            self._slots[slot].pop(connection.connection_id, None)
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    def start(self):
+        """Iniciar la tarea de la rueda (idempotente)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Detener la tarea de la rueda"""
+        task, self._task = self._task, None
+        if task:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        """Avanzar la rueda una casilla por tick (sin acumular deriva)"""
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time() + self.tick
+
+        try:
+            while True:
+                await asyncio.sleep(max(0.0, next_tick - loop.time()))
+                next_tick += self.tick
+
+                self._cursor = (self._cursor + 1) % len(self._slots)
+                await self._process_slot(self._slots[self._cursor])
+
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            print(f"[PAIA WS] ✗ Error en heartbeat: {e}")
+            self._task = None
+
+    async def _process_slot(self, slot: Dict[str, PAIAConnection]):
+        """Enviar heartbeat y expulsar conexiones inactivas de una casilla"""
+        if not slot:
+            return
+
+        now = time.time()
+        for connection in list(slot.values()):
+            if now - connection.last_seen > self.idle_timeout:
+                self.evictions += 1
+                self.remove(connection)
+                print(
+                    f"[PAIA WS] ⏱ Conexión inactiva {connection.user_id} "
+                    f"({connection.connection_id}), {now - connection.last_seen:.0f}s sin actividad"
+                )
+                connection.abort(code=1001, reason="Idle timeout")
+                if self.on_evict:
+                    await self.on_evict(connection)
+                continue
+
+            if connection.enqueue(HEARTBEAT_FRAME, droppable=True):
+                self.heartbeats_sent += 1
+
+    def get_stats(self) -> Dict[str, float]:
+        """Estadísticas de la rueda"""
+        return {
+            "connections": len(self._slot_of),
+            "interval": self.interval,
+            "idle_timeout": self.idle_timeout,
+            "tick": self.tick,
+            "heartbeats_sent": self.heartbeats_sent,
+            "evictions": self.evictions
+        }
@@ -0,0 +1,127 @@
+"""
+PAIA Protocol - Inbound Pipeline
+Procesamiento concurrente de los frames entrantes de una conexión
+"""
+
+from collections import deque
+from typing import Dict, Optional, Set, Callable, Awaitable
+import asyncio
+
+
+# Pipelines cerrados con trabajo pendiente: referencia fuerte hasta que terminan
+_detached: Set["InboundPipeline"] = set()
+
+
+class InboundPipeline:
+    """
+    Despacha los frames entrantes de una conexión sin esperar a que termine
+    el anterior, con un tope de concurrencia por conexión.
+
+    Los frames con la misma clave de orden (ej: conversation_id) se procesan
+    en el orden en que llegaron: cada uno espera a que termine el anterior de
+    su misma clave. Los frames sin clave no tienen orden entre sí.
+
+    Con `max_pending` frames en curso, los siguientes esperan en una cola de
+    la conexión (sin tarea propia) y se despachan en orden según se liberan
+    huecos; `submit` nunca bloquea al bucle de lectura.
+    """
+
+    def __init__(self, max_concurrency: int = 4, max_pending: int = 32, max_backlog: int = 1024):
+        """
+        Args:
+            max_concurrency: Frames procesándose a la vez
+            max_pending: Frames despachados sin terminar (en espera + en curso)
+            max_backlog: Frames en cola detrás de los despachados; al superarlo
+                `submit` devuelve False (el cliente envía más de lo que se procesa)
+        """
+        self._running = asyncio.Semaphore(max_concurrency)
+        self.max_pending = max(max_pending, max_concurrency)
+        self.max_backlog = max_backlog
+        self._backlog: deque = deque()
+        self._tails: Dict[str, asyncio.Task] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self.closed = False
+
+        # Métricas
+        self.max_backlog_depth = 0
+
+    @property
+    def in_flight(self) -> int:
+        """Frames recibidos que aún no terminaron (despachados + en cola)"""
+        return len(self._tasks) + len(self._backlog)
+
+    def submit(self, key: Optional[str], handler: Callable[[], Awaitable[None]]) -> bool:
+        """
+        Despachar un frame, o dejarlo en cola si el pipeline está lleno (no bloquea).
+
+        Args:
+            key: Clave de orden, o None si el frame no requiere orden
+            handler: Función async sin argumentos que procesa el frame
+
+        Returns:
+            False si el pipeline está cerrado o la cola desbordó (el frame no se procesa)
+        """
+        if self.closed:
+            return False
+
+        if len(self._tasks) < self.max_pending and not self._backlog:
+            self._dispatch(key, handler)
+            return True
+
+        if len(self._backlog) >= self.max_backlog:
+            return False
+
+        self._backlog.append((key, handler))
+        if len(self._backlog) > self.max_backlog_depth:
+            self.max_backlog_depth = len(self._backlog)
+        return True
+
+    def close(self):
+        """
+        Dejar de aceptar frames (el socket se cerró).
+
+        Lo ya recibido se procesa hasta el final: enrutar un mensaje afecta a
+        otros usuarios, así que no se cancela. Las respuestas a esta conexión
+        se descartan solas (la conexión cerrada ya no encola).
+        """
+        self.closed = True
+        if self._tasks or self._backlog:
+            _detached.add(self)
+
+    def _dispatch(self, key: Optional[str], handler: Callable[[], Awaitable[None]]):
+        previous = self._tails.get(key) if key else None
+        task = asyncio.create_task(self._run(key, previous, handler))
+        if key:
+            self._tails[key] = task
+
+        self._tasks.add(task)
+        task.add_done_callback(self._on_done)
+
+    def _on_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        while self._backlog and len(self._tasks) < self.max_pending:
+            self._dispatch(*self._backlog.popleft())
+
+        if self.closed and not self._tasks:
+            _detached.discard(self)
+
+    async def _run(
+        self,
+        key: Optional[str],
+        previous: Optional[asyncio.Task],
+        handler: Callable[[], Awaitable[None]]
+    ):
+        try:
+            # Orden por clave: esperar al frame anterior (sin propagar su error)
+            if previous is not None and not previous.done():
+                await asyncio.wait([previous])
+
+            async with self._running:
+                await handler()
+
+        except Exception as e:
+            print(f"[PAIA WS] ✗ Error procesando frame entrante: {e}")
+
+        finally:
+            if key and self._tails.get(key) is asyncio.current_task():
+                del self._tails[key]
@@ -9,6 +9,7 @@ from .message import PAIAMessage, PAIAMessageFactory, PAIASystemMessage
 from .validator import PAIAMessageValidator, PAIAErrorCodes
 from .discovery import PAIADiscoveryService
 from .autonomy import AutonomyManager, AutonomyLevel
+from utils.dataloader import request_scope
 
 
 MessageHandler = Callable[[Dict[str, Any]], Awaitable[None]]
@@ -58,6 +59,9 @@ class PAIAMessageRouter:
         """
         Procesar y enrutar un mensaje PAIA.
 
+        Las lecturas de agentes y usuarios de toda la pasada se agrupan y
+        memoizan en un request_scope (se reutiliza el del request si existe).
+
         Args:
             message: Mensaje PAIA en formato dict
             sender_user_id: ID del usuario que envía el mensaje
@@ -65,6 +69,15 @@ class PAIAMessageRouter:
         Returns:
             Resultado del enrutamiento
         """
+        with request_scope():
+            return await self._route_message(message, sender_user_id)
+
+    async def _route_message(
+        self,
+        message: Dict[str, Any],
+        sender_user_id: str
+    ) -> Dict[str, Any]:
+        """Pasada de ruteo: validación, autorización, persistencia y entrega"""
         try:
             # ==================== FASE 1: VALIDACIÓN ====================
             print(f"[ROUTER] 📨 Procesando mensaje de tipo: {message.get('type')}")
@@ -124,8 +137,15 @@ class PAIAMessageRouter:
 
             # ==================== FASE 3: AUTONOMÍA ====================
 
-            # 3.1 Verificar si el agente receptor está deshabilitado para este tipo de mensaje
-            if self.autonomy.is_disabled(to_agent_id, message):
+            # 3.1 Calcular el nivel de autonomía una sola vez para todo el enrutamiento
+            await self.autonomy.ensure_settings_loaded(to_agent_id)
+            autonomy_level = self.autonomy.get_autonomy_level_for_message(
+                to_agent_id,
+                message
+            )
+
+            # 3.2 Verificar si el agente receptor está deshabilitado para este tipo de mensaje
+            if autonomy_level == AutonomyLevel.DISABLED:
                 print(f"[ROUTER] ✗ Agente destino tiene deshabilitado este tipo de mensaje")
                 await self._send_error_to_sender(
                     sender_user_id,
@@ -173,12 +193,7 @@ class PAIAMessageRouter:
                 await self.db_manager.update_message_status(message_id, "delivered")
                 print(f"[ROUTER] ✓ Mensaje entregado vía WebSocket")
 
-                # 5.2 Verificar nivel de autonomía para auto-ejecución
-                autonomy_level = self.autonomy.get_autonomy_level_for_message(
-                    to_agent_id,
-                    message
-                )
-
+                # 5.2 Nivel de autonomía (calculado en la fase 3)
                 print(f"[ROUTER] Nivel de autonomía: {autonomy_level.value}")
 
                 # 5.3 Si es un mensaje de chat y el agente tiene autonomía, procesarlo
@@ -246,8 +261,7 @@ class PAIAMessageRouter:
         """
         try:
             # Obtener agentes del usuario
-            user_agents = await self.db_manager.get_agents_by_user(user_id)
-            agent_ids = [agent.id for agent in user_agents]
+            agent_ids = await self.db_manager.get_agent_ids_by_user(user_id)
 
             if not agent_ids:
                 return
@@ -264,7 +278,8 @@ class PAIAMessageRouter:
                     "from_agent_id": msg.from_agent_id,
                     "to_agent_id": msg.to_agent_id,
                     "payload": msg.payload,
-                    "metadata": msg.metadata
+                    # message_id: clave con la que el cliente descarta duplicados
+                    "metadata": {"message_id": msg.id, **(msg.metadata or {})}
                 }
 
                 # Entregar por WebSocket
@@ -396,6 +411,7 @@ class PAIAMessageRouter:
         """
         try:
             # Verificar nivel de autonomía
+            await self.autonomy.ensure_settings_loaded(agent_id)
             autonomy_level = self.autonomy.get_autonomy_level_for_message(
                 agent_id,
                 message
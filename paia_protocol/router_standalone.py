@@ -114,8 +114,15 @@ class PAIAMessageRouterStandalone:
 
             # ==================== FASE 3: AUTONOMÍA ====================
 
-            # 3.1 Verificar si el agente receptor está deshabilitado para este tipo de mensaje
-            if self.autonomy.is_disabled(to_agent_id, message):
+            # 3.1 Calcular el nivel de autonomía una sola vez para todo el enrutamiento
+            await self.autonomy.ensure_settings_loaded(to_agent_id)
+            autonomy_level = self.autonomy.get_autonomy_level_for_message(
+                to_agent_id,
+                message
+            )
+
+            # 3.2 Verificar si el agente receptor está deshabilitado para este tipo de mensaje
+            if autonomy_level == AutonomyLevel.DISABLED:
                 print(f"[ROUTER] ✗ Agente destino tiene deshabilitado este tipo de mensaje")
                 await self._send_error_to_sender(
                     sender_user_id,
@@ -163,12 +170,7 @@ class PAIAMessageRouterStandalone:
                 await self.storage.update_message_status(message_id, "delivered")
                 print(f"[ROUTER] ✓ Mensaje entregado vía WebSocket")
 
-                # 5.2 Verificar nivel de autonomía
-                autonomy_level = self.autonomy.get_autonomy_level_for_message(
-                    to_agent_id,
-                    message
-                )
-
+                # 5.2 Nivel de autonomía (calculado en la fase 3)
                 print(f"[ROUTER] Nivel de autonomía: {autonomy_level.value}")
 
                 # 5.3 Si es un mensaje de chat y tenemos agent_manager, procesarlo
@@ -0,0 +1,84 @@
+"""
+PAIA Protocol - Resumable Sessions
+Números de secuencia por usuario y buffer de replay para reconexiones
+"""
+
+from collections import deque
+from itertools import islice
+from typing import Any, Dict, List, Optional, Tuple
+import time
+import uuid
+
+
+# Frames recordados por usuario para replay
+DEFAULT_REPLAY_SIZE = 512
+
+# Segundos que se conserva la sesión de un usuario desconectado
+DEFAULT_RESUME_WINDOW = 120.0
+
+
+class UserSession:
+    """
+    Sesión de un usuario: secuencia monótona de los frames que se le envían
+    y un anillo acotado con los últimos frames (ya serializados) para replay.
+    """
+
+    def __init__(self, user_id: str, replay_size: int = DEFAULT_REPLAY_SIZE):
+        """
+        Args:
+            user_id: ID del usuario
+            replay_size: Máximo de frames guardados para replay
+        """
+        self.user_id = user_id
+        self.session_id = str(uuid.uuid4())
+        self.seq = 0
+
+        # (seq, timestamp, payload) en orden de seq
+        self._ring: deque = deque(maxlen=replay_size)
+
+        # Expiración programada mientras el usuario está offline
+        self.expiry_handle = None
+
+    def next_seq(self) -> int:
+        """Reservar el siguiente número de secuencia"""
+        self.seq += 1
+        return self.seq
+
+    def record(self, seq: int, payload: str):
+        """Guardar un frame enviado para posible replay"""
+        self._ring.append((seq, time.time(), payload))
+
+    @property
+    def oldest_seq(self) -> Optional[int]:
+        return self._ring[0][0] if self._ring else None
+
+    def can_resume(self, session_id: Optional[str], last_seq: int) -> bool:
+        """
+        Verificar si el anillo cubre todo lo que el cliente se perdió.
+        Falla si la sesión es otra (ej: reinicio del servidor) o el anillo desbordó.
+        """
+        if session_id != self.session_id or last_seq > self.seq:
+            return False
+        if last_seq == self.seq:
+            return True
+        return self.oldest_seq is not None and self.oldest_seq <= last_seq + 1
+
+    def frames_after(self, last_seq: int, upto_seq: Optional[int] = None) -> List[Tuple[int, str]]:
+        """Frames con last_seq < seq <= upto_seq, en orden"""
+        if not self._ring:
+            return []
+
+        # Las secuencias del anillo son contiguas: se salta directo a last_seq + 1
+        upto = self.seq if upto_seq is None else upto_seq
+        start = max(last_seq + 1 - self.oldest_seq, 0)
+        return [
+            (seq, payload)
+            for seq, _, payload in islice(self._ring, start, None)
+            if seq <= upto
+        ]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "seq": self.seq
+        }
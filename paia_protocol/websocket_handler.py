@@ -4,11 +4,39 @@ Handler de WebSocket para comunicación en tiempo real del protocolo PAIA
 """
 
 from fastapi import WebSocket, WebSocketDisconnect
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Set, Iterable
+from datetime import datetime, timezone
 import json
 import asyncio
+import functools
 from .router import PAIAMessageRouter
 from .message import PAIAMessageFactory
+from .connections import (
+    PAIAConnection,
+    ConnectionRegistry,
+    serialize_frame,
+    DEFAULT_OUTBOUND_QUEUE_SIZE,
+    DEFAULT_BATCH_WINDOW_MS,
+    OVERFLOW_DISCONNECT
+)
+from .heartbeat import HeartbeatWheel
+from .inbound import InboundPipeline
+from .sessions import UserSession, DEFAULT_REPLAY_SIZE, DEFAULT_RESUME_WINDOW
+from utils.dataloader import request_scope
+
+# Tipos que se responden en el acto, sin pasar por el pipeline de entrada
+FAST_LANE_TYPES = frozenset({"ping", "pong"})
+
+
+def _parse_timestamp(value: Any) -> Optional[datetime]:
+    """Fecha ISO 8601 a datetime con zona (UTC si no la trae); None si no es válida"""
+    if not isinstance(value, str) or not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
 
 
 class PAIAWebSocketHandler:
@@ -21,24 +49,65 @@ class PAIAWebSocketHandler:
         self,
         router: PAIAMessageRouter,
         auth_manager,
-        db_manager
+        db_manager,
+        max_queue_size: int = DEFAULT_OUTBOUND_QUEUE_SIZE,
+        overflow_policy: str = OVERFLOW_DISCONNECT,
+        heartbeat_interval: float = 30.0,
+        idle_timeout: float = 90.0,
+        batch_window_ms: float = DEFAULT_BATCH_WINDOW_MS,
+        inbound_concurrency: int = 4,
+        inbound_backlog: int = 1024,
+        replay_size: int = DEFAULT_REPLAY_SIZE,
+        resume_window: float = DEFAULT_RESUME_WINDOW
     ):
         """
         Args:
             router: Router de mensajes PAIA
             auth_manager: Gestor de autenticación
             db_manager: Gestor de base de datos
+            max_queue_size: Máximo de frames pendientes por conexión
+            overflow_policy: Política cuando la cola de una conexión se llena
+            heartbeat_interval: Segundos entre heartbeats de una conexión
+            idle_timeout: Segundos sin actividad entrante antes de cerrar una conexión
+            batch_window_ms: Ventana de micro-batching por defecto (si el cliente lo pide)
+            inbound_concurrency: Mensajes entrantes procesándose a la vez por conexión
+            inbound_backlog: Mensajes entrantes en cola por conexión antes de cerrarla
+            replay_size: Frames por usuario guardados para reanudar sesiones
+            resume_window: Segundos que se conserva la sesión de un usuario desconectado
         """
         self.router = router
         self.auth_manager = auth_manager
         self.db_manager = db_manager
+        self.max_queue_size = max_queue_size
+        self.overflow_policy = overflow_policy
+        self.batch_window_ms = batch_window_ms
+        self.inbound_concurrency = inbound_concurrency
+        self.inbound_backlog = inbound_backlog
+        self.replay_size = replay_size
+        self.resume_window = resume_window
 
-        # Conexiones activas: user_id -> WebSocket
-        self.active_connections: Dict[str, WebSocket] = {}
+        # Conexiones activas: user_id -> {connection_id: PAIAConnection}
+        self.connections = ConnectionRegistry()
 
         # Agentes por usuario: user_id -> List[agent_id]
         self.user_agents: Dict[str, list] = {}
 
+        # Índice inverso de usuarios online: agent_id -> {user_id}
+        self.agent_users: Dict[str, Set[str]] = {}
+
+        # Heartbeat centralizado (una sola tarea para todas las conexiones)
+        self.heartbeat = HeartbeatWheel(
+            interval=heartbeat_interval,
+            idle_timeout=idle_timeout,
+            on_evict=self._cleanup_connection
+        )
+
+        # Presencia: user_id -> timestamp de la última actividad conocida
+        self.last_seen: Dict[str, float] = {}
+
+        # Sesiones reanudables: user_id -> UserSession (secuencia + replay)
+        self.sessions: Dict[str, UserSession] = {}
+
     async def handle_connection(
         self,
         websocket: WebSocket,
@@ -53,7 +122,8 @@ class PAIAWebSocketHandler:
             user_id: ID del usuario
             token: Token de autenticación
         """
-        heartbeat_task = None
+        connection = None
+        pipeline = None
 
         try:
             # ==================== AUTENTICACIÓN ====================
@@ -64,38 +134,83 @@ class PAIAWebSocketHandler:
 
             # ==================== SETUP ====================
             await websocket.accept()
-            print(f"[PAIA WS] ✓ Usuario {user_id} conectado")
 
-            # Registrar conexión
-            self.active_connections[user_id] = websocket
+            # Registrar conexión (un usuario puede tener varias: pestañas, dispositivos)
+            connection = PAIAConnection(
+                websocket,
+                user_id,
+                max_queue_size=self.max_queue_size,
+                overflow_policy=self.overflow_policy,
+                metrics=self.connections.metrics
+            )
+            connection.start_writer()
+            first_connection = self.connections.add(connection)
+
+            # Sesión del usuario: el cliente guarda session_id y la última seq recibida
+            session = self._get_session(user_id)
+            connection.resume_upto = session.seq
+            await connection.send_json({
+                "type": "session.started",
+                "connection_id": connection.connection_id,
+                **session.to_dict()
+            })
+            print(
+                f"[PAIA WS] ✓ Usuario {user_id} conectado "
+                f"(conexión {connection.connection_id}, {len(self.connections.get(user_id))} activas)"
+            )
 
-            # Obtener agentes del usuario
-            user_agents = await self.db_manager.get_agents_by_user(user_id)
-            agent_ids = [agent['id'] for agent in user_agents]
-            self.user_agents[user_id] = agent_ids
+            # Obtener agentes del usuario (solo con la primera conexión)
+            if first_connection or user_id not in self.user_agents:
+                agent_ids = await self.db_manager.get_agent_ids_by_user(user_id)
+                self._index_user_agents(user_id, agent_ids)
 
-            print(f"[PAIA WS] Usuario tiene {len(agent_ids)} agentes: {agent_ids}")
+                print(f"[PAIA WS] Usuario tiene {len(agent_ids)} agentes: {agent_ids}")
 
             # ==================== ENTREGAR MENSAJES PENDIENTES ====================
             await self.router.deliver_pending_messages(user_id)
 
             # ==================== HEARTBEAT ====================
-            # Iniciar heartbeat en background
-            heartbeat_task = asyncio.create_task(self._heartbeat(user_id, websocket))
+            # Programar la conexión en la rueda de heartbeat
+            self.heartbeat.add(connection)
 
             # ==================== LOOP DE ESCUCHA ====================
+            # Los mensajes se despachan sin esperar al anterior (un route_message
+            # lento no bloquea los siguientes); el orden se mantiene por conversación.
+            # Con el pipeline lleno los frames esperan en su cola en vez de dejar
+            # de leer: los ping/pong y touch() nunca esperan a los handlers
+            pipeline = InboundPipeline(
+                max_concurrency=self.inbound_concurrency,
+                max_pending=self.inbound_concurrency * 8,
+                max_backlog=self.inbound_backlog
+            )
+
             try:
                 while True:
                     # Recibir mensaje del cliente
                     data = await websocket.receive_text()
+                    connection.touch()
 
                     try:
                         message_data = json.loads(data)
-                        await self._handle_message(user_id, message_data, websocket)
+
+                        if not isinstance(message_data, dict) or message_data.get("type") in FAST_LANE_TYPES:
+                            await self._handle_message(user_id, message_data, connection)
+                        elif not pipeline.submit(
+                            self._ordering_key(message_data),
+                            functools.partial(self._handle_scoped, user_id, message_data, connection)
+                        ):
+                            # El cliente envía sin parar más de lo que se procesa:
+                            # se cierra (como un consumidor lento) en vez de perder frames
+                            print(
+                                f"[PAIA WS] ⚠ Cola de entrada llena para {user_id} "
+                                f"({connection.connection_id}), desconectando"
+                            )
+                            connection.abort(code=1013, reason="Too many pending messages")
+                            break
 
                     except json.JSONDecodeError:
                         print(f"[PAIA WS] ✗ JSON inválido de usuario {user_id}")
-                        await websocket.send_json({
+                        await connection.send_json({
                             "type": "error",
                             "error": "INVALID_JSON",
                             "message": "Formato JSON inválido"
@@ -111,9 +226,32 @@ class PAIAWebSocketHandler:
 
         finally:
             # ==================== CLEANUP ====================
-            if heartbeat_task:
-                heartbeat_task.cancel()
-            await self._cleanup_connection(user_id)
+            if pipeline:
+                # Lo ya recibido termina de enrutarse aunque el socket se cerró
+                pipeline.close()
+            if connection:
+                await self._cleanup_connection(connection)
+
+    @staticmethod
+    def _ordering_key(message_data: Dict[str, Any]) -> Optional[str]:
+        """
+        Clave de orden de un mensaje entrante: su conversation_id, o el par de
+        agentes si aún no tiene conversación. None si no requiere orden.
+        """
+        metadata = message_data.get("metadata")
+        conversation_id = (
+            (metadata.get("conversation_id") if isinstance(metadata, dict) else None)
+            or message_data.get("conversation_id")
+        )
+        if conversation_id:
+            return str(conversation_id)
+
+        from_agent_id = message_data.get("from_agent_id")
+        to_agent_id = message_data.get("to_agent_id")
+        if from_agent_id and to_agent_id:
+            return f"{min(from_agent_id, to_agent_id)}_{max(from_agent_id, to_agent_id)}"
+
+        return None
 
     async def _authenticate_user(self, user_id: str, token: str) -> Optional[Any]:
         """
@@ -123,32 +261,44 @@ class PAIAWebSocketHandler:
             Usuario si es válido, None si no
         """
         try:
-            # Validar token JWT
-            payload = self.auth_manager.verify_token(token)
+            # Validar token JWT (claims en cache hasta su exp)
+            payload = self.auth_manager.verify_jwt_token(token) if token else None
             if not payload or payload.get('user_id') != user_id:
                 print(f"[PAIA WS] ✗ Token inválido para usuario {user_id}")
                 return None
 
-            # Obtener usuario de la base de datos
-            user = await self.db_manager.get_user_by_id(user_id)
+            # Obtener usuario (cache de principales compartida con las rutas HTTP)
+            user = await self.auth_manager.get_user_by_id(user_id)
 
             if not user:
                 print(f"[PAIA WS] ✗ Usuario {user_id} no encontrado")
                 return None
 
-            # Aquí deberías validar el token real
-            # Por ahora asumimos que es válido si el usuario existe
+            if not getattr(user, 'is_active', True):
+                print(f"[PAIA WS] ✗ Usuario {user_id} desactivado")
+                return None
+
             return user
 
         except Exception as e:
             print(f"[PAIA WS] Error autenticando usuario: {e}")
             return None
 
+    async def _handle_scoped(
+        self,
+        user_id: str,
+        message_data: Dict[str, Any],
+        connection: PAIAConnection
+    ):
+        """Manejar un frame dentro de su propio request_scope (lecturas agrupadas por frame)"""
+        with request_scope():
+            await self._handle_message(user_id, message_data, connection)
+
     async def _handle_message(
         self,
         user_id: str,
         message_data: Dict[str, Any],
-        websocket: WebSocket
+        connection: PAIAConnection
     ):
         """
         Manejar un mensaje recibido del cliente.
@@ -156,7 +306,7 @@ class PAIAWebSocketHandler:
         Args:
             user_id: ID del usuario que envió el mensaje
             message_data: Datos del mensaje
-            websocket: Conexión WebSocket
+            connection: Conexión por la que llegó el mensaje
         """
         message_type = message_data.get("type")
 
@@ -165,7 +315,22 @@ class PAIAWebSocketHandler:
         try:
             # ==================== PING/PONG ====================
             if message_type == "ping":
-                await websocket.send_json({"type": "pong"})
+                self._refresh_presence(user_id, connection)
+                await connection.send_json({"type": "pong"})
+                return
+
+            if message_type == "pong":
+                # Respuesta del cliente a un heartbeat
+                self._refresh_presence(user_id, connection)
+                return
+
+            # ==================== NEGOCIACIÓN DE SESIÓN ====================
+            if message_type == "session.configure":
+                await self._configure_session(connection, message_data)
+                return
+
+            if message_type == "session.resume":
+                await self._resume_session(user_id, connection, message_data)
                 return
 
             # ==================== MENSAJE PAIA ====================
@@ -177,7 +342,7 @@ class PAIAWebSocketHandler:
                 )
 
                 # Enviar confirmación al cliente
-                await websocket.send_json({
+                await connection.send_json({
                     "type": "routing_result",
                     "result": result
                 })
@@ -186,12 +351,12 @@ class PAIAWebSocketHandler:
             # ==================== MENSAJE DE CHAT DIRECTO ====================
             if message_type == "chat":
                 # Chat directo con un agente (no PAIA)
-                await self._handle_direct_chat(user_id, message_data, websocket)
+                await self._handle_direct_chat(user_id, message_data, connection)
                 return
 
             # ==================== TIPO DESCONOCIDO ====================
             print(f"[PAIA WS] ⚠ Tipo de mensaje desconocido: {message_type}")
-            await websocket.send_json({
+            await connection.send_json({
                 "type": "error",
                 "error": "UNKNOWN_MESSAGE_TYPE",
                 "message": f"Tipo de mensaje desconocido: {message_type}"
@@ -202,17 +367,156 @@ class PAIAWebSocketHandler:
             import traceback
             traceback.print_exc()
 
-            await websocket.send_json({
+            await connection.send_json({
                 "type": "error",
                 "error": "INTERNAL_ERROR",
                 "message": str(e)
             })
 
+    async def _configure_session(self, connection: PAIAConnection, message_data: Dict[str, Any]):
+        """
+        Negociar opciones de la conexión.
+
+        Ejemplo:
+            {"type": "session.configure", "batching": true, "batch_window_ms": 3}
+
+        Con batching activo, los frames encolados dentro de la ventana llegan
+        juntos como un único frame JSON array.
+        """
+        if "batching" in message_data:
+            if message_data.get("batching"):
+                connection.enable_batching(message_data.get("batch_window_ms", self.batch_window_ms))
+            else:
+                connection.disable_batching()
+
+        await connection.send_json({
+            "type": "session.configured",
+            "connection_id": connection.connection_id,
+            "batching": bool(connection.batch_window),
+            "batch_window_ms": connection.batch_window * 1000.0
+        })
+
+    # ==================== SESIONES REANUDABLES ====================
+
+    def _get_session(self, user_id: str) -> UserSession:
+        """Obtener (o crear) la sesión de un usuario y cancelar su expiración"""
+        session = self.sessions.get(user_id)
+        if session is None:
+            session = UserSession(user_id, replay_size=self.replay_size)
+            self.sessions[user_id] = session
+
+        if session.expiry_handle is not None:
+            session.expiry_handle.cancel()
+            session.expiry_handle = None
+
+        return session
+
+    def _expire_session(self, user_id: str):
+        """Descartar la sesión de un usuario que no volvió a tiempo"""
+        if not self.connections.is_online(user_id):
+            self.sessions.pop(user_id, None)
+
+    async def _resume_session(
+        self,
+        user_id: str,
+        connection: PAIAConnection,
+        message_data: Dict[str, Any]
+    ):
+        """
+        Reanudar una sesión tras una reconexión.
+
+        Ejemplo:
+            {"type": "session.resume", "session_id": "...", "last_seq": 41, "since": "2024-01-01T10:00:00"}
+
+        Si el anillo de replay cubre todo lo perdido, se reenvían solo esos frames
+        (con su seq original). Si no (desbordó o la sesión ya no existe), se recuperan
+        de la BD los mensajes PAIA recibidos desde `since` (ISO 8601).
+
+        Los frames recuperados de la BD tienen la forma de paia.incoming_message
+        con "replayed": true y sin seq (no avanzan last_seq). Se omiten los que ya
+        se entregaron mientras esta conexión estaba abierta (ej: los pendientes
+        entregados al conectar); aun así el cliente debe descartar duplicados por
+        message.metadata.message_id, que llevan tanto los frames en vivo como los
+        recuperados.
+        """
+        session = self._get_session(user_id)
+        try:
+            last_seq = int(message_data.get("last_seq", 0))
+        except (TypeError, ValueError):
+            last_seq = 0
+
+        if session.can_resume(message_data.get("session_id"), last_seq):
+            frames = session.frames_after(last_seq, connection.resume_upto)
+            for _, payload in frames:
+                connection.enqueue(payload)
+
+            print(f"[PAIA WS] ↻ Sesión de {user_id} reanudada: {len(frames)} frames desde memoria")
+            await connection.send_json({
+                "type": "session.resumed",
+                "source": "memory",
+                "replayed": len(frames),
+                "resync_required": False,
+                **session.to_dict()
+            })
+            return
+
+        # El anillo no alcanza: recuperar desde la BD
+        since = None
+        if message_data.get("since") is not None:
+            since = _parse_timestamp(message_data.get("since"))
+            if since is None:
+                await connection.send_json({
+                    "type": "error",
+                    "error": "INVALID_RESUME",
+                    "message": "'since' debe ser una fecha ISO 8601"
+                })
+                return
+
+        replayed = 0
+        resync_required = True
+        agent_ids = self.user_agents.get(user_id, [])
+
+        if since and agent_ids:
+            limit = 500
+            # Mismo formato con el que se guardan los created_at (UTC sin zona)
+            since_utc = since.astimezone(timezone.utc).replace(tzinfo=None).isoformat()
+            rows = await self.db_manager.get_paia_messages_since(agent_ids, since_utc, limit=limit)
+            connected_at = datetime.fromtimestamp(connection.connected_at, tz=timezone.utc)
+            for row in rows:
+                delivered_at = _parse_timestamp(row.get("delivered_at"))
+                if delivered_at is not None and delivered_at >= connected_at:
+                    continue  # Ya llegó por esta conexión
+
+                metadata = row.get("metadata")
+                metadata = metadata if isinstance(metadata, dict) else {}
+                connection.enqueue(serialize_frame({
+                    "type": "paia.incoming_message",
+                    "replayed": True,
+                    "message": {
+                        "type": row.get("message_type"),
+                        "from_agent_id": row.get("from_agent_id"),
+                        "to_agent_id": row.get("to_agent_id"),
+                        "payload": row.get("payload"),
+                        "metadata": {"message_id": row.get("id"), **metadata}
+                    }
+                }))
+                replayed += 1
+            resync_required = len(rows) >= limit
+
+        print(f"[PAIA WS] ↻ Sesión de {user_id} recuperada desde BD: {replayed} mensajes")
+        await connection.send_json({
+            "type": "session.resumed",
+            "source": "database",
+            "replayed": replayed,
+            "resync_required": resync_required,
+            **session.to_dict()
+        })
+
     async def _handle_direct_chat(
         self,
         user_id: str,
         message_data: Dict[str, Any],
-        websocket: WebSocket
+        connection: PAIAConnection
     ):
         """
         Manejar chat directo con un agente (no protocolo PAIA).
@@ -222,64 +526,163 @@ class PAIAWebSocketHandler:
         # Se podría integrar aquí si se desea
         pass
 
-    async def _heartbeat(self, user_id: str, websocket: WebSocket):
-        """
-        Enviar heartbeat periódico para mantener conexión viva.
+    def _refresh_presence(self, user_id: str, connection: PAIAConnection):
+        """Propagar la actividad de un ping/pong a la presencia del usuario y sus agentes"""
+        self.last_seen[user_id] = connection.last_seen
 
-        Args:
-            user_id: ID del usuario
-            websocket: Conexión WebSocket
+        agent_ids = self.user_agents.get(user_id)
+        if agent_ids and self.router.discovery:
+            last_seen = datetime.fromtimestamp(connection.last_seen, tz=timezone.utc).isoformat()
+            self.router.discovery.update_last_seen(agent_ids, last_seen)
+
+    async def _cleanup_connection(self, connection: PAIAConnection):
         """
-        try:
-            while True:
-                await asyncio.sleep(30)  # Cada 30 segundos
-                await websocket.send_json({"type": "heartbeat"})
+        Limpiar una conexión cerrada.
+        Solo se quita esa conexión; el usuario sigue online si tiene otras.
+        """
+        user_id = connection.user_id
+        if self.connections.find(user_id, connection.connection_id) is None:
+            return  # Ya limpiada (ej: podada tras un envío fallido)
 
-        except asyncio.CancelledError:
-            print(f"[PAIA WS] Heartbeat cancelado para {user_id}")
-        except Exception as e:
-            print(f"[PAIA WS] Error en heartbeat: {e}")
+        last_connection = self.connections.remove(connection)
+        self.heartbeat.remove(connection)
+        await connection.stop()
 
-    async def _cleanup_connection(self, user_id: str):
-        """Limpiar una conexión cerrada"""
-        if user_id in self.active_connections:
-            del self.active_connections[user_id]
+        previous = self.last_seen.get(user_id, 0.0)
+        self.last_seen[user_id] = max(previous, connection.last_seen)
 
-        if user_id in self.user_agents:
-            del self.user_agents[user_id]
+        if last_connection:
+            self._unindex_user(user_id)
 
-        print(f"[PAIA WS] Conexión de {user_id} limpiada")
+            # Conservar la sesión un tiempo para permitir reanudarla
+            session = self.sessions.get(user_id)
+            if session is not None and session.expiry_handle is None:
+                session.expiry_handle = asyncio.get_running_loop().call_later(
+                    self.resume_window, self._expire_session, user_id
+                )
+            print(f"[PAIA WS] Conexión de {user_id} limpiada (usuario offline)")
+        else:
+            print(
+                f"[PAIA WS] Conexión {connection.connection_id} de {user_id} limpiada "
+                f"({len(self.connections.get(user_id))} activas)"
+            )
+
+    @property
+    def active_connections(self) -> Dict[str, Dict[str, PAIAConnection]]:
+        """Conexiones activas por usuario: user_id -> {connection_id: PAIAConnection}"""
+        return self.connections.by_user
 
     def is_user_online(self, user_id: str) -> bool:
         """Verificar si un usuario está online"""
-        return user_id in self.active_connections
+        return self.connections.is_online(user_id)
+
+    def get_user_presence(self, user_id: str) -> Dict[str, Any]:
+        """
+        Presencia de un usuario según la actividad de sus conexiones.
+
+        Returns:
+            Dict con online, connections y last_seen (ISO, None si nunca se conectó)
+        """
+        connections = self.connections.get(user_id)
+        timestamps = [conn.last_seen for conn in connections]
+        if user_id in self.last_seen:
+            timestamps.append(self.last_seen[user_id])
+
+        return {
+            "user_id": user_id,
+            "online": bool(connections),
+            "connections": len(connections),
+            "last_seen": (
+                datetime.fromtimestamp(max(timestamps), tz=timezone.utc).isoformat()
+                if timestamps else None
+            )
+        }
 
     async def broadcast_to_user(self, user_id: str, message: Dict[str, Any]):
         """Enviar un mensaje a un usuario específico vía WebSocket"""
-        if user_id in self.active_connections:
-            try:
-                await self.active_connections[user_id].send_json(message)
-                print(f"[PAIA WS] ✓ Mensaje enviado a usuario {user_id}: {message.get('type')}")
-            except Exception as e:
-                print(f"[PAIA WS] ✗ Error enviando a usuario {user_id}: {e}")
+        if await self.send_to_user(user_id, message):
+            print(f"[PAIA WS] ✓ Mensaje enviado a usuario {user_id}: {message.get('type')}")
 
-    async def send_to_user(self, user_id: str, message: Dict[str, Any]):
+    async def send_to_user(self, user_id: str, message: Dict[str, Any]) -> bool:
         """
-        Enviar un mensaje a un usuario específico.
+        Enviar un mensaje a todas las conexiones de un usuario.
+        El mensaje se serializa una sola vez y se encola en cada conexión
+        sin esperar al socket; las conexiones cerradas se limpian.
 
         Args:
             user_id: ID del usuario
             message: Mensaje a enviar
+
+        Returns:
+            True si al menos una conexión aceptó el mensaje
         """
-        if user_id in self.active_connections:
-            try:
-                websocket = self.active_connections[user_id]
-                await websocket.send_json(message)
-                return True
-            except Exception as e:
-                print(f"[PAIA WS] Error enviando a {user_id}: {e}")
-                return False
-        return False
+        targets = self.connections.get(user_id)
+        if not targets:
+            return False
+
+        # Secuencia por usuario: el frame queda en el anillo de replay
+        session = self._get_session(user_id)
+        seq = session.next_seq()
+        payload = serialize_frame({**message, "seq": seq})
+        session.record(seq, payload)
+
+        delivered = False
+        for conn in targets:
+            if conn.enqueue(payload):
+                delivered = True
+            elif conn.closed:
+                await self._cleanup_connection(conn)
+
+        return delivered
+
+    def get_queue_metrics(self) -> Dict[str, Any]:
+        """Métricas de las colas de salida de todas las conexiones"""
+        return self.connections.queue_metrics()
+
+    # ==================== ÍNDICE AGENTE -> USUARIO ====================
+
+    def _index_user_agents(self, user_id: str, agent_ids: list):
+        """Registrar los agentes de un usuario online en ambos índices"""
+        self._unindex_user(user_id)
+        self.user_agents[user_id] = list(agent_ids)
+        for agent_id in agent_ids:
+            self.agent_users.setdefault(agent_id, set()).add(user_id)
+
+    def _unindex_user(self, user_id: str):
+        """Quitar a un usuario (offline) de ambos índices"""
+        for agent_id in self.user_agents.pop(user_id, []):
+            users = self.agent_users.get(agent_id)
+            if users is not None:
+                users.discard(user_id)
+                if not users:
+                    del self.agent_users[agent_id]
+
+    def add_agent(self, user_id: str, agent_id: str):
+        """
+        Indexar un agente recién creado.
+        Si el dueño no está online no hace nada: sus agentes se cargan al conectar.
+        """
+        agent_ids = self.user_agents.get(user_id)
+        if agent_ids is None or agent_id in agent_ids:
+            return
+        agent_ids.append(agent_id)
+        self.agent_users.setdefault(agent_id, set()).add(user_id)
+
+    def remove_agent(self, agent_id: str):
+        """Quitar un agente eliminado de los índices"""
+        for user_id in self.agent_users.pop(agent_id, set()):
+            agent_ids = self.user_agents.get(user_id)
+            if agent_ids and agent_id in agent_ids:
+                agent_ids.remove(agent_id)
+
+    def get_agent_users(self, agent_ids: Iterable[str]) -> Set[str]:
+        """Usuarios online dueños de alguno de los agentes"""
+        target_users: Set[str] = set()
+        for agent_id in agent_ids:
+            users = self.agent_users.get(agent_id)
+            if users:
+                target_users.update(users)
+        return target_users
 
     async def broadcast_to_agents(
         self,
@@ -293,14 +696,8 @@ class PAIAWebSocketHandler:
             agent_ids: Lista de IDs de agentes
             message: Mensaje a enviar
         """
-        # Encontrar usuarios que tienen estos agentes
-        target_users = set()
-        for user_id, user_agent_list in self.user_agents.items():
-            if any(agent_id in user_agent_list for agent_id in agent_ids):
-                target_users.add(user_id)
-
-        # Enviar a cada usuario
-        for user_id in target_users:
+        # Resolver usuarios con el índice inverso (proporcional a len(agent_ids))
+        for user_id in self.get_agent_users(agent_ids):
             await self.send_to_user(user_id, message)
 
 
@@ -309,7 +706,8 @@ class PAIAWebSocketHandler:
 def create_paia_websocket_endpoint(
     router: PAIAMessageRouter,
     auth_manager,
-    db_manager
+    db_manager,
+    **handler_options
 ):
     """
     Crear el endpoint de WebSocket para FastAPI.
@@ -318,11 +716,12 @@ def create_paia_websocket_endpoint(
         router: Router PAIA
         auth_manager: Gestor de autenticación
         db_manager: Gestor de base de datos
+        **handler_options: Opciones de PAIAWebSocketHandler (max_queue_size, overflow_policy)
 
     Returns:
         Función async para usar como endpoint
     """
-    handler = PAIAWebSocketHandler(router, auth_manager, db_manager)
+    handler = PAIAWebSocketHandler(router, auth_manager, db_manager, **handler_options)
 
     # Registrar el handler en el router para que pueda enviar mensajes
     router.ws_manager = handler
@@ -5,9 +5,11 @@ Handles agent CRUD operations and messaging.
 from typing import Dict, Any, Optional, List
 from datetime import datetime
 from dataclasses import asdict
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from langchain_core.messages import HumanMessage, AIMessage
 
+from utils.pagination import InvalidCursor, clamp_limit, stream_page
+
 
 def create_agents_router(
     agents_store: Dict[str, Any],
@@ -19,7 +21,8 @@ def create_agents_router(
     ensure_agent_loaded_func: Any,
     whatsapp_service: Optional[Any],
     telegram_default_chat_id: str,
-    register_agent_in_paia_func: Any = None  # Funcion para registrar en protocolo PAIA
+    register_agent_in_paia_func: Any = None,  # Funcion para registrar en protocolo PAIA
+    unregister_agent_from_paia_func: Any = None  # Funcion para quitar del protocolo PAIA
 ) -> APIRouter:
     """
     Create agents router with dependencies.
@@ -94,29 +97,41 @@ def create_agents_router(
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"{type(e).__name__}: {str(e)}")
 
+    def _db_agent_to_dict(db_agent) -> Dict[str, Any]:
+        return {
+            'id': db_agent.id,
+            'name': db_agent.name,
+            'description': db_agent.description,
+            'personality': db_agent.personality,
+            'expertise': db_agent.expertise,
+            'status': db_agent.status,
+            'created': db_agent.created_at.isoformat() if db_agent.created_at else None,
+            'mcp_endpoint': db_agent.mcp_endpoint,
+            'user_id': db_agent.user_id,
+            'is_public': db_agent.is_public,
+            'telegram_chat_id': db_agent.telegram_chat_id,
+            'is_persistent': db_agent.is_persistent,
+            'auto_start': db_agent.auto_start
+        }
+
     @router.get("/api/agents")
-    async def get_agents(user_id: str = None) -> Dict[str, Any]:
+    async def get_agents(
+        user_id: str = None,
+        cursor: Optional[str] = Query(default=None),
+        limit: Optional[int] = Query(default=None)
+    ):
         if user_id:
-            db_agents = await db_manager.get_agents_by_user(user_id)
-            agents_list = []
-            for db_agent in db_agents:
-                agent_dict = {
-                    'id': db_agent.id,
-                    'name': db_agent.name,
-                    'description': db_agent.description,
-                    'personality': db_agent.personality,
-                    'expertise': db_agent.expertise,
-                    'status': db_agent.status,
-                    'created': db_agent.created_at.isoformat(),
-                    'mcp_endpoint': db_agent.mcp_endpoint,
-                    'user_id': db_agent.user_id,
-                    'is_public': db_agent.is_public,
-                    'telegram_chat_id': db_agent.telegram_chat_id,
-                    'is_persistent': db_agent.is_persistent,
-                    'auto_start': db_agent.auto_start
-                }
-                agents_list.append(agent_dict)
-            return {"agents": agents_list, "count": len(agents_list)}
+            if cursor is None and limit is None:
+                # Sin paginación pedida: todos los agentes, como antes
+                db_agents, next_cursor = await db_manager.get_agents_by_user(user_id), None
+            else:
+                try:
+                    db_agents, next_cursor = await db_manager.get_agents_by_user_page(
+                        user_id, cursor=cursor, limit=clamp_limit(limit)
+                    )
+                except InvalidCursor as e:
+                    raise HTTPException(status_code=400, detail=str(e))
+            return stream_page("agents", (_db_agent_to_dict(a) for a in db_agents), next_cursor)
         else:
             agents_list = []
             for agent in agents_store.values():
@@ -127,28 +142,23 @@ def create_agents_router(
             return {"agents": agents_list, "count": len(agents_list)}
 
     @router.get("/api/agents/public")
-    async def get_public_agents(exclude_user_id: str = None) -> Dict[str, Any]:
+    async def get_public_agents(
+        exclude_user_id: str = None,
+        cursor: Optional[str] = Query(default=None),
+        limit: Optional[int] = Query(default=None)
+    ):
         valid_exclude_id = exclude_user_id if exclude_user_id and exclude_user_id != 'anonymous' else None
-        db_agents = await db_manager.get_public_agents(valid_exclude_id)
-        agents_list = []
-        for db_agent in db_agents:
-            agent_dict = {
-                'id': db_agent.id,
-                'name': db_agent.name,
-                'description': db_agent.description,
-                'personality': db_agent.personality,
-                'expertise': db_agent.expertise,
-                'status': db_agent.status,
-                'created': db_agent.created_at.isoformat(),
-                'mcp_endpoint': db_agent.mcp_endpoint,
-                'user_id': db_agent.user_id,
-                'is_public': db_agent.is_public,
-                'telegram_chat_id': db_agent.telegram_chat_id,
-                'is_persistent': db_agent.is_persistent,
-                'auto_start': db_agent.auto_start
-            }
-            agents_list.append(agent_dict)
-        return {"agents": agents_list, "count": len(agents_list)}
+        if cursor is None and limit is None:
+            # Sin paginación pedida: todos los agentes públicos, como antes
+            db_agents, next_cursor = await db_manager.get_public_agents(valid_exclude_id), None
+        else:
+            try:
+                db_agents, next_cursor = await db_manager.get_public_agents_page(
+                    valid_exclude_id, cursor=cursor, limit=clamp_limit(limit)
+                )
+            except InvalidCursor as e:
+                raise HTTPException(status_code=400, detail=str(e))
+        return stream_page("agents", (_db_agent_to_dict(a) for a in db_agents), next_cursor)
 
     @router.get("/api/agents/{agent_id}")
     async def get_agent_by_id(agent_id: str) -> Dict[str, Any]:
@@ -199,6 +209,12 @@ def create_agents_router(
             if agent_id in agents_store:
                 del agents_store[agent_id]
 
+            if unregister_agent_from_paia_func:
+                try:
+                    await unregister_agent_from_paia_func(agent_id)
+                except Exception as paia_err:
+                    print(f"[PAIA] Warning: No se pudo quitar agente de PAIA: {paia_err}")
+
             return {"message": f"Agente {db_agent.name} eliminado exitosamente"}
         except HTTPException:
             raise
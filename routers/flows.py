@@ -2,9 +2,11 @@
 Flows routers for PAIA Backend.
 """
 
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import json
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
+
+from utils.pagination import InvalidCursor, clamp_limit, stream_page
 
 
 def create_flows_router(db_manager: Any) -> APIRouter:
@@ -29,10 +31,22 @@ def create_flows_router(db_manager: Any) -> APIRouter:
             raise HTTPException(status_code=500, detail=str(e))
 
     @router.get('/api/flows/user/{user_id}')
-    async def get_user_flows(user_id: str) -> Dict[str, Any]:
+    async def get_user_flows(
+        user_id: str,
+        cursor: Optional[str] = Query(default=None),
+        limit: Optional[int] = Query(default=None)
+    ):
         try:
-            flows = await db_manager.get_user_flows(user_id)
-            return {'flows': flows, 'count': len(flows)}
+            if cursor is None and limit is None:
+                # Sin paginación pedida: todos los flujos, como antes
+                flows, next_cursor = await db_manager.get_user_flows(user_id), None
+            else:
+                flows, next_cursor = await db_manager.get_user_flows_page(
+                    user_id, cursor=cursor, limit=clamp_limit(limit)
+                )
+            return stream_page('flows', flows, next_cursor)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"{type(e).__name__}: {str(e)}")
 
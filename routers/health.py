@@ -6,6 +6,11 @@ from typing import Dict, Any, Optional, Callable
 from datetime import datetime
 from fastapi import APIRouter
 
+from config.settings import STORAGE_BACKEND
+from supabase_config import db_executor, supabase_http
+from utils.principal_cache import principal_cache
+from db_manager_supabase import agent_cache, phone_index
+
 
 def create_health_router(
     agents_store: Dict[str, Any],
@@ -14,10 +19,10 @@ def create_health_router(
     message_history: Dict[str, Any],
     telegram_bot_token: str,
     whatsapp_service: Optional[Any],
-    paia_router: Optional[Any],
-    paia_discovery: Optional[Any],
-    paia_autonomy: Optional[Any],
-    paia_ws_handler: Optional[Any]
+    get_paia_router: Callable[[], Optional[Any]],
+    get_paia_discovery: Callable[[], Optional[Any]],
+    get_paia_autonomy: Callable[[], Optional[Any]],
+    get_paia_ws_handler: Callable[[], Optional[Any]]
 ) -> APIRouter:
     """
     Create health check router with dependencies.
@@ -29,10 +34,13 @@ def create_health_router(
         message_history: Message history storage
         telegram_bot_token: Telegram bot token
         whatsapp_service: WhatsApp service instance
-        paia_router: PAIA protocol router
-        paia_discovery: PAIA discovery service
-        paia_autonomy: PAIA autonomy manager
-        paia_ws_handler: PAIA WebSocket handler
+        get_paia_router: Returns the PAIA protocol router (None until init)
+        get_paia_discovery: Returns the PAIA discovery service (None until init)
+        get_paia_autonomy: Returns the PAIA autonomy manager
+        get_paia_ws_handler: Returns the PAIA WebSocket handler (None until init)
+
+    The PAIA components are created on startup, after this router is built,
+    so they are looked up on every request.
 
     Returns:
         Configured APIRouter with health endpoints
@@ -58,6 +66,12 @@ def create_health_router(
             "telegram_status": telegram_status,
             "whatsapp_status": whatsapp_status,
             "database_connected": True,
+            "storage_backend": STORAGE_BACKEND,
+            "db_executor": db_executor.get_stats(),
+            "supabase_http": supabase_http.get_stats(),
+            "principal_cache": principal_cache.get_stats(),
+            "agent_cache": agent_cache.get_stats(),
+            "phone_index": phone_index.get_stats(),
             "timestamp": datetime.now().isoformat()
         }
 
@@ -68,6 +82,11 @@ def create_health_router(
 
         Returns PAIA protocol status and agent statistics.
         """
+        paia_router = get_paia_router()
+        paia_discovery = get_paia_discovery()
+        paia_autonomy = get_paia_autonomy()
+        paia_ws_handler = get_paia_ws_handler()
+
         if not paia_router or not paia_discovery or not paia_autonomy:
             return {
                 "status": "not_initialized",
@@ -84,7 +103,10 @@ def create_health_router(
                 "protocol_version": "1.0",
                 "total_agents": total_agents,
                 "online_agents": online_agents,
-                "active_connections": len(paia_ws_handler.active_connections) if paia_ws_handler and hasattr(paia_ws_handler, 'active_connections') else 0
+                "active_connections": len(paia_ws_handler.active_connections) if paia_ws_handler and hasattr(paia_ws_handler, 'active_connections') else 0,
+                "active_sockets": paia_ws_handler.connections.connection_count() if paia_ws_handler and hasattr(paia_ws_handler, 'connections') else 0,
+                "outbound_queues": paia_ws_handler.get_queue_metrics() if paia_ws_handler and hasattr(paia_ws_handler, 'get_queue_metrics') else {},
+                "heartbeat": paia_ws_handler.heartbeat.get_stats() if paia_ws_handler and hasattr(paia_ws_handler, 'heartbeat') else {}
             }
         except Exception as e:
             return {
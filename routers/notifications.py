@@ -2,9 +2,11 @@
 Notifications routers for PAIA Backend.
 Handles notification management for users.
 """
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from fastapi import APIRouter, HTTPException, Query
 
+from utils.pagination import InvalidCursor, clamp_limit, stream_page
+
 
 def create_notifications_router(db_manager: Any) -> APIRouter:
     """
@@ -45,29 +47,34 @@ def create_notifications_router(db_manager: Any) -> APIRouter:
     async def get_user_notifications(
         user_id: str,
         unread_only: bool = Query(default=False),
+        cursor: Optional[str] = Query(default=None),
         limit: int = Query(default=50)
-    ) -> Dict[str, Any]:
+    ):
         """
-        Obtener las notificaciones de un usuario.
+        Obtener las notificaciones de un usuario (paginadas, más recientes primero).
 
         Args:
             user_id: User ID to query notifications
             unread_only: Filter only unread notifications
-            limit: Maximum number of notifications to return
+            cursor: Opaque cursor from the previous page's next_cursor
+            limit: Maximum number of notifications per page
 
         Returns:
-            List of notifications and count
+            Streamed JSON with notifications, count and next_cursor
 
         Raises:
-            HTTPException: If retrieval fails
+            HTTPException: If the cursor is invalid or retrieval fails
         """
         try:
-            notifications = await db_manager.get_user_notifications(
+            notifications, next_cursor = await db_manager.get_user_notifications_page(
                 user_id,
                 unread_only=unread_only,
-                limit=limit
+                cursor=cursor,
+                limit=clamp_limit(limit, default=50)
             )
-            return {"notifications": notifications, "count": len(notifications)}
+            return stream_page("notifications", notifications, next_cursor)
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
 
@@ -264,9 +264,8 @@ def create_paia_router(
 
             settings = AutonomySettings.from_dict(settings_data.get('settings', {}))
 
-            paia_autonomy.set_agent_settings(agent_id, settings)
-
-            await db_manager.save_autonomy_settings(agent_id, settings.to_dict())
+            # Write-through: actualiza el cache del manager y la BD
+            await paia_autonomy.save_agent_settings(agent_id, settings)
 
             return {
                 "success": True,
@@ -295,7 +294,15 @@ def create_paia_router(
             HTTPException: If settings cannot be retrieved
         """
         try:
-            settings = await db_manager.get_autonomy_settings(agent_id)
+            if paia_autonomy:
+                # Servido desde el cache versionado del manager
+                cached = await paia_autonomy.ensure_settings_loaded(agent_id)
+                settings = {
+                    **cached.to_dict(),
+                    "updated_at": paia_autonomy.get_settings_version(agent_id)
+                } if cached else None
+            else:
+                settings = await db_manager.get_autonomy_settings(agent_id)
 
             if not settings:
                 return {
@@ -38,9 +38,39 @@ def normalize_whatsapp_phone(phone: str) -> List[str]:
         # Remover código de país: 16505644482 -> 6505644482
         alt_phone = phone[1:]
         variants.append(alt_phone)
-    elif phone_len == 10 and not phone.startswith("52"):
+    elif phone_len == 10:
         # Agregar código de país USA/Canadá: 6505644482 -> 16505644482
+        # (también lada 52x, ej. Tucson 520: un número de México con 52 tiene 12+ dígitos)
         alt_phone = "1" + phone
         variants.append(alt_phone)
 
     return variants
+
+
+def canonical_phone_key(phone: str) -> str:
+    """
+    Clave canónica de un número de WhatsApp: todas las variantes que devuelve
+    normalize_whatsapp_phone producen la misma clave.
+
+    - Solo dígitos (se descartan '+', espacios y guiones)
+    - México: sin el "1" móvil (5214425498784 -> 524425498784)
+    - USA/Canadá: con código de país (6505644482 -> 16505644482)
+
+    Args:
+        phone: Número en cualquier formato
+
+    Returns:
+        Clave canónica ("" si no tiene dígitos)
+    """
+    digits = "".join(char for char in phone or "" if char.isdigit())
+    phone_len = len(digits)
+
+    if digits.startswith("521") and phone_len >= 12:
+        return "52" + digits[3:]
+    if digits.startswith("52") and phone_len >= 12:
+        return digits
+    if digits.startswith("1") and phone_len == 11:
+        return digits
+    if phone_len == 10:
+        return "1" + digits
+    return digits
@@ -6,6 +6,7 @@ from typing import Dict, Any, Optional
 from fastapi import APIRouter, HTTPException, Request, Query
 from fastapi.responses import PlainTextResponse
 import os
+from routers.phone_normalization import canonical_phone_key
 
 
 def create_whatsapp_router(
@@ -103,7 +104,8 @@ def create_whatsapp_router(
             customer_phone = message_data["customer_phone"]
             message_text = message_data["message_text"]
 
-            db_agent = await db_manager.get_agent_by_whatsapp_phone(customer_phone)
+            # Clave canónica calculada una vez; la resolución es un acierto del índice
+            db_agent = await db_manager.get_agent_by_phone_key(canonical_phone_key(customer_phone))
             if not db_agent:
                 return {"status": "ok", "message": "No agent found for this number"}
 
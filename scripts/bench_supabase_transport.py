@@ -0,0 +1,151 @@
+"""
+Benchmark del transporte HTTP de Supabase: pool keep-alive vs una conexión por request.
+
+Por defecto levanta un stand-in local de PostgREST (HTTP/1.1 con keep-alive y
+latencia simulada). Con --url apunta a un PostgREST real, ej. uno local:
+
+    python scripts/bench_supabase_transport.py --requests 2000 --concurrency 16
+    python scripts/bench_supabase_transport.py --url http://localhost:3000 --path /agents?select=id&limit=1
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from utils.http_transport import HTTPTransportConfig, PooledHTTPClient
+
+
+class MockPostgRESTHandler(BaseHTTPRequestHandler):
+    """Responde como PostgREST a cualquier GET (una fila JSON)"""
+
+    protocol_version = "HTTP/1.1"  # keep-alive
+    delay = 0.0
+    body = json.dumps([{"id": "00000000-0000-0000-0000-000000000000", "name": "bench"}]).encode()
+
+    def do_GET(self):
+        if self.delay:
+            time.sleep(self.delay)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_mock_server(delay_ms: float) -> ThreadingHTTPServer:
+    MockPostgRESTHandler.delay = delay_ms / 1000.0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockPostgRESTHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run(label: str, send, total: int, concurrency: int) -> dict:
+    """Lanzar `total` requests con `concurrency` threads y medir latencias"""
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(_):
+        nonlocal errors
+        started = time.perf_counter()
+        try:
+            send()
+        except Exception:
+            with lock:
+                errors += 1
+            return
+        with lock:
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    pct = lambda p: latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000 if latencies else 0.0
+    return {
+        "mode": label,
+        "requests": total,
+        "errors": errors,
+        "req_per_s": round(total / elapsed, 1),
+        "p50_ms": round(pct(0.50), 2),
+        "p95_ms": round(pct(0.95), 2),
+        "p99_ms": round(pct(0.99), 2),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2) if latencies else 0.0
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Base URL de PostgREST (por defecto: stand-in local)")
+    parser.add_argument("--path", default="/rest/v1/agents?select=id&limit=1")
+    parser.add_argument("--key", default=os.getenv("SUPABASE_KEY", ""), help="apikey (Supabase)")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--delay-ms", type=float, default=2.0, help="Latencia simulada del stand-in")
+    parser.add_argument("--max-connections", type=int, default=32)
+    parser.add_argument("--max-keepalive", type=int, default=16)
+    parser.add_argument("--http2", action="store_true", help="Usar HTTP/2 en el pool (requiere h2 y TLS)")
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.url
+    if not base_url:
+        server = start_mock_server(args.delay_ms)
+        base_url = f"http://127.0.0.1:{server.server_address[1]}"
+        print(f"[BENCH] Stand-in de PostgREST en {base_url} (latencia {args.delay_ms} ms)")
+
+    url = base_url.rstrip("/") + args.path
+    headers = {"apikey": args.key, "Authorization": f"Bearer {args.key}"} if args.key else {}
+
+    # 1. Pool keep-alive compartido (como supabase_config)
+    pooled = PooledHTTPClient(HTTPTransportConfig(
+        max_connections=args.max_connections,
+        max_keepalive_connections=args.max_keepalive,
+        http2=args.http2
+    ))
+    results = [run(
+        "pooled",
+        lambda: pooled.client.get(url, headers=headers).raise_for_status(),
+        args.requests, args.concurrency
+    )]
+    pool_stats = pooled.get_stats()
+    pooled.close()
+
+    # 2. Una conexión nueva por request (handshake TCP/TLS cada vez)
+    def fresh():
+        with httpx.Client(timeout=30.0) as client:
+            client.get(url, headers=headers).raise_for_status()
+
+    results.append(run("no_keepalive", fresh, args.requests, args.concurrency))
+
+    print(f"\n{'mode':<14}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for r in results:
+        print(f"{r['mode']:<14}{r['req_per_s']:>10}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{r['errors']:>8}")
+
+    print(
+        f"\n[BENCH] Pool: {pool_stats['connections_opened']} conexiones abiertas para "
+        f"{pool_stats['requests']} requests (máx. en vuelo {pool_stats['max_in_flight']}, "
+        f"http2={pool_stats['http2']})"
+    )
+
+    if server:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+"""
+Servicio de replay offline de reglas de autonomía.
+
+Reclasifica el tráfico histórico de un agente (agent_messages_paia) con una
+configuración de autonomía candidata y la compara con la configuración actual,
+antes de aplicar el cambio en producción.
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from paia_protocol.autonomy import AutonomyLevel, AutonomySettings
+from paia_protocol.autonomy_compiler import build_eval_context
+
+
+# Niveles en orden fijo: el código numérico de un nivel es su posición
+_LEVELS: List[AutonomyLevel] = list(AutonomyLevel)
+_LEVEL_CODES: Dict[AutonomyLevel, int] = {level: i for i, level in enumerate(_LEVELS)}
+
+# Columnas mínimas para reglas que no leen el payload
+_BASE_COLUMNS = "id, message_type, from_agent_id, created_at"
+
+
+@dataclass
+class ReplayReport:
+    """Resultado de un replay de autonomía"""
+    agent_id: str
+    total_messages: int = 0
+    current_distribution: Dict[str, int] = field(default_factory=dict)
+    candidate_distribution: Dict[str, int] = field(default_factory=dict)
+    changed_messages: int = 0
+    transitions: Dict[str, int] = field(default_factory=dict)  # "actual->candidato" -> cantidad
+    changed_samples: List[Dict[str, Any]] = field(default_factory=list)
+    elapsed_seconds: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convertir a diccionario para serialización"""
+        return {
+            "agent_id": self.agent_id,
+            "total_messages": self.total_messages,
+            "current_distribution": self.current_distribution,
+            "candidate_distribution": self.candidate_distribution,
+            "changed_messages": self.changed_messages,
+            "transitions": self.transitions,
+            "changed_samples": self.changed_samples,
+            "elapsed_seconds": round(self.elapsed_seconds, 3)
+        }
+
+
+class AutonomyReplayService:
+    """
+    Servicio para evaluar configuraciones de autonomía contra tráfico histórico.
+
+    Los mensajes se leen por páginas keyset y cada página se procesa en columnas
+    NumPy: message_type y from_agent se factorizan (np.unique) y las reglas se
+    evalúan una sola vez por combinación distinta, usando el índice compilado.
+    Solo las configuraciones que leen el payload se evalúan fila a fila.
+    """
+
+    def __init__(self, db_manager, chunk_size: int = 5000, max_samples: int = 20):
+        """
+        Args:
+            db_manager: Gestor de base de datos
+            chunk_size: Mensajes por página leída de la BD
+            max_samples: Máximo de mensajes con cambio de decisión a incluir como ejemplo
+        """
+        self.db_manager = db_manager
+        self.chunk_size = chunk_size
+        self.max_samples = max_samples
+
+    async def replay(
+        self,
+        agent_id: str,
+        candidate: AutonomySettings,
+        current: Optional[AutonomySettings] = None
+    ) -> ReplayReport:
+        """
+        Reclasificar el tráfico histórico de un agente.
+
+        Args:
+            agent_id: ID del agente receptor
+            candidate: Configuración candidata
+            current: Configuración actual (por defecto, la guardada en BD)
+
+        Returns:
+            ReplayReport con distribuciones y diferencias
+        """
+        started = time.perf_counter()
+
+        if current is None:
+            row = await self.db_manager.get_autonomy_settings(agent_id)
+            current = AutonomySettings.from_dict(row) if row else AutonomySettings()
+
+        needs_payload = not (candidate.compiled().memoizable and current.compiled().memoizable)
+        columns = f"{_BASE_COLUMNS}, payload" if needs_payload else _BASE_COLUMNS
+
+        report = ReplayReport(agent_id=agent_id)
+        n_levels = len(_LEVELS)
+        current_counts = np.zeros(n_levels, dtype=np.int64)
+        candidate_counts = np.zeros(n_levels, dtype=np.int64)
+        transition_counts = np.zeros(n_levels * n_levels, dtype=np.int64)
+
+        # La clasificación (CPU) corre en un thread: mientras tanto el loop
+        # ya está leyendo la página siguiente
+        loop = asyncio.get_running_loop()
+        next_page = asyncio.ensure_future(self._fetch_page(agent_id, columns, None))
+
+        while next_page is not None:
+            rows, cursor = await next_page
+            if not rows:
+                break
+
+            next_page = None
+            if cursor:
+                next_page = asyncio.ensure_future(self._fetch_page(agent_id, columns, cursor))
+
+            current_codes, candidate_codes = await loop.run_in_executor(
+                None, self._classify_both, current, candidate, rows
+            )
+
+            current_counts += np.bincount(current_codes, minlength=n_levels)
+            candidate_counts += np.bincount(candidate_codes, minlength=n_levels)
+            transition_counts += np.bincount(
+                current_codes * n_levels + candidate_codes,
+                minlength=n_levels * n_levels
+            )
+
+            self._collect_samples(report, rows, current_codes, candidate_codes)
+            report.total_messages += len(rows)
+
+        report.current_distribution = self._distribution(current_counts)
+        report.candidate_distribution = self._distribution(candidate_counts)
+
+        for code in np.flatnonzero(transition_counts):
+            from_code, to_code = divmod(int(code), n_levels)
+            if from_code != to_code:
+                key = f"{_LEVELS[from_code].value}->{_LEVELS[to_code].value}"
+                report.transitions[key] = int(transition_counts[code])
+                report.changed_messages += int(transition_counts[code])
+
+        report.elapsed_seconds = time.perf_counter() - started
+        print(
+            f"[REPLAY] Agente {agent_id}: {report.total_messages} mensajes, "
+            f"{report.changed_messages} cambian de decisión ({report.elapsed_seconds:.2f}s)"
+        )
+        return report
+
+    async def _fetch_page(self, agent_id: str, columns: str, cursor: Optional[str]) -> Tuple[List[Dict], Optional[str]]:
+        """Leer una página de mensajes recibidos por el agente"""
+        return await self.db_manager.get_paia_messages_page(
+            agent_id,
+            columns=columns,
+            limit=self.chunk_size,
+            cursor=cursor
+        )
+
+    def _classify_both(
+        self,
+        current: AutonomySettings,
+        candidate: AutonomySettings,
+        rows: List[Dict]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Clasificar una página con ambas configuraciones (corre en el executor)"""
+        return self._classify_chunk(current, rows), self._classify_chunk(candidate, rows)
+
+    def _classify_chunk(self, settings: AutonomySettings, rows: List[Dict]) -> np.ndarray:
+        """
+        Clasificar una página de mensajes.
+
+        Returns:
+            Array con el código de nivel de cada fila
+        """
+        compiled = settings.compiled()
+        default_code = _LEVEL_CODES[settings.default_level]
+
+        def decide(eval_context: Dict[str, Any]) -> int:
+            level = compiled.match(eval_context)
+            return _LEVEL_CODES[level] if level is not None else default_code
+
+        if not compiled.memoizable:
+            # Reglas que leen el payload: evaluación fila a fila
+            return np.fromiter(
+                (decide(build_eval_context({
+                    "type": row.get("message_type") or "",
+                    "from_agent_id": row.get("from_agent_id") or "",
+                    "payload": row.get("payload") or {}
+                })) for row in rows),
+                dtype=np.int64,
+                count=len(rows)
+            )
+
+        types = np.array([row.get("message_type") or "" for row in rows], dtype=object)
+        type_values, type_index = np.unique(types, return_inverse=True)
+
+        if "from_agent" in compiled.variables:
+            senders = np.array([row.get("from_agent_id") or "" for row in rows], dtype=object)
+            sender_values, sender_index = np.unique(senders, return_inverse=True)
+        else:
+            sender_values, sender_index = np.array([""], dtype=object), np.zeros(len(rows), dtype=np.int64)
+
+        # Una clave por combinación (message_type, from_agent) distinta
+        pair_keys = type_index.astype(np.int64) * len(sender_values) + sender_index
+        unique_pairs, pair_index = np.unique(pair_keys, return_inverse=True)
+
+        pair_codes = np.empty(len(unique_pairs), dtype=np.int64)
+        for i, pair in enumerate(unique_pairs):
+            type_pos, sender_pos = divmod(int(pair), len(sender_values))
+            pair_codes[i] = decide({
+                "message_type": type_values[type_pos],
+                "from_agent": sender_values[sender_pos],
+                "payload": {}
+            })
+
+        return pair_codes[pair_index]
+
+    def _collect_samples(self, report: ReplayReport, rows, current_codes, candidate_codes):
+        """Guardar algunos mensajes cuya decisión cambia"""
+        remaining = self.max_samples - len(report.changed_samples)
+        if remaining <= 0:
+            return
+
+        for i in np.flatnonzero(current_codes != candidate_codes)[:remaining]:
+            row = rows[int(i)]
+            report.changed_samples.append({
+                "message_id": row.get("id"),
+                "message_type": row.get("message_type"),
+                "from_agent_id": row.get("from_agent_id"),
+                "current": _LEVELS[int(current_codes[i])].value,
+                "candidate": _LEVELS[int(candidate_codes[i])].value
+            })
+
+    @staticmethod
+    def _distribution(counts: np.ndarray) -> Dict[str, int]:
+        return {level.value: int(counts[i]) for i, level in enumerate(_LEVELS)}
+
+
+if __name__ == "__main__":
+    # Uso: python -m services.autonomy_replay_service <agent_id> <candidate.json>
+    import json
+    import sys
+
+    from db_manager_supabase import DatabaseManager
+
+    if len(sys.argv) != 3:
+        print("Uso: python -m services.autonomy_replay_service <agent_id> <candidate.json>")
+        sys.exit(1)
+
+    with open(sys.argv[2], encoding="utf-8") as f:
+        candidate_settings = AutonomySettings.from_dict(json.load(f))
+
+    service = AutonomyReplayService(DatabaseManager())
+    result = asyncio.run(service.replay(sys.argv[1], candidate_settings))
+    print(json.dumps(result.to_dict(), indent=2, ensure_ascii=False))
@@ -0,0 +1,817 @@
+# sqlite_storage.py
+"""
+Backend de almacenamiento embebido en SQLite.
+
+Expone la misma superficie que el cliente síncrono de Supabase que usan
+DatabaseManager, AuthManager y LongTermStoreSupabase
+(`client.table(...).select(...).eq(...).execute()`, `client.rpc(...)`), de
+modo que los gestores funcionan sin cambios con STORAGE_BACKEND=sqlite.
+
+- Una conexión por thread del DBExecutor (run_query), en modo WAL: las
+  lecturas no se bloquean con las escrituras.
+- Consultas siempre parametrizadas; el SQL de una misma forma de consulta es
+  idéntico, así que se reutiliza el statement preparado del cache de sqlite3.
+- El esquema (con sus índices) se crea al abrir la base.
+"""
+import json
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Tipos de columna: T=texto, B=booleano, I=entero, J=JSON
+TEXT, BOOL, INT, JSON = "T", "B", "I", "J"
+
+_SQL_TYPES = {TEXT: "TEXT", BOOL: "INTEGER", INT: "INTEGER", JSON: "TEXT"}
+
+# Cache de páginas por conexión (KiB); el default de SQLite (2 MiB) queda corto con índices sobre UUIDs
+SQLITE_CACHE_KB = 65536
+
+# Parámetros por sentencia (SQLITE_MAX_VARIABLE_NUMBER es 32766 desde SQLite 3.32)
+MAX_SQL_VARIABLES = 32000
+
+# Esquema derivado de las escrituras de los gestores (mismo nombre y columnas que en Supabase).
+# columnas: nombre -> (tipo, DEFAULT SQL o None)
+SCHEMA: Dict[str, Dict[str, Any]] = {
+    "users": {
+        "columns": {
+            "id": (TEXT, None), "email": (TEXT, None), "name": (TEXT, None),
+            "password_hash": (TEXT, None), "google_id": (TEXT, None), "image": (TEXT, None),
+            "is_active": (BOOL, "1"), "created_at": (TEXT, None), "updated_at": (TEXT, None)
+        },
+        "unique": [("email",)],
+        "indexes": [("google_id",)]
+    },
+    "user_credentials": {
+        "columns": {
+            "id": (TEXT, None), "user_id": (TEXT, None), "provider": (TEXT, None),
+            "credentials": (JSON, None), "created_at": (TEXT, None), "updated_at": (TEXT, None)
+        },
+        "unique": [("user_id", "provider")],
+        "indexes": []
+    },
+    "agents": {
+        "columns": {
+            "id": (TEXT, None), "user_id": (TEXT, None), "name": (TEXT, None),
+            "description": (TEXT, None), "personality": (TEXT, None), "expertise": (TEXT, None),
+            "status": (TEXT, "'active'"), "mcp_endpoint": (TEXT, None), "is_public": (BOOL, "1"),
+            "telegram_chat_id": (TEXT, None), "whatsapp_phone_number": (TEXT, None),
+            "is_persistent": (BOOL, "0"), "auto_start": (BOOL, "0"),
+            "created_at": (TEXT, None), "updated_at": (TEXT, None)
+        },
+        "unique": [],
+        "indexes": [("user_id", "created_at"), ("is_public", "created_at"), ("whatsapp_phone_number",)]
+    },
+    "agent_connections": {
+        "columns": {
+            "id": (TEXT, None), "agent1_id": (TEXT, None), "agent2_id": (TEXT, None),
+            "connection_type": (TEXT, None), "status": (TEXT, None), "created_at": (TEXT, None)
+        },
+        "unique": [],
+        "indexes": [("agent1_id",), ("agent2_id",)]
+    },
+    "agent_messages": {
+        "columns": {
+            "id": (TEXT, None), "conversation_id": (TEXT, None), "from_agent_id": (TEXT, None),
+            "to_agent_id": (TEXT, None), "content": (TEXT, None), "message_type": (TEXT, None),
+            "is_read": (BOOL, "0"), "telegram_sent": (BOOL, "0"), "created_at": (TEXT, None)
+        },
+        "unique": [],
+        "indexes": [("conversation_id", "created_at"), ("to_agent_id",)]
+    },
+    "notifications": {
+        "columns": {
+            "id": (TEXT, None), "user_id": (TEXT, None), "agent_id": (TEXT, None),
+            "title": (TEXT, None), "content": (TEXT, None), "notification_type": (TEXT, None),
+            "priority": (TEXT, None), "is_read": (BOOL, "0"), "is_dismissed": (BOOL, "0"),
+            "sent_telegram": (BOOL, "0"), "sent_email": (BOOL, "0"),
+            "created_at": (TEXT, None), "read_at": (TEXT, None), "dismissed_at": (TEXT, None)
+        },
+        "unique": [],
+        "indexes": [("user_id", "created_at")]
+    },
+    "saved_flows": {
+        "columns": {
+            "id": (TEXT, None), "user_id": (TEXT, None), "name": (TEXT, None),
+            "description": (TEXT, None), "flow_data": (JSON, None), "is_public": (BOOL, "0"),
+            "is_active": (BOOL, "0"), "version": (INT, "1"), "tags": (JSON, None),
+            "metadata": (JSON, None), "created_at": (TEXT, None), "updated_at": (TEXT, None)
+        },
+        "unique": [],
+        "indexes": [("user_id", "updated_at")]
+    },
+    "flow_connections": {
+        "columns": {
+            "id": (TEXT, None), "flow_owner_id": (TEXT, None), "target_user_id": (TEXT, None),
+            "connection_node_id": (TEXT, None), "connection_type": (TEXT, None),
+            "target_agent_id": (TEXT, None), "metadata": (JSON, None), "status": (TEXT, None),
+            "created_at": (TEXT, None), "updated_at": (TEXT, None)
+        },
+        "unique": [],
+        "indexes": [("flow_owner_id",), ("target_user_id",)]
+    },
+    "user_connections": {
+        "columns": {
+            "id": (TEXT, None), "user1_id": (TEXT, None), "user2_id": (TEXT, None),
+            "connection_type": (TEXT, None), "status": (TEXT, None),
+            "created_at": (TEXT, None), "updated_at": (TEXT, None)
+        },
+        "unique": [],
+        "indexes": [("user1_id", "status"), ("user2_id", "status")]
+    },
+    "agent_capabilities": {
+        "columns": {
+            "id": (TEXT, None), "agent_id": (TEXT, None), "capability_name": (TEXT, None),
+            "capability_type": (TEXT, None), "description": (TEXT, None),
+            "input_schema": (JSON, None), "output_schema": (JSON, None),
+            "requires_approval": (BOOL, "0"), "autonomy_level": (TEXT, None),
+            "enabled": (BOOL, "1"), "created_at": (TEXT, None)
+        },
+        "unique": [("agent_id", "capability_type")],
+        "indexes": []
+    },
+    "agent_conversations": {
+        "columns": {
+            "id": (TEXT, None), "agent1_id": (TEXT, None), "agent2_id": (TEXT, None),
+            "created_at": (TEXT, None), "updated_at": (TEXT, None)
+        },
+        "unique": [("agent1_id", "agent2_id")],
+        "indexes": []
+    },
+    "agent_messages_paia": {
+        "columns": {
+            "id": (TEXT, None), "conversation_id": (TEXT, None), "from_agent_id": (TEXT, None),
+            "to_agent_id": (TEXT, None), "message_type": (TEXT, None), "payload": (JSON, None),
+            "metadata": (JSON, None), "status": (TEXT, None), "created_at": (TEXT, None),
+            "delivered_at": (TEXT, None), "read_at": (TEXT, None)
+        },
+        "unique": [],
+        "indexes": [("to_agent_id", "status", "created_at"), ("conversation_id", "created_at")]
+    },
+    "autonomy_settings": {
+        "primary_key": "agent_id",
+        "columns": {
+            "agent_id": (TEXT, None), "default_level": (TEXT, None), "rules": (JSON, None),
+            "created_at": (TEXT, None), "updated_at": (TEXT, None)
+        },
+        "unique": [],
+        "indexes": []
+    },
+    "long_term_memories": {
+        "columns": {
+            "id": (TEXT, None), "memory_profile_id": (TEXT, None), "key": (TEXT, None),
+            "value": (TEXT, None), "created_at": (TEXT, None), "updated_at": (TEXT, None)
+        },
+        "unique": [("memory_profile_id", "key")],
+        "indexes": []
+    }
+}
+
+
+class SQLiteAPIError(Exception):
+    """Error de una consulta (equivalente al APIError de PostgREST)"""
+
+    def __init__(self, message: str, code: Optional[str] = None):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+
+
+class SQLiteResponse:
+    """Resultado de execute(): mismos atributos que el APIResponse de supabase"""
+
+    __slots__ = ("data", "count")
+
+    def __init__(self, data: Any, count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+def _quote_ident(name: str) -> str:
+    return '"' + name + '"'
+
+
+def _now() -> str:
+    return datetime.utcnow().isoformat()
+
+
+class TableInfo:
+    """Metadatos de una tabla: columnas válidas y conversiones de tipo"""
+
+    def __init__(self, name: str, spec: Dict[str, Any]):
+        self.name = name
+        self.primary_key = spec.get("primary_key", "id")
+        self.types: Dict[str, str] = {col: col_type for col, (col_type, _) in spec["columns"].items()}
+        self.columns: Tuple[str, ...] = tuple(spec["columns"])
+        self.unique: List[Tuple[str, ...]] = [tuple(cols) for cols in spec.get("unique", [])]
+        self.indexes: List[Tuple[str, ...]] = [tuple(cols) for cols in spec.get("indexes", [])]
+        self.decoded = [col for col, col_type in self.types.items() if col_type in (BOOL, JSON)]
+        self.converted = frozenset(self.decoded)
+
+    def column(self, name: str) -> str:
+        """Validar un nombre de columna (los nombres se interpolan en el SQL)"""
+        if name not in self.types:
+            raise SQLiteAPIError(f"column {self.name}.{name} does not exist", code="42703")
+        return name
+
+    def encode(self, column: str, value: Any) -> Any:
+        """Valor Python -> valor SQLite"""
+        if value is None:
+            return None
+        col_type = self.types[column]
+        if col_type == BOOL:
+            if isinstance(value, str):
+                return 1 if value.lower() == "true" else 0
+            return 1 if value else 0
+        if col_type == JSON:
+            return json.dumps(value, ensure_ascii=False, default=str)
+        if isinstance(value, datetime):
+            return value.isoformat()
+        return value
+
+    def decode_row(self, row: sqlite3.Row) -> Dict[str, Any]:
+        """Fila SQLite -> dict como los que devuelve PostgREST"""
+        data = dict(row)
+        for column in self.decoded:
+            value = data.get(column)
+            if value is None:
+                continue
+            if self.types[column] == BOOL:
+                data[column] = bool(value)
+            else:
+                data[column] = json.loads(value)
+        return data
+
+    def ddl(self, spec: Dict[str, Any]) -> List[str]:
+        """Sentencias CREATE TABLE / CREATE INDEX"""
+        columns = []
+        for column, (col_type, default) in spec["columns"].items():
+            definition = f"{_quote_ident(column)} {_SQL_TYPES[col_type]}"
+            if column == self.primary_key:
+                definition += " PRIMARY KEY"
+            if default is not None:
+                definition += f" DEFAULT {default}"
+            columns.append(definition)
+
+        # Las claves únicas van como índices para que también se agreguen a bases existentes
+        statements = [f"CREATE TABLE IF NOT EXISTS {_quote_ident(self.name)} ({', '.join(columns)})"]
+        for prefix, kind, index_columns in (
+            [("uq", "UNIQUE INDEX", cols) for cols in self.unique]
+            + [("idx", "INDEX", cols) for cols in self.indexes]
+        ):
+            index_name = f"{prefix}_{self.name}_{'_'.join(index_columns)}"
+            statements.append(
+                f"CREATE {kind} IF NOT EXISTS {_quote_ident(index_name)} "
+                f"ON {_quote_ident(self.name)} ({', '.join(map(_quote_ident, index_columns))})"
+            )
+        return statements
+
+
+# ---------------------------------------------------------------------------
+# Filtros lógicos de PostgREST: "col.op.valor,and(col.op.valor,...)"
+# ---------------------------------------------------------------------------
+
+_COMPARISON_OPS = {"eq": "=", "neq": "!=", "gt": ">", "gte": ">=", "lt": "<", "lte": "<="}
+
+
+def _split_top_level(expr: str) -> List[str]:
+    """Separar por comas fuera de paréntesis y comillas"""
+    parts, depth, quoted, escaped, current = [], 0, False, False, []
+    for char in expr:
+        if escaped:
+            escaped = False
+        elif char == "\\" and quoted:
+            escaped = True
+        elif char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and char == ",":
+            parts.append("".join(current))
+            current = []
+            continue
+        current.append(char)
+    parts.append("".join(current))
+    return [part.strip() for part in parts if part.strip()]
+
+
+def _unquote(value: str) -> str:
+    if len(value) >= 2 and value[0] == '"' and value[-1] == '"':
+        return re.sub(r'\\(.)', r'\1', value[1:-1])
+    return value
+
+
+def _condition_sql(table: TableInfo, column: str, op: str, value: Any, negate: bool = False) -> Tuple[str, List[Any]]:
+    """SQL parametrizado de una condición `column op value`"""
+    column = table.column(column)
+    ident = _quote_ident(column)
+
+    if op in _COMPARISON_OPS:
+        sql, params = f"{ident} {_COMPARISON_OPS[op]} ?", [table.encode(column, value)]
+    elif op in ("like", "ilike"):
+        # SQLite: LIKE es insensible a mayúsculas (ASCII); '*' es comodín en PostgREST
+        sql, params = f"{ident} LIKE ?", [str(value).replace("*", "%")]
+    elif op == "is":
+        literal = str(value).lower() if value is not None else "null"
+        if literal == "null":
+            sql, params = f"{ident} IS NULL", []
+        else:
+            sql, params = f"{ident} IS ?", [1 if literal == "true" else 0]
+    elif op == "in":
+        values = list(value)
+        if not values:
+            sql, params = "0", []
+        else:
+            sql = f"{ident} IN ({', '.join('?' * len(values))})"
+            params = [table.encode(column, v) for v in values]
+    else:
+        raise SQLiteAPIError(f"unsupported operator: {op}", code="PGRST100")
+
+    if negate:
+        sql = f"NOT ({sql})"
+    return sql, params
+
+
+def _parse_logic(table: TableInfo, expr: str, joiner: str) -> Tuple[str, List[Any]]:
+    """Traducir una lista de condiciones PostgREST a SQL (unidas con AND/OR)"""
+    clauses, params = [], []
+    for term in _split_top_level(expr):
+        negate = False
+        if term.startswith("not."):
+            negate, term = True, term[4:]
+
+        group = re.match(r"^(and|or)\((.*)\)$", term, re.S)
+        if group:
+            sql, term_params = _parse_logic(table, group.group(2), " AND " if group.group(1) == "and" else " OR ")
+            sql = f"({sql})"
+            if negate:
+                sql = f"NOT {sql}"
+        else:
+            try:
+                column, op, raw = term.split(".", 2)
+            except ValueError:
+                raise SQLiteAPIError(f"failed to parse logic tree ({term})", code="PGRST100")
+            if op == "not":
+                negate = not negate
+                op, raw = raw.split(".", 1)
+
+            if op == "in":
+                value: Any = [_unquote(v) for v in _split_top_level(raw.strip("()"))]
+            else:
+                value = _unquote(raw)
+            sql, term_params = _condition_sql(table, column, op, value, negate)
+
+        clauses.append(sql)
+        params.extend(term_params)
+
+    return joiner.join(clauses) or "1", params
+
+
+# ---------------------------------------------------------------------------
+# Query builder
+# ---------------------------------------------------------------------------
+
+class SQLiteQueryBuilder:
+    """Query builder con la API encadenable del cliente de Supabase"""
+
+    def __init__(self, client: "SQLiteClient", table: TableInfo):
+        self._client = client
+        self._table = table
+        self._action = "select"
+        self._columns = "*"
+        self._count: Optional[str] = None
+        self._values: Any = None
+        self._on_conflict: Optional[str] = None
+        self._ignore_duplicates = False
+        self._where: List[str] = []
+        self._params: List[Any] = []
+        self._order: List[str] = []
+        self._limit: Optional[int] = None
+        self._offset: Optional[int] = None
+        self._single = False
+        self._maybe_single = False
+
+    # Acciones
+    def select(self, columns: str = "*", count: Optional[str] = None) -> "SQLiteQueryBuilder":
+        self._action = "select"
+        self._columns = columns
+        self._count = count
+        return self
+
+    def insert(self, values, count: Optional[str] = None, upsert: bool = False, **kwargs) -> "SQLiteQueryBuilder":
+        if upsert:
+            return self.upsert(values, **kwargs)
+        self._action = "insert"
+        self._values = values
+        return self
+
+    def upsert(
+        self,
+        values,
+        on_conflict: str = "",
+        ignore_duplicates: bool = False,
+        **kwargs
+    ) -> "SQLiteQueryBuilder":
+        self._action = "upsert"
+        self._values = values
+        self._on_conflict = on_conflict
+        self._ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, values: Dict[str, Any], **kwargs) -> "SQLiteQueryBuilder":
+        self._action = "update"
+        self._values = values
+        return self
+
+    def delete(self, **kwargs) -> "SQLiteQueryBuilder":
+        self._action = "delete"
+        return self
+
+    # Filtros
+    def _filter(self, column: str, op: str, value: Any, negate: bool = False) -> "SQLiteQueryBuilder":
+        sql, params = _condition_sql(self._table, column, op, value, negate)
+        self._where.append(sql)
+        self._params.extend(params)
+        return self
+
+    def eq(self, column: str, value: Any):
+        return self._filter(column, "eq", value)
+
+    def neq(self, column: str, value: Any):
+        return self._filter(column, "neq", value)
+
+    def gt(self, column: str, value: Any):
+        return self._filter(column, "gt", value)
+
+    def gte(self, column: str, value: Any):
+        return self._filter(column, "gte", value)
+
+    def lt(self, column: str, value: Any):
+        return self._filter(column, "lt", value)
+
+    def lte(self, column: str, value: Any):
+        return self._filter(column, "lte", value)
+
+    def like(self, column: str, pattern: str):
+        return self._filter(column, "like", pattern)
+
+    def ilike(self, column: str, pattern: str):
+        return self._filter(column, "ilike", pattern)
+
+    def is_(self, column: str, value: Any):
+        return self._filter(column, "is", value)
+
+    def in_(self, column: str, values: Sequence[Any]):
+        return self._filter(column, "in", values)
+
+    def or_(self, filters: str, reference_table: Optional[str] = None):
+        sql, params = _parse_logic(self._table, filters, " OR ")
+        self._where.append(f"({sql})")
+        self._params.extend(params)
+        return self
+
+    # Orden y límites
+    def order(self, column: str, desc: bool = False, nullsfirst: Optional[bool] = None, **kwargs):
+        ident = _quote_ident(self._table.column(column))
+        # PostgreSQL ordena los NULL al principio en DESC y al final en ASC
+        if nullsfirst is None:
+            nullsfirst = desc
+        self._order.append(f"{ident} {'DESC' if desc else 'ASC'} NULLS {'FIRST' if nullsfirst else 'LAST'}")
+        return self
+
+    def limit(self, size: int, **kwargs):
+        self._limit = int(size)
+        return self
+
+    def range(self, start: int, end: int, **kwargs):
+        self._offset = int(start)
+        self._limit = int(end) - int(start) + 1
+        return self
+
+    def single(self):
+        self._single = True
+        return self
+
+    def maybe_single(self):
+        self._maybe_single = True
+        return self
+
+    # SQL
+    def _where_sql(self) -> str:
+        return f" WHERE {' AND '.join(self._where)}" if self._where else ""
+
+    def _select_columns(self) -> str:
+        columns = self._columns.strip()
+        if columns == "*":
+            return "*"
+        names = [self._table.column(name.strip()) for name in columns.split(",") if name.strip()]
+        return ", ".join(map(_quote_ident, names))
+
+    def _prepare_row(self, values: Dict[str, Any]) -> Dict[str, Any]:
+        table = self._table
+        unknown = values.keys() - table.types.keys()
+        if unknown:
+            table.column(unknown.pop())
+
+        # Solo booleanos, JSON y datetimes necesitan conversión
+        row = dict(values)
+        for column, value in values.items():
+            if value is not None and (column in table.converted or isinstance(value, datetime)):
+                row[column] = table.encode(column, value)
+        if self._table.primary_key == "id" and row.get("id") is None:
+            row["id"] = str(uuid.uuid4())
+        if "created_at" in self._table.types and row.get("created_at") is None:
+            row["created_at"] = _now()
+        return row
+
+    def _insert_sql(self, columns: Sequence[str], row_count: int = 1) -> str:
+        placeholders = f"({', '.join('?' * len(columns))})"
+        sql = (
+            f"INSERT INTO {_quote_ident(self._table.name)} ({', '.join(map(_quote_ident, columns))}) "
+            f"VALUES {', '.join([placeholders] * row_count)}"
+        )
+        if self._action == "upsert":
+            conflict = [c.strip() for c in (self._on_conflict or self._table.primary_key).split(",")]
+            target = ", ".join(_quote_ident(self._table.column(c)) for c in conflict)
+            updates = [c for c in columns if c not in conflict and c not in ("id", "created_at")]
+            if self._ignore_duplicates or not updates:
+                sql += f" ON CONFLICT ({target}) DO NOTHING"
+            else:
+                sql += f" ON CONFLICT ({target}) DO UPDATE SET " + ", ".join(
+                    f"{_quote_ident(c)} = excluded.{_quote_ident(c)}" for c in updates
+                )
+        return sql + " RETURNING *"
+
+    def _run(self, conn: sqlite3.Connection) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        table = self._table
+        count = None
+
+        if self._action == "select":
+            sql = f"SELECT {self._select_columns()} FROM {_quote_ident(table.name)}{self._where_sql()}"
+            if self._count:
+                count = conn.execute(
+                    f"SELECT COUNT(*) FROM {_quote_ident(table.name)}{self._where_sql()}", self._params
+                ).fetchone()[0]
+            if self._order:
+                sql += " ORDER BY " + ", ".join(self._order)
+            params = list(self._params)
+            if self._limit is not None or self._offset is not None:
+                sql += " LIMIT ? OFFSET ?"
+                params += [self._limit if self._limit is not None else -1, self._offset or 0]
+            rows = conn.execute(sql, params).fetchall()
+
+        elif self._action in ("insert", "upsert"):
+            values = self._values if isinstance(self._values, list) else [self._values]
+            rows = []
+            with self._client.transaction(conn):
+                # Un INSERT multi-fila por grupo de filas con las mismas columnas
+                prepared = [self._prepare_row(value) for value in values]
+                start = 0
+                while start < len(prepared):
+                    columns = list(prepared[start])
+                    per_statement = max(1, MAX_SQL_VARIABLES // len(columns))
+                    end = start + 1
+                    while end < len(prepared) and end - start < per_statement and list(prepared[end]) == columns:
+                        end += 1
+                    params = [v for row in prepared[start:end] for v in row.values()]
+                    rows.extend(conn.execute(self._insert_sql(columns, end - start), params).fetchall())
+                    start = end
+
+        elif self._action == "update":
+            row = {table.column(c): table.encode(c, v) for c, v in self._values.items()}
+            if not row:
+                return [], None
+            sql = (
+                f"UPDATE {_quote_ident(table.name)} SET "
+                + ", ".join(f"{_quote_ident(c)} = ?" for c in row)
+                + f"{self._where_sql()} RETURNING *"
+            )
+            with self._client.transaction(conn):
+                rows = conn.execute(sql, list(row.values()) + self._params).fetchall()
+
+        else:  # delete
+            sql = f"DELETE FROM {_quote_ident(table.name)}{self._where_sql()} RETURNING *"
+            with self._client.transaction(conn):
+                rows = conn.execute(sql, self._params).fetchall()
+
+        return [table.decode_row(row) for row in rows], count
+
+    def execute(self) -> SQLiteResponse:
+        """Ejecutar la consulta (bloqueante: usar vía run_query)"""
+        try:
+            data, count = self._client.run(self._run)
+        except sqlite3.IntegrityError as e:
+            raise SQLiteAPIError(str(e), code="23505")
+        except sqlite3.Error as e:
+            raise SQLiteAPIError(str(e))
+
+        if self._single or self._maybe_single:
+            if len(data) > 1 or (self._single and not data):
+                raise SQLiteAPIError(
+                    "JSON object requested, multiple (or no) rows returned", code="PGRST116"
+                )
+            return SQLiteResponse(data[0] if data else None, count)
+        return SQLiteResponse(data, count)
+
+
+class SQLiteRPC:
+    """Llamada a una función (equivalente a client.rpc de Supabase)"""
+
+    def __init__(self, client: "SQLiteClient", func: Callable[[sqlite3.Connection, Dict[str, Any]], Any], params: Dict[str, Any]):
+        self._client = client
+        self._func = func
+        self._params = params
+
+    def _call(self, conn: sqlite3.Connection) -> Any:
+        with self._client.transaction(conn):
+            return self._func(conn, self._params)
+
+    def execute(self) -> SQLiteResponse:
+        try:
+            return SQLiteResponse(self._client.run(self._call))
+        except sqlite3.Error as e:
+            raise SQLiteAPIError(str(e))
+
+
+def _rpc_get_or_create_conversation(conn: sqlite3.Connection, params: Dict[str, Any]) -> str:
+    """Misma semántica que la función SQL de la migración: par de agentes ordenado"""
+    agent1_id, agent2_id = sorted([params["p_agent1_id"], params["p_agent2_id"]])
+    now = _now()
+    conn.execute(
+        'INSERT INTO "agent_conversations" ("id", "agent1_id", "agent2_id", "created_at", "updated_at") '
+        'VALUES (?, ?, ?, ?, ?) ON CONFLICT ("agent1_id", "agent2_id") DO NOTHING',
+        [str(uuid.uuid4()), agent1_id, agent2_id, now, now]
+    )
+    row = conn.execute(
+        'SELECT "id" FROM "agent_conversations" WHERE "agent1_id" = ? AND "agent2_id" = ?',
+        [agent1_id, agent2_id]
+    ).fetchone()
+    return row["id"]
+
+
+# Cada función corre dentro de una transacción de escritura
+RPC_FUNCTIONS: Dict[str, Callable[[sqlite3.Connection, Dict[str, Any]], Any]] = {
+    "get_or_create_conversation": _rpc_get_or_create_conversation
+}
+
+
+class SQLiteClient:
+    """Cliente SQLite con la interfaz del cliente síncrono de Supabase"""
+
+    def __init__(self, path: str, busy_timeout: float = 10.0, cached_statements: int = 256):
+        """
+        Args:
+            path: Archivo de la base (":memory:" usa una única conexión compartida)
+            busy_timeout: Segundos de espera si otra conexión tiene el lock de escritura
+            cached_statements: Statements preparados que guarda cada conexión
+        """
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        self.tables = {name: TableInfo(name, spec) for name, spec in SCHEMA.items()}
+
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+
+        # En memoria cada conexión sería una base distinta: se comparte una y se serializa
+        self._shared: Optional[sqlite3.Connection] = None
+        self._shared_lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        if path == ":memory:":
+            self._shared = self._open()
+
+        # Métricas
+        self.queries = 0
+        self.errors = 0
+        self.total_seconds = 0.0
+        # run() se llama desde todos los threads del DBExecutor
+        self._stats_lock = threading.Lock()
+
+        self.init_db()
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout,
+            isolation_level=None,  # autocommit; las escrituras abren su propia transacción
+            check_same_thread=False,  # cada thread usa la suya; close() puede venir de otro
+            cached_statements=self.cached_statements
+        )
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_KB}")
+        with self._connections_lock:
+            self._connections.append(conn)
+        return conn
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = self._open()
+        return conn
+
+    def run(self, func: Callable[[sqlite3.Connection], Any]) -> Any:
+        """Ejecutar `func(conn)` con la conexión del thread actual"""
+        started = time.perf_counter()
+        failed = False
+        try:
+            if self._shared is not None:
+                with self._shared_lock:
+                    return func(self._shared)
+            return func(self._connection())
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._stats_lock:
+                self.queries += 1
+                self.errors += failed
+                self.total_seconds += elapsed
+
+    def transaction(self, conn: sqlite3.Connection):
+        """
+        Transacción de escritura. Los escritores del proceso se turnan con un lock
+        propio en lugar de competir por el de SQLite (que reintenta con esperas).
+        """
+        return _Transaction(conn, self._write_lock)
+
+    def init_db(self):
+        """Crear tablas e índices si no existen"""
+        def create(conn):
+            with self.transaction(conn):
+                for name, spec in SCHEMA.items():
+                    for statement in self.tables[name].ddl(spec):
+                        try:
+                            conn.execute(statement)
+                        except sqlite3.IntegrityError as e:
+                            # Clave única nueva sobre una base con filas duplicadas
+                            print(f"[SQLITE] ⚠ No se pudo crear un índice único de {name}: {e}")
+        self.run(create)
+        print(f"[SQLITE] Base lista en {self.path} ({len(SCHEMA)} tablas)")
+
+    def table(self, name: str) -> SQLiteQueryBuilder:
+        if name not in self.tables:
+            raise SQLiteAPIError(f'relation "{name}" does not exist', code="42P01")
+        return SQLiteQueryBuilder(self, self.tables[name])
+
+    from_ = table
+
+    def rpc(self, name: str, params: Optional[Dict[str, Any]] = None) -> SQLiteRPC:
+        func = RPC_FUNCTIONS.get(name)
+        if func is None:
+            raise SQLiteAPIError(f"function {name} does not exist", code="42883")
+        return SQLiteRPC(self, func, params or {})
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Métricas para /api/health"""
+        return {
+            "backend": "sqlite",
+            "path": self.path,
+            "connections": len(self._connections),
+            "queries": self.queries,
+            "errors": self.errors,
+            "avg_query_ms": round(self.total_seconds / self.queries * 1000, 3) if self.queries else 0.0
+        }
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+
+class _Transaction:
+    """Context manager BEGIN IMMEDIATE / COMMIT / ROLLBACK (reentrante por conexión)"""
+
+    def __init__(self, conn: sqlite3.Connection, lock: threading.Lock):
+        self.conn = conn
+        self.lock = lock
+        self.owner = False
+
+    def __enter__(self):
+        if not self.conn.in_transaction:
+            self.lock.acquire()
+            try:
+                self.conn.execute("BEGIN IMMEDIATE")
+            except BaseException:
+                self.lock.release()
+                raise
+            self.owner = True
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.owner:
+            try:
+                self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+            finally:
+                self.lock.release()
+        return False
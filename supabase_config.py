@@ -1,10 +1,32 @@
 # supabase_config.py
 import os
-from supabase import create_client, Client
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
 from dotenv import load_dotenv
 
+try:
+    from supabase import create_client, Client, ClientOptions
+except ImportError:  # Solo se necesita con STORAGE_BACKEND=supabase
+    create_client = Client = ClientOptions = None
+
 load_dotenv()
 
+from config.settings import (
+    STORAGE_BACKEND,
+    SQLITE_PATH,
+    DB_EXECUTOR_WORKERS,
+    DB_EXECUTOR_MAX_PENDING,
+    SUPABASE_HTTP_MAX_CONNECTIONS,
+    SUPABASE_HTTP_MAX_KEEPALIVE,
+    SUPABASE_HTTP_KEEPALIVE_EXPIRY,
+    SUPABASE_HTTP2,
+    SUPABASE_HTTP_CONNECT_TIMEOUT,
+    SUPABASE_HTTP_READ_TIMEOUT,
+    SUPABASE_HTTP_POOL_TIMEOUT
+)
+
 class SupabaseConfig:
     def __init__(self):
         self.url = os.getenv("SUPABASE_URL")
@@ -13,10 +35,159 @@ class SupabaseConfig:
         if not self.url or not self.key:
             raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set in environment variables")
         
-        self.client = create_client(self.url, self.key)
+        # Pool HTTP keep-alive compartido por todas las consultas
+        self.transport_config = HTTPTransportConfig(
+            max_connections=SUPABASE_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=SUPABASE_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=SUPABASE_HTTP_KEEPALIVE_EXPIRY,
+            http2=SUPABASE_HTTP2,
+            connect_timeout=SUPABASE_HTTP_CONNECT_TIMEOUT,
+            read_timeout=SUPABASE_HTTP_READ_TIMEOUT,
+            write_timeout=SUPABASE_HTTP_READ_TIMEOUT,
+            pool_timeout=SUPABASE_HTTP_POOL_TIMEOUT
+        )
+        self.http = PooledHTTPClient(self.transport_config)
+        self.client = self._create_client()
+
+    def _create_client(self) -> Client:
+        """Crear el cliente de Supabase sobre el pool HTTP configurado"""
+        try:
+            options = ClientOptions(httpx_client=self.http.client)
+        except TypeError:
+            # Versiones de supabase sin httpx_client en ClientOptions:
+            # se reemplaza la sesión de PostgREST conservando su base_url y headers
+            client = create_client(self.url, self.key)
+            session = client.postgrest.session
+            self.http.close()
+            self.http = PooledHTTPClient(
+                self.transport_config,
+                base_url=session.base_url,
+                headers=session.headers
+            )
+            client.postgrest.session = self.http.client
+            session.close()
+            return client
+
+        return create_client(self.url, self.key, options=options)
     
     def get_client(self) -> Client:
         return self.client
 
 # Global instance
-supabase_client = SupabaseConfig().get_client()
\ No newline at end of file
+if STORAGE_BACKEND == "sqlite":
+    # Backend embebido con la misma interfaz de cliente (ver sqlite_storage.py)
+    from sqlite_storage import SQLiteClient
+
+    supabase_config = None
+    supabase_client = SQLiteClient(SQLITE_PATH)
+    # Métricas del backend (para /api/health)
+    supabase_http = supabase_client
+else:
+    if create_client is None:
+        raise ImportError("STORAGE_BACKEND=supabase requiere el paquete 'supabase'")
+    # Solo este backend necesita la pila HTTP (httpx)
+    from utils.http_transport import HTTPTransportConfig, PooledHTTPClient
+
+    supabase_config = SupabaseConfig()
+    supabase_client = supabase_config.get_client()
+
+    # Métricas del pool HTTP (para /api/health)
+    supabase_http = supabase_config.http
+
+
+class DBExecutor:
+    """
+    Pool de threads acotado para las consultas del cliente síncrono de Supabase.
+    Los métodos async de los gestores de BD delegan aquí el .execute() para no
+    bloquear el event loop (WebSockets y demás requests siguen atendiéndose).
+    """
+
+    def __init__(self, max_workers: int = 16, max_pending: int = 256, slow_query_seconds: float = 1.0):
+        """
+        Args:
+            max_workers: Threads del pool (consultas simultáneas contra Supabase)
+            max_pending: Máximo de consultas en espera + en curso; el resto espera en el loop
+            slow_query_seconds: Umbral para contar una consulta como lenta
+        """
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.slow_query_seconds = slow_query_seconds
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="supabase")
+        self._slots = None  # Semáforo creado en el loop que lo usa
+
+        # Métricas
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.slow_queries = 0
+        self.total_wait_seconds = 0.0
+        self.total_exec_seconds = 0.0
+
+    async def run(self, func: Callable[..., Any], *args) -> Any:
+        """Ejecutar una función bloqueante en el pool y esperar su resultado"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+
+        async with self._slots:
+            self.submitted += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            queued_at = time.perf_counter()
+            # (inicio, fin) de la ejecución: el thread solo los escribe; las
+            # métricas se acumulan aquí, en el loop, sin carreras entre workers
+            timing = [None, None]
+
+            def timed_call():
+                timing[0] = time.perf_counter()
+                try:
+                    return func(*args)
+                finally:
+                    timing[1] = time.perf_counter()
+
+            try:
+                result = await asyncio.get_running_loop().run_in_executor(self._pool, timed_call)
+                self.completed += 1
+                return result
+            except Exception:
+                self.failed += 1
+                raise
+            finally:
+                self.in_flight -= 1
+                started, finished = timing
+                if started is not None and finished is not None:
+                    self.total_wait_seconds += started - queued_at
+                    self.total_exec_seconds += finished - started
+                    if finished - started >= self.slow_query_seconds:
+                        self.slow_queries += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Métricas del pool"""
+        finished = self.completed + self.failed
+        return {
+            "max_workers": self.max_workers,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "submitted": self.submitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "slow_queries": self.slow_queries,
+            "avg_wait_ms": round(self.total_wait_seconds / finished * 1000, 2) if finished else 0.0,
+            "avg_exec_ms": round(self.total_exec_seconds / finished * 1000, 2) if finished else 0.0
+        }
+
+    def shutdown(self):
+        self._pool.shutdown(wait=False)
+
+
+# Pool global para todas las consultas
+db_executor = DBExecutor(
+    max_workers=DB_EXECUTOR_WORKERS,
+    max_pending=DB_EXECUTOR_MAX_PENDING
+)
+
+
+async def run_query(query) -> Any:
+    """Ejecutar un query builder de Supabase (.execute()) sin bloquear el event loop"""
+    return await db_executor.run(query.execute)
@@ -0,0 +1,144 @@
+"""
+Pipeline de entrada del WebSocket PAIA: con los handlers atascados y el
+presupuesto lleno, el bucle de lectura sigue atendiendo pings.
+"""
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import WebSocketDisconnect
+
+from paia_protocol import inbound
+from paia_protocol.inbound import InboundPipeline
+from paia_protocol.websocket_handler import PAIAWebSocketHandler
+
+
+class FakeWebSocket:
+    """WebSocket que entrega los frames de una cola y guarda los enviados"""
+
+    def __init__(self):
+        self.incoming: asyncio.Queue = asyncio.Queue()
+        self.sent = []
+
+    async def accept(self):
+        pass
+
+    async def receive_text(self):
+        frame = await self.incoming.get()
+        if frame is None:
+            raise WebSocketDisconnect()
+        return frame
+
+    async def send_text(self, payload):
+        self.sent.append(json.loads(payload))
+
+    async def close(self, code=1000, reason=""):
+        pass
+
+
+class StalledRouter:
+    """Router cuyo route_message espera hasta que se libera `release`"""
+
+    discovery = None
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.routed = 0
+
+    async def deliver_pending_messages(self, user_id):
+        return 0
+
+    async def route_message(self, message_data, user_id):
+        await self.release.wait()
+        self.routed += 1
+        return {"success": True}
+
+
+class FakeUser:
+    is_active = True
+
+
+class FakeAuth:
+    def verify_jwt_token(self, token):
+        return {"user_id": "user-1"}
+
+    async def get_user_by_id(self, user_id):
+        return FakeUser()
+
+
+class FakeDB:
+    async def get_agent_ids_by_user(self, user_id):
+        return []
+
+
+def test_submit_queues_when_full_and_close_lets_work_finish():
+    async def scenario():
+        pipeline = InboundPipeline(max_concurrency=1, max_pending=2, max_backlog=2)
+        release = asyncio.Event()
+        done = []
+
+        def handler(i):
+            async def run():
+                await release.wait()
+                done.append(i)
+            return run
+
+        # 2 despachados + 2 en cola; el quinto desborda la cola
+        assert all(pipeline.submit("k", handler(i)) for i in range(4))
+        assert not pipeline.submit("k", handler(4))
+        assert pipeline.in_flight == 4
+
+        # Cerrar no cancela: lo recibido termina, en orden por clave
+        pipeline.close()
+        assert not pipeline.submit("k", handler(5))
+        release.set()
+        for _ in range(100):
+            if pipeline.in_flight == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert done == [0, 1, 2, 3]
+        assert pipeline not in inbound._detached
+
+    asyncio.run(scenario())
+
+
+def test_ping_is_served_while_pipeline_is_full():
+    async def scenario():
+        router = StalledRouter()
+        handler = PAIAWebSocketHandler(router, FakeAuth(), FakeDB(), inbound_concurrency=1)
+        websocket = FakeWebSocket()
+        task = asyncio.create_task(handler.handle_connection(websocket, "user-1", "token"))
+
+        # Llenar el presupuesto (inbound_concurrency * 8) y pasarse: el resto queda en cola
+        frames = 8 + 5
+        for i in range(frames):
+            websocket.incoming.put_nowait(json.dumps({
+                "type": "paia.request",
+                "message_id": f"m{i}",
+                "conversation_id": f"c{i}"
+            }))
+        websocket.incoming.put_nowait(json.dumps({"type": "ping"}))
+
+        for _ in range(100):
+            if any(frame.get("type") == "pong" for frame in websocket.sent):
+                break
+            await asyncio.sleep(0.01)
+
+        assert "pong" in [frame.get("type") for frame in websocket.sent]
+        assert not [frame for frame in websocket.sent if frame.get("type") == "error"]
+
+        # Al desconectar, lo recibido sigue enrutándose hasta el final
+        websocket.incoming.put_nowait(None)
+        await asyncio.wait_for(task, timeout=5)
+        router.release.set()
+        for _ in range(100):
+            if router.routed == frames:
+                break
+            await asyncio.sleep(0.01)
+        assert router.routed == frames
+        await handler.heartbeat.stop()
+
+    asyncio.run(scenario())
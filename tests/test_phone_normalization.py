@@ -0,0 +1,41 @@
+"""
+Clave canónica de teléfono: todas las variantes que genera
+normalize_whatsapp_phone deben producir la misma clave.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from routers.phone_normalization import canonical_phone_key, normalize_whatsapp_phone
+
+
+PHONES = [
+    "524425498784",    # México sin el 1 móvil
+    "5214425498784",   # México con el 1 móvil
+    "6505644482",      # USA 10 dígitos
+    "16505644482",     # USA con código de país
+    "5205551234",      # Tucson (lada 520) 10 dígitos
+    "15205551234",     # Tucson con código de país
+    "5215551234",      # USA lada 521 10 dígitos
+    "447700900123",    # Otro país (sin variantes)
+]
+
+
+def test_variants_share_canonical_key():
+    for phone in PHONES:
+        key = canonical_phone_key(phone)
+        for variant in normalize_whatsapp_phone(phone):
+            assert canonical_phone_key(variant) == key, (phone, variant)
+
+
+def test_key_variants_round_trip():
+    # Las variantes de la clave incluyen el número en cualquiera de sus formas
+    for phone in PHONES:
+        assert phone in normalize_whatsapp_phone(canonical_phone_key(phone)), phone
+
+
+def test_us_52x_area_codes():
+    assert canonical_phone_key("5205551234") == "15205551234"
+    assert canonical_phone_key("+1 520 555 1234") == "15205551234"
+    assert canonical_phone_key("5214425498784") == "524425498784"
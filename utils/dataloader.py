@@ -0,0 +1,133 @@
+"""
+DataLoader por request: agrupa y memoiza lecturas de entidades.
+
+Dentro de un `request_scope()` (un request HTTP o un frame del WebSocket),
+las claves pedidas a un mismo loader durante un tick del event loop se
+resuelven con una sola consulta `IN`, y cada clave se lee como mucho una
+vez por request. Fuera de un scope no hay loaders y los llamadores usan
+su consulta individual de siempre.
+"""
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+BatchFn = Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]]
+
+# Loaders del request actual: nombre -> DataLoader (None fuera de un scope)
+_request_loaders: ContextVar[Optional[Dict[str, "DataLoader"]]] = ContextVar(
+    "request_loaders", default=None
+)
+
+
+class DataLoader:
+    """Agrupa las claves pedidas en un mismo tick y memoiza los resultados"""
+
+    def __init__(self, batch_fn: BatchFn, max_batch_size: int = 200):
+        """
+        Args:
+            batch_fn: Función async que recibe una lista de claves y devuelve
+                un diccionario clave -> valor (las claves ausentes resuelven a None)
+            max_batch_size: Máximo de claves por llamada a batch_fn
+        """
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+
+        self._memo: Dict[Hashable, asyncio.Future] = {}
+        # (clave, future) pendientes de despachar en este tick
+        self._queue: List[Tuple[Hashable, asyncio.Future]] = []
+        self._scheduled = False
+
+    async def load(self, key: Hashable) -> Any:
+        """Obtener el valor de una clave (agrupada con las demás del tick)"""
+        future = self._memo.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            self._memo[key] = future
+            self._queue.append((key, future))
+
+            # El despacho corre al final del tick, cuando ya se pidieron las demás claves
+            if not self._scheduled:
+                self._scheduled = True
+                loop.call_soon(self._dispatch)
+
+        return await asyncio.shield(future)
+
+    async def load_many(self, keys: List[Hashable]) -> List[Any]:
+        """Obtener varias claves en un solo lote"""
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def prime(self, key: Hashable, value: Any):
+        """Sembrar un valor ya conocido (no pisa uno existente)"""
+        if key not in self._memo:
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(value)
+            self._memo[key] = future
+
+    def forget(self, key: Hashable):
+        """Olvidar una clave (tras escribir la entidad)"""
+        self._memo.pop(key, None)
+
+    def _dispatch(self):
+        self._scheduled = False
+        pending, self._queue = self._queue, []
+        for start in range(0, len(pending), self.max_batch_size):
+            asyncio.ensure_future(self._run_batch(pending[start:start + self.max_batch_size]))
+
+    async def _run_batch(self, pending: List[Tuple[Hashable, asyncio.Future]]):
+        try:
+            results = await self.batch_fn([key for key, _ in pending])
+        except Exception as e:
+            # Los errores no se memoizan: el próximo load reintenta
+            for key, future in pending:
+                if self._memo.get(key) is future:
+                    del self._memo[key]
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for key, future in pending:
+            if not future.done():
+                future.set_result(results.get(key))
+
+
+@contextmanager
+def request_scope():
+    """
+    Abrir un scope de loaders (un request o una pasada de ruteo).
+    Si ya hay uno activo se reutiliza, así un ruteo dentro de un request comparte su memo.
+    """
+    if _request_loaders.get() is not None:
+        yield
+        return
+
+    token = _request_loaders.set({})
+    try:
+        yield
+    finally:
+        _request_loaders.reset(token)
+
+
+def get_loader(name: str, batch_fn: BatchFn) -> Optional[DataLoader]:
+    """
+    Loader `name` del request actual, creándolo con batch_fn si hace falta.
+
+    Returns:
+        El loader, o None si no hay un request_scope activo
+    """
+    loaders = _request_loaders.get()
+    if loaders is None:
+        return None
+
+    loader = loaders.get(name)
+    if loader is None:
+        loader = loaders[name] = DataLoader(batch_fn)
+    return loader
+
+
+def forget(name: str, key: Hashable):
+    """Olvidar una clave del loader `name` del request actual (si existe)"""
+    loaders = _request_loaders.get()
+    if loaders and name in loaders:
+        loaders[name].forget(key)
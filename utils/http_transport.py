@@ -0,0 +1,209 @@
+"""
+Transporte HTTP compartido para el acceso a datos (PostgREST de Supabase).
+
+Un único httpx.Client con pool de conexiones keep-alive configurable
+(tamaño, HTTP/2, expiración, timeouts) que usan todos los threads del
+DBExecutor, más métricas de uso del pool para /api/health.
+"""
+import threading
+import time
+import weakref
+from typing import Any, Dict, Optional
+
+import httpx
+
+try:
+    import h2  # noqa: F401  (HTTP/2 es opcional: httpx[http2])
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class TransportMetrics:
+    """Contadores del transporte (se actualizan desde los threads del pool)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.connections_opened = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def started(self):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def finished(self, seconds: float, failed: bool):
+        with self._lock:
+            self.in_flight -= 1
+            self.total_seconds += seconds
+            self.max_seconds = max(self.max_seconds, seconds)
+            if failed:
+                self.errors += 1
+
+    def to_dict(self) -> Dict[str, Any]:
+        finished = self.requests - self.in_flight
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "connections_opened": self.connections_opened,
+            "avg_request_ms": round(self.total_seconds / finished * 1000, 2) if finished else 0.0,
+            "max_request_ms": round(self.max_seconds * 1000, 2)
+        }
+
+
+class MeteredTransport(httpx.HTTPTransport):
+    """HTTPTransport que mide cada request y observa las conexiones del pool"""
+
+    def __init__(self, metrics: TransportMetrics, **kwargs):
+        super().__init__(**kwargs)
+        self.metrics = metrics
+        self._known = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self.metrics.started()
+        started = time.perf_counter()
+        failed = True
+        try:
+            response = super().handle_request(request)
+            failed = False
+            return response
+        finally:
+            self.metrics.finished(time.perf_counter() - started, failed)
+            self._track_connections()
+
+    def _connections(self) -> list:
+        # httpcore.ConnectionPool.connections (atributo de httpcore, no de httpx)
+        return list(getattr(self._pool, "connections", []))
+
+    def _track_connections(self):
+        """Contar las conexiones nuevas (churn: cada una es un handshake TCP/TLS)"""
+        with self._lock:
+            for connection in self._connections():
+                if connection not in self._known:
+                    self._known.add(connection)
+                    self.metrics.connections_opened += 1
+
+    def pool_stats(self) -> Dict[str, int]:
+        """Conexiones abiertas del pool y cuántas están ociosas"""
+        connections = self._connections()
+        idle = 0
+        for connection in connections:
+            try:
+                if connection.is_idle():
+                    idle += 1
+            except Exception:
+                pass
+        return {"open_connections": len(connections), "idle_connections": idle}
+
+
+class HTTPTransportConfig:
+    """Parámetros del pool HTTP"""
+
+    def __init__(
+        self,
+        max_connections: int = 32,
+        max_keepalive_connections: int = 16,
+        keepalive_expiry: float = 60.0,
+        http2: bool = True,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 30.0,
+        write_timeout: float = 30.0,
+        pool_timeout: float = 10.0
+    ):
+        """
+        Args:
+            max_connections: Conexiones simultáneas máximas del pool
+            max_keepalive_connections: Conexiones ociosas que se mantienen abiertas
+            keepalive_expiry: Segundos que una conexión ociosa sigue abierta
+            http2: Multiplexar sobre HTTP/2 (requiere el paquete h2)
+            connect_timeout: Timeout de conexión (incluye handshake TLS)
+            read_timeout: Timeout de lectura de la respuesta
+            write_timeout: Timeout de envío del request
+            pool_timeout: Espera máxima por una conexión libre del pool
+        """
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.http2 = http2
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.write_timeout = write_timeout
+        self.pool_timeout = pool_timeout
+
+    @property
+    def timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(
+            connect=self.connect_timeout,
+            read=self.read_timeout,
+            write=self.write_timeout,
+            pool=self.pool_timeout
+        )
+
+    @property
+    def limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "max_connections": self.max_connections,
+            "max_keepalive_connections": self.max_keepalive_connections,
+            "keepalive_expiry": self.keepalive_expiry,
+            "http2": self.http2,
+            "connect_timeout": self.connect_timeout,
+            "read_timeout": self.read_timeout
+        }
+
+
+class PooledHTTPClient:
+    """httpx.Client con pool configurado y métricas"""
+
+    def __init__(self, config: Optional[HTTPTransportConfig] = None, **client_kwargs):
+        """
+        Args:
+            config: Parámetros del pool (por defecto HTTPTransportConfig())
+            **client_kwargs: Argumentos extra de httpx.Client (ej: base_url, headers)
+        """
+        self.config = config or HTTPTransportConfig()
+
+        http2 = self.config.http2 and HTTP2_AVAILABLE
+        if self.config.http2 and not HTTP2_AVAILABLE:
+            print("[HTTP] ⚠ HTTP/2 solicitado pero el paquete 'h2' no está instalado, usando HTTP/1.1")
+
+        self.metrics = TransportMetrics()
+        self.transport = MeteredTransport(
+            self.metrics,
+            http2=http2,
+            limits=self.config.limits
+        )
+        self.client = httpx.Client(
+            transport=self.transport,
+            timeout=self.config.timeout,
+            follow_redirects=True,
+            **client_kwargs
+        )
+        self.http2 = http2
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Configuración, uso del pool y contadores"""
+        return {
+            **self.config.to_dict(),
+            "http2": self.http2,
+            **self.transport.pool_stats(),
+            **self.metrics.to_dict()
+        }
+
+    def close(self):
+        self.client.close()
@@ -0,0 +1,123 @@
+"""
+Paginación keyset con cursores opacos y respuestas JSON en streaming.
+
+El cursor codifica la clave de orden (ej: created_at, id) de la última fila
+de la página; la página siguiente pide las filas estrictamente posteriores
+a esa clave, así el costo no crece con el número de página (sin OFFSET).
+"""
+import base64
+import binascii
+import json
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+# Filas serializadas por chunk del stream
+STREAM_CHUNK_ROWS = 50
+
+
+class InvalidCursor(ValueError):
+    """Cursor mal formado o de otro listado"""
+
+
+def clamp_limit(limit: Optional[int], default: int = DEFAULT_PAGE_SIZE) -> int:
+    """Tamaño de página dentro de [1, MAX_PAGE_SIZE]"""
+    if not limit:
+        return default
+    return max(1, min(int(limit), MAX_PAGE_SIZE))
+
+
+def encode_cursor(*values: Any) -> str:
+    """Codificar la clave de orden de una fila como cursor opaco"""
+    raw = json.dumps(list(values), separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int = 2) -> Tuple[Any, ...]:
+    """
+    Decodificar un cursor.
+
+    Raises:
+        InvalidCursor: Si el cursor no es válido
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (binascii.Error, ValueError, UnicodeError):
+        raise InvalidCursor("Cursor inválido")
+
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor("Cursor inválido")
+    return tuple(values)
+
+
+def _quote(value: Any) -> str:
+    """Valor entre comillas para un filtro lógico de PostgREST"""
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def apply_keyset(query, sort_column: str, cursor: Optional[str], limit: int, desc: bool = True):
+    """
+    Aplicar orden (sort_column, id), el filtro del cursor y el límite a un query builder.
+    Las filas con sort_column NULL van al final (en ambos sentidos) y se ordenan
+    por id; se pide una fila de más para saber si hay página siguiente.
+    """
+    op = "lt" if desc else "gt"
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        if sort_value is None:
+            # Ya estamos en el tramo de NULLs: solo queda avanzar por id
+            query = getattr(query.is_(sort_column, "null"), op)("id", row_id)
+        else:
+            query = query.or_(
+                f"{sort_column}.{op}.{_quote(sort_value)},"
+                f"and({sort_column}.eq.{_quote(sort_value)},id.{op}.{_quote(row_id)}),"
+                f"{sort_column}.is.null"
+            )
+
+    return query.order(sort_column, desc=desc, nullsfirst=False).order("id", desc=desc).limit(limit + 1)
+
+
+def split_page(rows: List[Any], sort_column: str, limit: int) -> Tuple[List[Any], Optional[str]]:
+    """
+    Separar la fila extra pedida por apply_keyset.
+
+    Returns:
+        (filas de la página, cursor de la siguiente o None si no hay más)
+    """
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    # Un sort_column NULL viaja como null en el cursor (apply_keyset lo trata aparte)
+    return rows, encode_cursor(last.get(sort_column), last["id"])
+
+
+def stream_page(
+    items_key: str,
+    items: Iterable[Any],
+    next_cursor: Optional[str],
+    extra: Optional[Dict[str, Any]] = None
+) -> StreamingResponse:
+    """
+    Respuesta JSON en streaming: {items_key: [...], "count": n, "next_cursor": ..., **extra}.
+
+    Las filas se convierten y serializan antes de devolver la respuesta (un
+    error sale como 500 desde el endpoint, no como un cuerpo truncado con 200);
+    el stream solo las envía por chunks en lugar de armar un único string.
+    """
+    encoded = [json.dumps(jsonable_encoder(item), ensure_ascii=False) for item in items]
+    tail = {"count": len(encoded), "next_cursor": next_cursor, **(extra or {})}
+
+    def generate():
+        yield '{"' + items_key + '":['
+        for start in range(0, len(encoded), STREAM_CHUNK_ROWS):
+            yield ("," if start else "") + ",".join(encoded[start:start + STREAM_CHUNK_ROWS])
+        yield "]," + json.dumps(tail, ensure_ascii=False)[1:]
+
+    return StreamingResponse(generate(), media_type="application/json")
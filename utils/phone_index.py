@@ -0,0 +1,118 @@
+"""
+Índice en memoria clave canónica de teléfono -> agent_id.
+
+Resuelve el agente de un webhook de WhatsApp con un acierto de diccionario.
+El índice se construye completo una vez (y se reconstruye al vencer el TTL,
+para recoger cambios hechos por otros procesos); las escrituras de este
+proceso lo actualizan al momento vía `set` / `remove`.
+"""
+import asyncio
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from routers.phone_normalization import canonical_phone_key
+
+
+class PhoneIndex:
+    """Mapa clave canónica de teléfono -> agent_id, con reconstrucción por TTL"""
+
+    def __init__(self, ttl: float = 300.0):
+        """
+        Args:
+            ttl: Segundos hasta reconstruir el índice desde la BD
+        """
+        self.ttl = ttl
+        self._agent_by_key: Dict[str, str] = {}
+        self._key_by_agent: Dict[str, str] = {}
+        self._loaded_at: Optional[float] = None
+        self._loading: Optional[asyncio.Future] = None
+        # Escrituras ocurridas durante una reconstrucción (se reaplican al terminar)
+        self._pending: list = []
+
+        self.hits = 0
+        self.misses = 0
+        self.rebuilds = 0
+
+    def is_fresh(self) -> bool:
+        return self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl
+
+    async def ensure_loaded(self, loader: Callable[[], Awaitable[Iterable[Tuple[str, str]]]]):
+        """
+        Construir el índice si no existe o venció (una sola carga a la vez).
+
+        Args:
+            loader: Devuelve pares (agent_id, teléfono) de todos los agentes con número
+        """
+        if self.is_fresh():
+            return
+
+        if self._loading is None:
+            self._loading = asyncio.ensure_future(self._rebuild(loader))
+        await asyncio.shield(self._loading)
+
+    async def _rebuild(self, loader):
+        try:
+            started = time.monotonic()
+            rows = await loader()
+            agent_by_key: Dict[str, str] = {}
+            key_by_agent: Dict[str, str] = {}
+            for agent_id, phone in rows:
+                key = canonical_phone_key(phone)
+                if key:
+                    agent_by_key.setdefault(key, agent_id)
+                    key_by_agent[agent_id] = key
+
+            self._agent_by_key = agent_by_key
+            self._key_by_agent = key_by_agent
+            for agent_id, phone in self._pending:
+                self._apply(agent_id, phone)
+            self._loaded_at = started
+            self.rebuilds += 1
+            print(f"[PHONE INDEX] {len(agent_by_key)} números indexados")
+        finally:
+            self._loading = None
+            self._pending = []
+
+    def get(self, phone_key: str) -> Optional[str]:
+        """agent_id para una clave canónica (None si ningún agente la tiene)"""
+        agent_id = self._agent_by_key.get(phone_key)
+        if agent_id is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return agent_id
+
+    def set(self, agent_id: str, phone: Optional[str]):
+        """Registrar (o quitar, si phone está vacío) el número de un agente"""
+        if self._loading is not None:
+            self._pending.append((agent_id, phone))
+        self._apply(agent_id, phone)
+
+    def remove(self, agent_id: str):
+        """Quitar el número de un agente (ej: al eliminarlo)"""
+        self.set(agent_id, None)
+
+    def _apply(self, agent_id: str, phone: Optional[str]):
+        key = self._key_by_agent.pop(agent_id, None)
+        if key and self._agent_by_key.get(key) == agent_id:
+            del self._agent_by_key[key]
+
+        key = canonical_phone_key(phone) if phone else ""
+        if key:
+            self._agent_by_key[key] = agent_id
+            self._key_by_agent[agent_id] = key
+
+    def invalidate(self):
+        """Forzar la reconstrucción en la próxima consulta"""
+        self._loaded_at = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Estadísticas del índice"""
+        return {
+            "entries": len(self._agent_by_key),
+            "ttl": self.ttl,
+            "loaded": self._loaded_at is not None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "rebuilds": self.rebuilds
+        }
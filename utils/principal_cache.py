@@ -0,0 +1,162 @@
+"""
+Cache de principales (identidad autenticada) compartido por HTTP y WebSocket.
+
+- Claims de JWT ya verificados, indexados por hash del token, hasta su `exp`.
+- Registros de usuario en un LRU con TTL corto, invalidados al modificar el usuario.
+
+Evita que una tormenta de reconexiones (ej: tras un deploy) se convierta en
+una ráfaga de lecturas a la tabla users.
+"""
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+class PrincipalCache:
+    """Cache en memoria de tokens verificados y usuarios"""
+
+    def __init__(self, user_ttl: float = 30.0, max_users: int = 10000, max_tokens: int = 10000):
+        """
+        Args:
+            user_ttl: Segundos que un registro de usuario se considera vigente
+            max_users: Máximo de usuarios en cache (LRU)
+            max_tokens: Máximo de tokens verificados en cache (LRU)
+        """
+        self.user_ttl = user_ttl
+        self.max_users = max_users
+        self.max_tokens = max_tokens
+
+        # sha256(token) -> (claims, exp)
+        self._tokens: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        # user_id -> (user, expira_en)
+        self._users: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        # user_id -> carga en curso (single-flight)
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        self.token_hits = 0
+        self.token_misses = 0
+        self.user_hits = 0
+        self.user_misses = 0
+
+    # ==================== TOKENS ====================
+
+    @staticmethod
+    def _token_key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get_claims(self, token: str) -> Optional[Dict[str, Any]]:
+        """Claims de un token ya verificado, o None si no está o expiró"""
+        key = self._token_key(token)
+        entry = self._tokens.get(key)
+        if entry is None:
+            self.token_misses += 1
+            return None
+
+        claims, exp = entry
+        if exp <= time.time():
+            del self._tokens[key]
+            self.token_misses += 1
+            return None
+
+        self._tokens.move_to_end(key)
+        self.token_hits += 1
+        return claims
+
+    def put_claims(self, token: str, claims: Dict[str, Any]):
+        """Guardar los claims de un token verificado (solo si tiene exp)"""
+        exp = claims.get("exp")
+        if not isinstance(exp, (int, float)) or exp <= time.time():
+            return
+
+        key = self._token_key(token)
+        self._tokens[key] = (claims, float(exp))
+        self._tokens.move_to_end(key)
+        while len(self._tokens) > self.max_tokens:
+            self._tokens.popitem(last=False)
+
+    # ==================== USUARIOS ====================
+
+    def get_user(self, user_id: str) -> Optional[Any]:
+        """Usuario en cache si sigue vigente"""
+        entry = self._users.get(user_id)
+        if entry is None:
+            return None
+
+        user, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._users[user_id]
+            return None
+
+        self._users.move_to_end(user_id)
+        return user
+
+    def put_user(self, user_id: str, user: Any):
+        """Guardar un usuario (los None no se guardan)"""
+        if user is None:
+            return
+
+        self._users[user_id] = (user, time.monotonic() + self.user_ttl)
+        self._users.move_to_end(user_id)
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+
+    async def get_or_load_user(
+        self,
+        user_id: str,
+        loader: Callable[[str], Awaitable[Optional[Any]]]
+    ) -> Optional[Any]:
+        """
+        Obtener un usuario de cache o cargarlo.
+        Las cargas concurrentes del mismo usuario comparten una sola lectura.
+        """
+        user = self.get_user(user_id)
+        if user is not None:
+            self.user_hits += 1
+            return user
+
+        self.user_misses += 1
+        future = self._inflight.get(user_id)
+        if future is None:
+            future = asyncio.ensure_future(self._load_user(user_id, loader))
+            self._inflight[user_id] = future
+
+        return await asyncio.shield(future)
+
+    async def _load_user(self, user_id: str, loader) -> Optional[Any]:
+        try:
+            user = await loader(user_id)
+            # Si se invalidó durante la carga, el resultado puede estar desactualizado
+            if self._inflight.get(user_id) is asyncio.current_task():
+                self.put_user(user_id, user)
+            return user
+        finally:
+            if self._inflight.get(user_id) is asyncio.current_task():
+                del self._inflight[user_id]
+
+    def invalidate_user(self, user_id: str):
+        """Quitar un usuario de cache (tras update/deactivate/delete)"""
+        self._users.pop(user_id, None)
+        self._inflight.pop(user_id, None)
+
+    def clear(self):
+        """Vaciar toda la cache"""
+        self._tokens.clear()
+        self._users.clear()
+        self._inflight.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Estadísticas de la cache"""
+        return {
+            "tokens": len(self._tokens),
+            "token_hits": self.token_hits,
+            "token_misses": self.token_misses,
+            "users": len(self._users),
+            "user_hits": self.user_hits,
+            "user_misses": self.user_misses
+        }
+
+
+# Instancia global compartida por AuthManager y el WebSocket handler
+principal_cache = PrincipalCache()
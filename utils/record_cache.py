@@ -0,0 +1,140 @@
+"""
+Cache read-through de registros por ID, con TTL y cache negativa.
+
+Pensada para entidades que se leen mucho y se modifican poco (ej: agentes):
+en régimen estable una lectura es un acierto de diccionario. Quien escribe
+la entidad debe llamar a `invalidate` (hoy update/delete en DatabaseManager;
+más adelante también un bus entre procesos).
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+
+# Marca para IDs inexistentes cacheados (cache negativa)
+_MISSING = object()
+
+
+class RecordCache:
+    """LRU con TTL de registros por ID, con single-flight en las cargas"""
+
+    def __init__(
+        self,
+        name: str,
+        ttl: float = 300.0,
+        negative_ttl: float = 30.0,
+        max_entries: int = 10000
+    ):
+        """
+        Args:
+            name: Nombre para logs y estadísticas
+            ttl: Segundos que un registro se considera vigente
+            negative_ttl: Segundos que se recuerda un ID inexistente (0 = no cachear)
+            max_entries: Máximo de entradas (LRU)
+        """
+        self.name = name
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+
+        # id -> (registro o _MISSING, expira_en)
+        self._entries: "OrderedDict[Hashable, Tuple[Any, float]]" = OrderedDict()
+        # id -> carga en curso
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def lookup(self, key: Hashable) -> Tuple[bool, Optional[Any]]:
+        """
+        Buscar un registro sin cargarlo.
+
+        Returns:
+            (encontrado, registro); encontrado con registro None es un acierto negativo
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return False, None
+
+        self._entries.move_to_end(key)
+        if value is _MISSING:
+            self.negative_hits += 1
+            return True, None
+        self.hits += 1
+        return True, value
+
+    def put(self, key: Hashable, value: Optional[Any]):
+        """Guardar un registro (None se guarda como inexistente)"""
+        if value is None:
+            if self.negative_ttl <= 0:
+                return
+            entry = (_MISSING, time.monotonic() + self.negative_ttl)
+        else:
+            entry = (value, time.monotonic() + self.ttl)
+
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get_or_load(
+        self,
+        key: Hashable,
+        loader: Callable[[Hashable], Awaitable[Optional[Any]]]
+    ) -> Optional[Any]:
+        """
+        Obtener un registro de cache o cargarlo con `loader`.
+        Las cargas concurrentes del mismo ID comparten una sola lectura.
+        """
+        found, value = self.lookup(key)
+        if found:
+            return value
+
+        self.misses += 1
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._load(key, loader))
+            self._inflight[key] = future
+
+        return await asyncio.shield(future)
+
+    async def _load(self, key: Hashable, loader) -> Optional[Any]:
+        try:
+            value = await loader(key)
+            # Si se invalidó durante la carga, el resultado puede estar desactualizado
+            if self._inflight.get(key) is asyncio.current_task():
+                self.put(key, value)
+            return value
+        finally:
+            if self._inflight.get(key) is asyncio.current_task():
+                del self._inflight[key]
+
+    def invalidate(self, key: Hashable):
+        """Quitar un registro (tras escribirlo, o por aviso de otro proceso)"""
+        self._entries.pop(key, None)
+        self._inflight.pop(key, None)
+        self.invalidations += 1
+
+    def clear(self):
+        """Vaciar toda la cache"""
+        self._entries.clear()
+        self._inflight.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Estadísticas de la cache"""
+        return {
+            "entries": len(self._entries),
+            "ttl": self.ttl,
+            "negative_ttl": self.negative_ttl,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations
+        }